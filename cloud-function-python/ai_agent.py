@@ -7,44 +7,39 @@ This module handles:
 3. Smart filtering logic
 """
 
-import os
 import json
 import re
 from typing import Dict, List, Any, Optional, Tuple
-from langchain_openai import ChatOpenAI
-from langchain.schema import HumanMessage, SystemMessage
 
-# Initialize LangChain OpenAI client
-try:
-    api_key = os.getenv('OPENAI_API_KEY')
-    if api_key and api_key.startswith('sk-') and len(api_key) > 20:
-        llm = ChatOpenAI(
-            model="gpt-4o",  # Use gpt-4o for follow-up questions
-            api_key=api_key,
-            temperature=0.3
-        )
-        
-        # Separate LLM for criteria generation with best available model
-        criteria_llm = ChatOpenAI(
-            model="gpt-5-2025-08-07",  # Use GPT-5 for more intelligent criteria generation
-            api_key=api_key,
-            temperature=0.1  # Lower temperature for more consistent results
-        )
-        print(f'✅ AI Agent OpenAI client initialized successfully')
-    else:
-        llm = None
-        print(f'⚠️ OpenAI API key not configured properly in AI Agent')
-except Exception as e:
-    llm = None
-    print(f'⚠️ Failed to initialize AI Agent OpenAI client: {str(e)}')
+import metrics
+from llm_gateway import get_chat_model, invoke_llm
+from structured_logging import get_logger, LazyJson
+
+logger = get_logger(__name__)
+
+# Chat models come from the shared LLM gateway and are created on first use,
+# so importing this module (health checks, the query planner) doesn't pay for langchain
+GENERAL_MODEL = "gpt-4o"  # Follow-up questions
+CRITERIA_MODEL = "gpt-5-2025-08-07"  # GPT-5 for more intelligent criteria generation
+
+def get_llm():
+    """Get the general-purpose LLM client (None when not configured)"""
+    return get_chat_model(GENERAL_MODEL, temperature=0.3)
+
+def get_criteria_llm():
+    """Get the criteria generation LLM client (None when not configured)"""
+    return get_chat_model(CRITERIA_MODEL, temperature=0.1)  # Lower temperature for more consistent results
 
 def generate_follow_up_questions(query: str, dataset_schema: Optional[Dict] = None, extensive_questions: bool = False) -> List[Dict[str, Any]]:
     """
     Generate follow-up questions to refine the search query
     """
+    llm = get_llm()
     if not llm:
         return []
     
+    from langchain.schema import HumanMessage, SystemMessage
+    
     try:
         # Determine question count and detail level based on extensive mode
         question_count = "6-8" if extensive_questions else "3-4"
@@ -100,7 +95,8 @@ Dataset context: {json.dumps(dataset_schema, indent=2) if dataset_schema else 'N
             HumanMessage(content=user_prompt)
         ]
         
-        response = llm.invoke(messages)
+        # Rate-limited and retried; identical prompts in flight share one call
+        response = invoke_llm(llm, messages, 'follow_up_questions')
         content = response.content.strip()
         
         # Extract JSON from response
@@ -115,7 +111,7 @@ Dataset context: {json.dumps(dataset_schema, indent=2) if dataset_schema else 'N
         return []
         
     except Exception as error:
-        print(f'❌ Error generating follow-up questions: {str(error)}')
+        logger.error('❌ Error generating follow-up questions: %s', error)
         return []
 
 def translate_query_to_criteria(query: str, dataset_schema: Optional[Dict] = None, follow_up_answers: Dict = None) -> Dict[str, Any]:
@@ -123,10 +119,14 @@ def translate_query_to_criteria(query: str, dataset_schema: Optional[Dict] = Non
     Translate natural language query into structured search criteria with intelligent interpretation
     """
     # Use the more advanced model for criteria generation
-    active_llm = criteria_llm if 'criteria_llm' in globals() else llm
+    llm = get_llm()
+    active_llm = get_criteria_llm() or llm
     if not active_llm:
+        metrics.inc('fallbacks_total', kind='criteria', reason='llm_unavailable')
         return create_fallback_criteria(query)
     
+    from langchain.schema import HumanMessage, SystemMessage
+    
     try:
         # First, extract hard constraints using pattern matching
         hard_constraints = extract_hard_constraints(query)
@@ -211,7 +211,8 @@ Translate this query into structured criteria. Be very careful to identify hard
             HumanMessage(content=user_prompt)
         ]
         
-        response = llm.invoke(messages)
+        # Rate-limited and retried; identical prompts in flight share one call
+        response = invoke_llm(llm, messages, 'criteria_generation')
         content = response.content.strip()
         
         # Extract JSON from response
@@ -238,12 +239,41 @@ Translate this query into structured criteria. Be very careful to identify hard
             return criteria
         
         # Fallback if JSON parsing fails
+        metrics.inc('fallbacks_total', kind='criteria', reason='unparseable')
         return create_fallback_criteria(query, hard_constraints)
         
     except Exception as error:
-        print(f'❌ Error in query translation: {str(error)}')
+        logger.error('❌ Error in query translation: %s', error)
+        metrics.inc('fallbacks_total', kind='criteria', reason='error')
         return create_fallback_criteria(query)
 
+# Hard constraint patterns, compiled once at import
+EXPLICIT_NAME_PATTERNS = [
+    re.compile(r"name is (\w+)"),
+    re.compile(r"named (\w+)"),
+    re.compile(r"person named (\w+)"),
+    re.compile(r"called (\w+)")
+]
+
+SPECIFIC_LOCATION_PATTERNS = [
+    re.compile(r"located in ([A-Z][a-zA-Z\s]+)"),  # "located in San Francisco"
+    re.compile(r"based in ([A-Z][a-zA-Z\s]+)"),   # "based in New York"
+    re.compile(r"from ([A-Z][a-zA-Z\s]+) and"),   # "from California and"
+    re.compile(r"lives in ([A-Z][a-zA-Z\s]+)")    # "lives in Boston"
+]
+
+EXPLICIT_COMPANY_PATTERNS = [
+    re.compile(r"works at ([A-Z][a-zA-Z\s&]+)"),
+    re.compile(r"employed at ([A-Z][a-zA-Z\s&]+)"),
+    re.compile(r"currently at ([A-Z][a-zA-Z\s&]+)")
+]
+
+EXPLICIT_EXCLUSION_PATTERNS = [
+    "no recruiters",
+    "not consultants", 
+    "exclude agencies"
+]
+
 def extract_hard_constraints(query: str) -> Dict[str, List[str]]:
     """
     Extract ONLY very explicit hard constraints - be conservative
@@ -258,27 +288,13 @@ def extract_hard_constraints(query: str) -> Dict[str, List[str]]:
     }
     
     # Only extract very explicit name patterns
-    explicit_name_patterns = [
-        r"name is (\w+)",
-        r"named (\w+)",
-        r"person named (\w+)",
-        r"called (\w+)"
-    ]
-    
-    for pattern in explicit_name_patterns:
-        matches = re.findall(pattern, query_lower)
+    for pattern in EXPLICIT_NAME_PATTERNS:
+        matches = pattern.findall(query_lower)
         constraints['nameMatches'].extend(matches)
     
     # Only extract very specific location patterns (avoid generic "in fintech" etc.)
-    specific_location_patterns = [
-        r"located in ([A-Z][a-zA-Z\s]+)",  # "located in San Francisco"
-        r"based in ([A-Z][a-zA-Z\s]+)",   # "based in New York"
-        r"from ([A-Z][a-zA-Z\s]+) and",   # "from California and"
-        r"lives in ([A-Z][a-zA-Z\s]+)"    # "lives in Boston"
-    ]
-    
-    for pattern in specific_location_patterns:
-        matches = re.findall(pattern, query)  # Use original case to catch proper nouns
+    for pattern in SPECIFIC_LOCATION_PATTERNS:
+        matches = pattern.findall(query)  # Use original case to catch proper nouns
         # Only accept matches that look like real locations (start with capital, reasonable length)
         clean_locations = [
             loc.strip() for loc in matches 
@@ -288,14 +304,8 @@ def extract_hard_constraints(query: str) -> Dict[str, List[str]]:
         constraints['locationRequirements'].extend(clean_locations)
     
     # Only extract very explicit company requirements
-    explicit_company_patterns = [
-        r"works at ([A-Z][a-zA-Z\s&]+)",
-        r"employed at ([A-Z][a-zA-Z\s&]+)",
-        r"currently at ([A-Z][a-zA-Z\s&]+)"
-    ]
-    
-    for pattern in explicit_company_patterns:
-        matches = re.findall(pattern, query)
+    for pattern in EXPLICIT_COMPANY_PATTERNS:
+        matches = pattern.findall(query)
         # Only accept well-known company formats
         clean_companies = [
             comp.strip() for comp in matches 
@@ -304,13 +314,7 @@ def extract_hard_constraints(query: str) -> Dict[str, List[str]]:
         constraints['companyRequirements'].extend(clean_companies)
     
     # Only extract very explicit exclusions
-    explicit_exclusion_patterns = [
-        r"no recruiters",
-        r"not consultants", 
-        r"exclude agencies"
-    ]
-    
-    for pattern in explicit_exclusion_patterns:
+    for pattern in EXPLICIT_EXCLUSION_PATTERNS:
         if pattern in query_lower:
             constraints['exclusions'].append(pattern.replace("no ", "").replace("not ", "").replace("exclude ", ""))
     
@@ -320,9 +324,9 @@ def extract_hard_constraints(query: str) -> Dict[str, List[str]]:
     
     # Only log if we actually found constraints
     if any(constraints.values()):
-        print(f"🔍 Extracted hard constraints: {constraints}")
+        logger.info("🔍 Extracted hard constraints: %s", LazyJson(constraints))
     else:
-        print(f"🔍 No hard constraints found - using flexible search")
+        logger.info("🔍 No hard constraints found - using flexible search")
     
     return constraints
 
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Local benchmark script for the recommendation function
+Measure cold-start import cost before deploying to Cloud Functions
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import subprocess
+
+# Modules only the search path needs - importing main must not pull these in
+HEAVY_MODULES = ['pandas', 'numpy', 'langchain', 'langchain_openai', 'google.cloud.storage', 'supabase', 'tiktoken']
+
+# Synthetic corpus for the scoring benchmark
+BENCHMARK_ROWS = int(os.getenv('BENCHMARK_ROWS', '200000'))
+BENCHMARK_QUERIES = ['senior engineer fintech new york', 'founder seed startup healthcare', 'product manager remote']
+
+IMPORT_TIME_PATTERN = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+def measure_import_time(module: str = 'main'):
+    """Import a module in a fresh interpreter with -X importtime"""
+    script = f"import sys, json; import {module}; print(json.dumps(sorted(sys.modules)))"
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', script],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else 'import failed')
+
+    timings = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            timings.append({'module': name, 'self_us': int(self_us), 'cumulative_us': int(cumulative_us), 'depth': len(indent) // 2})
+
+    loaded_modules = json.loads(result.stdout.strip().splitlines()[-1])
+    return timings, loaded_modules
+
+def test_cold_start_imports():
+    """Report import cost of main and check that heavy modules stay deferred"""
+    print("🧪 Measuring cold-start imports of main...")
+
+    try:
+        timings, loaded_modules = measure_import_time('main')
+    except Exception as e:
+        print(f"❌ Error importing main: {str(e)}")
+        return False
+
+    total_us = sum(t['self_us'] for t in timings)
+    print(f"⏱️ Total import time: {total_us / 1000:.1f}ms across {len(timings)} modules")
+
+    print("📊 Direct imports of main by cumulative time:")
+    top_level = sorted((t for t in timings if t['depth'] == 1), key=lambda t: t['cumulative_us'], reverse=True)
+    for t in top_level[:10]:
+        print(f"   {t['cumulative_us'] / 1000:8.1f}ms  {t['module']}")
+
+    eager = [module for module in HEAVY_MODULES if module in loaded_modules]
+    if eager:
+        print(f"❌ Heavy modules imported at startup: {', '.join(eager)}")
+        return False
+
+    print("✅ Heavy modules are deferred until first use")
+    return True
+
+def build_synthetic_profiles(count: int):
+    """Generate profile records with a realistic spread of common and rare terms"""
+    rng = random.Random(42)
+    titles = ['Software Engineer', 'Senior Engineer', 'Product Manager', 'Founder', 'Designer', 'Data Scientist', 'Investor']
+    industries = ['fintech', 'healthcare', 'climate', 'saas', 'gaming', 'biotech', 'ecommerce', 'robotics']
+    cities = ['New York', 'San Francisco', 'London', 'Berlin', 'Austin', 'Remote', 'Toronto']
+    vocabulary = [f'skill{i}' for i in range(5000)]
+    return [
+        {
+            'name': f'Person {i}',
+            'title': rng.choice(titles),
+            'company': f'Company {rng.randrange(count // 10 + 1)}',
+            'location': rng.choice(cities),
+            'summary': ' '.join([rng.choice(industries), 'seed startup' if rng.random() < 0.1 else 'team'] + rng.sample(vocabulary, 8))
+        }
+        for i in range(count)
+    ]
+
+def test_sharded_scoring(rows: int = BENCHMARK_ROWS):
+    """Compare sharded process-pool BM25 scoring with the single-threaded path"""
+    print(f"\n🧪 Benchmarking BM25 scoring on {rows:,} synthetic profiles...")
+
+    try:
+        import numpy as np
+        import sharded_bm25
+        from bm25_search import build_bm25_index, MIN_SCORE_THRESHOLD
+
+        build_start = time.time()
+        index = build_bm25_index(build_synthetic_profiles(rows))
+        print(f"⏱️ Index built in {time.time() - build_start:.1f}s")
+
+        cpus = sharded_bm25.available_cpus()
+        sharded_bm25.SHARD_WORKERS = max(cpus, 2)  # Exercise the sharded path even on one core
+        share_start = time.time()
+        scorer = sharded_bm25.ShardedScorer(index)
+        print(f"⏱️ Postings shared in {time.time() - share_start:.1f}s; {sharded_bm25.SHARD_WORKERS} workers on {cpus} CPUs")
+        scorer.score(BENCHMARK_QUERIES[0].split(), rows, None, MIN_SCORE_THRESHOLD)  # Start the workers
+
+        single_time, sharded_time, identical = 0.0, 0.0, True
+        for query in BENCHMARK_QUERIES:
+            tokens = query.split()
+
+            start = time.time()
+            scores = index.get_scores(tokens)
+            eligible = np.nonzero(scores >= MIN_SCORE_THRESHOLD)[0]
+            order = eligible[np.argsort(-scores[eligible], kind='stable')][:sharded_bm25.SHARD_TOP_K]
+            single_time += time.time() - start
+
+            start = time.time()
+            sharded_scores, ranked_rows = scorer.score(tokens, rows, None, MIN_SCORE_THRESHOLD)
+            sharded_time += time.time() - start
+
+            identical &= np.array_equal(scores, sharded_scores) and np.array_equal(order, ranked_rows)
+    except Exception as e:
+        print(f"❌ Error benchmarking sharded scoring: {str(e)}")
+        return False
+
+    print(f"⏱️ Single-threaded: {single_time * 1000 / len(BENCHMARK_QUERIES):.1f}ms per query")
+    print(f"⏱️ Sharded: {sharded_time * 1000 / len(BENCHMARK_QUERIES):.1f}ms per query ({single_time / sharded_time:.2f}x)")
+    if cpus < 2:
+        print("⚠️ Only one CPU available - speedup needs an instance with more cores")
+
+    if not identical:
+        print("❌ Sharded scores or top-k order differ from the single-threaded path")
+        return False
+
+    print("✅ Sharded scores and top-k order match the single-threaded path")
+    return True
+
+def main():
+    """Run all benchmarks"""
+    print("🚀 Starting local benchmarks...")
+
+    cold_start_success = test_cold_start_imports()
+    sharded_success = test_sharded_scoring()
+
+    print("\n📊 Benchmark Summary:")
+    print(f"Cold-start imports: {'✅ PASS' if cold_start_success else '❌ FAIL'}")
+    print(f"Sharded scoring: {'✅ PASS' if sharded_success else '❌ FAIL'}")
+
+    sys.exit(0 if cold_start_success and sharded_success else 1)
+
+if __name__ == "__main__":
+    main()
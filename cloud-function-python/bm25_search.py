@@ -2,86 +2,518 @@
 BM25-based text search using OkapiBM25 algorithm
 
 This module provides fast text matching using the BM25 algorithm
-to filter candidates before LLM analysis.
+to filter candidates before LLM analysis. The index keeps its postings
+so rows appended to a dataset can be merged without a full rebuild.
 """
 
+import os
 import json
+import math
+import hashlib
 import re
-from typing import List, Dict, Any, Tuple
-from rank_bm25 import BM25Okapi
+import threading
+from collections import Counter
+from typing import List, Dict, Any, Tuple, Optional
+import numpy as np
 
-def search_with_bm25(people: List[Dict[str, Any]], criteria: Dict[str, Any], top_k: int = 50) -> List[Dict[str, Any]]:
+from structured_logging import get_logger, debug_enabled, LazyJson, LOG_SAMPLE_SIZE
+from term_matcher import get_criteria_matcher
+from field_index import detect_constraint_columns, failed_constraint
+from sharded_bm25 import get_sharded_scorer
+
+logger = get_logger(__name__)
+
+# Okapi BM25 parameters (same defaults as rank_bm25.BM25Okapi)
+BM25_K1 = 1.5
+BM25_B = 0.75
+BM25_EPSILON = 0.25
+
+# Minimum BM25 score for a candidate to be considered (lowered for more flexibility)
+MIN_SCORE_THRESHOLD = 0.1
+
+# Reciprocal rank fusion of BM25 and dense rankings (hybrid search)
+RRF_K = 60
+HYBRID_DEPTH = int(os.getenv('HYBRID_DEPTH', '200'))  # Candidates taken from each ranking
+
+NON_SLUG_CHARS = re.compile(r'[^a-z0-9]')
+
+class BM25Index:
     """
-    BM25-based text search with hard constraint pre-filtering
+    Incrementally updatable Okapi BM25 index
+
+    Scores exactly like rank_bm25.BM25Okapi, but keeps postings and corpus
+    statistics so appended documents can be merged into an existing index
+    instead of rebuilding it from scratch.
     """
-    try:
-        print(f"🔍 Starting BM25 search on {len(people)} records for top {top_k} results")
-
-        # Step 0: Apply hard constraints first
-        hard_constraints = criteria.get('hardConstraints', {})
-        if hard_constraints and any(hard_constraints.values()):
-            print(f"🚫 Applying hard constraints: {hard_constraints}")
-            filtered_people = apply_hard_constraints(people, hard_constraints)
-            print(f"📊 After hard constraint filtering: {len(filtered_people)} candidates remain")
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B, epsilon: float = BM25_EPSILON):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.doc_count = 0
+        self.total_length = 0
+        self.doc_lengths: List[int] = []
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self._lock = threading.RLock()
+        self._term_arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._doc_length_array: Optional[np.ndarray] = None
+        self._idf: Optional[Dict[str, float]] = None
+
+    @property
+    def avgdl(self) -> float:
+        return self.total_length / self.doc_count if self.doc_count else 0.0
+
+    def add_documents(self, tokenized_docs: List[List[str]]) -> None:
+        """
+        Merge new documents into the postings and corpus statistics
+
+        Only for an index no search uses yet; a published index is extended
+        with extended() so its searches keep their corpus statistics.
+        """
+        with self._lock:
+            for tokens in tokenized_docs:
+                doc_id = self.doc_count
+                for term, frequency in Counter(tokens).items():
+                    self.postings.setdefault(term, {})[doc_id] = frequency
+                    self._term_arrays.pop(term, None)
+                
+                self.doc_lengths.append(len(tokens))
+                self.total_length += len(tokens)
+                self.doc_count += 1
             
-            # If no one passes hard constraints, return empty
-            if not filtered_people:
-                print("❌ No candidates pass hard constraints - returning empty results")
-                return []
-        else:
-            filtered_people = people
-        
-        # Step 1: Create searchable documents from filtered people
-        documents = [create_searchable_document(person) for person in filtered_people]
+            # Corpus statistics changed - recompute lazily on next search
+            self._doc_length_array = None
+            self._idf = None
+
+    def extended(self, tokenized_docs: List[List[str]]) -> 'BM25Index':
+        """
+        A new index with the documents appended, leaving this one unchanged
+
+        Postings of terms the new documents don't contain are shared between
+        the two indexes; the ones they extend are copied first.
+        """
+        with self._lock:
+            index = BM25Index(self.k1, self.b, self.epsilon)
+            index.doc_count = self.doc_count
+            index.total_length = self.total_length
+            index.doc_lengths = list(self.doc_lengths)
+            index.postings = dict(self.postings)
+            index._term_arrays = dict(self._term_arrays)
+        for term in {term for tokens in tokenized_docs for term in tokens}:
+            if term in index.postings:
+                index.postings[term] = dict(index.postings[term])
+        index.add_documents(tokenized_docs)
+        return index
+
+    def _compute_idf(self) -> Dict[str, float]:
+        """
+        Compute IDF values, flooring negative IDFs like BM25Okapi does
+        """
+        idf = {}
+        idf_sum = 0.0
+        negative_idfs = []
         
-        # Step 2: Tokenize documents for BM25
-        tokenized_docs = [doc.split() for doc in documents]
+        for term, docs in self.postings.items():
+            term_idf = math.log(self.doc_count - len(docs) + 0.5) - math.log(len(docs) + 0.5)
+            idf[term] = term_idf
+            idf_sum += term_idf
+            if term_idf < 0:
+                negative_idfs.append(term)
         
-        # Step 3: Initialize BM25 with tokenized documents
-        bm25 = BM25Okapi(tokenized_docs)
+        if idf:
+            eps = self.epsilon * (idf_sum / len(idf))
+            for term in negative_idfs:
+                idf[term] = eps
         
-        # Step 4: Build search query from criteria
-        search_query = build_bm25_query(criteria)
-        print(f"📝 BM25 query: '{search_query}'")
+        return idf
+
+    def get_postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Document IDs and term frequencies for a term (empty when not indexed)
+        """
+        with self._lock:
+            if term not in self.postings:
+                return np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+            return self._get_term_arrays(term)
+
+    def _get_term_arrays(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        arrays = self._term_arrays.get(term)
+        if arrays is None:
+            docs = self.postings[term]
+            arrays = (
+                np.fromiter(docs.keys(), dtype=np.int64, count=len(docs)),
+                np.fromiter(docs.values(), dtype=np.float64, count=len(docs))
+            )
+            self._term_arrays[term] = arrays
+        return arrays
+
+    def get_scores(self, query_tokens: List[str]) -> np.ndarray:
+        """
+        Score every indexed document against the query tokens
+        """
+        with self._lock:
+            scores = np.zeros(self.doc_count)
+            if not self.doc_count:
+                return scores
+            
+            if self._idf is None:
+                self._idf = self._compute_idf()
+            if self._doc_length_array is None:
+                self._doc_length_array = np.array(self.doc_lengths, dtype=np.float64)
+            
+            avgdl = self.avgdl
+            for term in query_tokens:
+                if term not in self.postings:
+                    continue
+                
+                doc_ids, frequencies = self._get_term_arrays(term)
+                doc_lengths = self._doc_length_array[doc_ids]
+                scores[doc_ids] += self._idf[term] * (
+                    frequencies * (self.k1 + 1) /
+                    (frequencies + self.k1 * (1 - self.b + self.b * doc_lengths / avgdl))
+                )
+            
+            return scores
+
+    def score_documents(self, tokenized_docs: List[List[str]], query_tokens: List[str]) -> np.ndarray:
+        """
+        Score documents that are not indexed with this index's corpus statistics
+        """
+        with self._lock:
+            scores = np.zeros(len(tokenized_docs))
+            if not self.doc_count:
+                return scores
+            if self._idf is None:
+                self._idf = self._compute_idf()
+            avgdl = self.avgdl
+            query_terms = [term for term in query_tokens if term in self._idf]
+            for position, tokens in enumerate(tokenized_docs):
+                frequencies = Counter(tokens)
+                length_norm = self.k1 * (1 - self.b + self.b * len(tokens) / avgdl)
+                scores[position] = sum(
+                    self._idf[term] * frequencies[term] * (self.k1 + 1) / (frequencies[term] + length_norm)
+                    for term in query_terms if term in frequencies
+                )
+            return scores
+
+    def max_query_score(self, query_tokens: List[str]) -> float:
+        """
+        Upper bound of any document's score for the query tokens
+
+        Scores divided by this bound are comparable across corpora whose IDF
+        statistics differ.
+        """
+        with self._lock:
+            if self._idf is None:
+                self._idf = self._compute_idf()
+            return sum(self._idf[term] * (self.k1 + 1) for term in query_tokens if term in self._idf)
+
+def build_bm25_index(people: List[Dict[str, Any]]) -> BM25Index:
+    """
+    Build a BM25 index over a list of person profiles
+    """
+    index = BM25Index()
+    index.add_documents([tokenize_document(person) for person in people])
+    return index
+
+def tokenize_document(person: Dict[str, Any]) -> List[str]:
+    """
+    Tokenize a person profile the same way for indexing and searching
+    """
+    return tokenize_text(create_searchable_document(person))
+
+def tokenize_text(text: str) -> List[str]:
+    """
+    Tokenize free text (e.g. a query) into the terms profiles are indexed by
+    """
+    return text.lower().split()
+
+def search_with_bm25(
+    people: List[Dict[str, Any]], 
+    criteria: Dict[str, Any], 
+    top_k: int = 50,
+    index: Optional[BM25Index] = None,
+    row_ids: Optional[List[str]] = None,
+    search_state: Optional[Dict[str, Any]] = None,
+    field_index: Optional[Any] = None,
+    dense_scores: Optional[np.ndarray] = None,
+    duplicates: Optional[Any] = None
+) -> List[Dict[str, Any]]:
+    """
+    BM25-based text search with hard constraint pre-filtering
+
+    When a prebuilt index over ``people`` is provided (e.g. from the dataset
+    store) it is reused instead of tokenizing the whole dataset again.
+    ``row_ids`` are the stable IDs assigned at parse time, parallel to ``people``.
+    ``search_state`` is a result of prepare_bm25_search for these criteria.
+    ``field_index`` is a field_index.FieldIndex over ``people`` for hard constraints.
+    ``dense_scores`` are query similarities from dense_retrieval; when given,
+    candidates are ordered by fusing the BM25 and dense rankings.
+    ``duplicates`` are near_duplicates.DuplicateClusters over ``people``: only
+    one row per cluster is searched, on and returned as the merged canonical
+    record.
+    """
+    try:
+        logger.info("🔍 Starting BM25 search on %s records for top %s results", len(people), top_k)
+
+        # Steps 0-5: Hard constraint mask and BM25 scores
+        if search_state is None:
+            search_state = prepare_bm25_search(people, criteria, index, field_index=field_index, duplicates=duplicates)
+        candidate_mask = search_state['candidate_mask']
+        scores = search_state['scores']
+        duplicates = search_state.get('duplicates')
         
-        # Step 5: Execute BM25 search
-        tokenized_query = search_query.split()
-        scores = bm25.get_scores(tokenized_query)
+        # If no one passes hard constraints, return empty
+        if candidate_mask is not None and not candidate_mask.any():
+            logger.info("❌ No candidates pass hard constraints - returning empty results")
+            return []
         
-        # Step 6: Apply minimum score threshold (lowered for more flexibility)
-        MIN_SCORE_THRESHOLD = 0.1  # Lowered threshold for more flexible matching
+        # Step 6: Apply minimum score threshold and hard constraint mask
+        eligible = scores >= MIN_SCORE_THRESHOLD
+        if candidate_mask is not None:
+            eligible &= candidate_mask
         
+        # Sort by BM25 score and take top K, checking soft filters only as needed.
+        # One term scan per candidate serves the soft filters, field matches and reasons.
+        fusion_scores = None
+        if search_state.get('ranked_rows') is not None and dense_scores is None:
+            order = iter_ranked_rows(search_state['ranked_rows'], scores, eligible)
+        else:
+            eligible_indices = np.nonzero(eligible)[0]
+            order = eligible_indices[np.argsort(-scores[eligible_indices], kind='stable')]
+            if dense_scores is not None:
+                order, fusion_scores = fuse_rankings(order, dense_scores, candidate_mask, max(HYBRID_DEPTH, top_k * 2))
+        matcher = get_criteria_matcher(criteria)
+        has_exclusions = bool(matcher.terms_by_category.get('excluded'))
         scored_results = []
-        for i, score in enumerate(scores):
-            if score >= MIN_SCORE_THRESHOLD and passes_soft_filters(filtered_people[i], criteria):
+        for i in order:
+            if len(scored_results) >= top_k:
+                break
+            person = duplicates.canonical_record(i, people[i]) if duplicates is not None else people[i]
+            matches = matcher.scan_record(person) if has_exclusions else None
+            if passes_soft_filters(person, criteria, matches):
                 scored_results.append({
-                    'person': filtered_people[i],
-                    'bm25_score': float(score),
-                    'index': i
+                    'person': person,
+                    'bm25_score': float(scores[i]),
+                    'index': int(i),
+                    'matches': matches
                 })
         
-        # Sort by BM25 score and take top K
-        scored_results.sort(key=lambda x: x['bm25_score'], reverse=True)
-        scored_results = scored_results[:top_k]
-        
         # Step 7: Enhance results with detailed scoring
         enhanced_results = []
         for result in scored_results:
-            enhanced_results.append({
-                'id': generate_person_id(result['person']),
+            person_id = row_ids[result['index']] if row_ids else generate_person_id(result['person'])
+            matches = result['matches'] if result['matches'] is not None else matcher.scan_record(result['person'])
+            enhanced = {
+                'id': person_id,
                 'data': result['person'],
                 'bm25_score': round(result['bm25_score'], 3),
-                'field_matches': analyze_field_matches(result['person'], criteria),
-                'preliminary_reasons': generate_preliminary_reasons(result['person'], criteria)
-            })
+                'field_matches': analyze_field_matches(result['person'], criteria, matches),
+                'preliminary_reasons': generate_preliminary_reasons(result['person'], criteria, matches)
+            }
+            if duplicates is not None and result['index'] in duplicates.provenance:
+                enhanced['duplicates'] = duplicates.provenance[result['index']]
+            if fusion_scores is not None:
+                enhanced['dense_score'] = round(float(dense_scores[result['index']]), 3)
+                enhanced['fusion_score'] = round(fusion_scores.get(result['index'], 0.0), 5)
+            enhanced_results.append(enhanced)
 
-        print(f"✅ BM25 search completed: {len(enhanced_results)} candidates selected")
+        logger.info("✅ BM25 search completed: %s candidates selected", len(enhanced_results))
         return enhanced_results
 
     except Exception as error:
-        print(f"❌ Error in BM25 search: {str(error)}")
+        logger.error("❌ Error in BM25 search: %s", error)
         raise Exception(f"BM25 search failed: {str(error)}")
 
+def iter_ranked_rows(ranked_rows: np.ndarray, scores: np.ndarray, eligible: np.ndarray):
+    """
+    Eligible rows in BM25 order, starting from the merged shard top-k
+
+    All eligible rows are only sorted if the soft filters exhaust the top-k.
+    """
+    yield from ranked_rows.tolist()
+    eligible_indices = np.nonzero(eligible)[0]
+    if len(eligible_indices) > len(ranked_rows):
+        order = eligible_indices[np.argsort(-scores[eligible_indices], kind='stable')]
+        yield from order[len(ranked_rows):].tolist()
+
+def fuse_rankings(
+    bm25_order: np.ndarray,
+    dense_scores: np.ndarray,
+    candidate_mask: Optional[np.ndarray],
+    depth: int = HYBRID_DEPTH
+) -> Tuple[np.ndarray, Dict[int, float]]:
+    """
+    Reciprocal rank fusion of the BM25 order and the dense similarity order
+
+    Dense candidates only need to pass the hard constraints, so profiles that
+    describe a match without sharing its keywords can still surface. BM25
+    candidates beyond the fused depth keep their order after the fused ones.
+    """
+    allowed = dense_scores > 0
+    if candidate_mask is not None:
+        allowed &= candidate_mask
+    dense_indices = np.nonzero(allowed)[0]
+    dense_order = dense_indices[np.argsort(-dense_scores[dense_indices], kind='stable')][:depth]
+
+    fusion_scores: Dict[int, float] = {}
+    for ranking in (bm25_order[:depth], dense_order):
+        for rank, row in enumerate(ranking.tolist()):
+            fusion_scores[row] = fusion_scores.get(row, 0.0) + 1.0 / (RRF_K + rank + 1)
+
+    fused = sorted(fusion_scores, key=lambda row: -fusion_scores[row])
+    tail = [row for row in bm25_order[depth:].tolist() if row not in fusion_scores]
+    return np.array(fused + tail, dtype=np.int64), fusion_scores
+
+def prepare_bm25_search(
+    people: List[Dict[str, Any]],
+    criteria: Dict[str, Any],
+    index: Optional[BM25Index] = None,
+    previous_state: Optional[Dict[str, Any]] = None,
+    field_index: Optional[Any] = None,
+    duplicates: Optional[Any] = None
+) -> Dict[str, Any]:
+    """
+    Compute the hard constraint mask and BM25 scores for criteria
+
+    ``previous_state`` is a state computed for other criteria over the same
+    rows and index (e.g. a speculative search). Its mask is reused when the
+    hard constraints are the same, and since BM25 scores are a sum over query
+    tokens, only the tokens that differ are scored. With a ``field_index`` the
+    constraints are evaluated as cached per-field bitmaps instead of checking
+    every record. With ``duplicates`` the rows a near-duplicate cluster
+    collapsed are masked out as well, and cluster representatives are
+    filtered and scored on their merged canonical record.
+    """
+    # Step 0: Apply hard constraints first
+    hard_constraints = {k: v for k, v in criteria.get('hardConstraints', {}).items() if v}
+    reusable = (
+        previous_state is not None and
+        previous_state['index'] is index and index is not None and
+        previous_state['row_count'] == len(people) and
+        previous_state['doc_count'] == index.doc_count and
+        previous_state.get('duplicates') is duplicates
+    )
+    
+    mask_reused = reusable and previous_state['hard_constraints'] == hard_constraints
+    if mask_reused:
+        candidate_mask = previous_state['candidate_mask']
+    elif hard_constraints:
+        logger.info("🚫 Applying hard constraints: %s", LazyJson(hard_constraints))
+        rejections = Counter()
+        if field_index is not None and field_index.row_count == len(people):
+            candidate_mask = field_index.constraint_mask(hard_constraints, rejections)
+        else:
+            columns = detect_constraint_columns(people)
+            candidate_mask = np.fromiter(
+                (passes_hard_constraints(person, hard_constraints, rejections, columns) for person in people),
+                dtype=bool,
+                count=len(people)
+            )
+        logger.info(
+            "📊 After hard constraint filtering: %s candidates remain (%s)",
+            int(candidate_mask.sum()), summarize_rejections(rejections),
+            extra={'fields': {'rejections': dict(rejections)}}
+        )
+    else:
+        candidate_mask = None
+    
+    if duplicates is not None and duplicates.row_count != len(people):
+        duplicates = None  # Clusters of another snapshot
+    if duplicates is not None and not mask_reused:
+        canonical_mask = duplicates.canonical_mask
+        candidate_mask = canonical_mask if candidate_mask is None else candidate_mask & canonical_mask
+        # Representatives pass or fail on their merged record, not their own row
+        if hard_constraints:
+            use_fields = field_index is not None and field_index.row_count == len(people)
+            columns = None if use_fields or not duplicates.merged_rows else detect_constraint_columns(people)
+            for row in duplicates.merged_rows:
+                record = duplicates.canonical_records[row]
+                candidate_mask[row] = (
+                    field_index.record_passes(record, hard_constraints) if use_fields
+                    else passes_hard_constraints(record, hard_constraints, columns=columns)
+                )
+        logger.info("🧬 %s near-duplicate rows hidden", len(people) - int(canonical_mask.sum()))
+    
+    # Step 1-3: Tokenize documents and initialize BM25 (unless already indexed)
+    if index is None:
+        index = build_bm25_index(people)
+    
+    # Step 4: Build search query from criteria
+    search_query = build_bm25_query(criteria)
+    logger.debug("📝 BM25 query: '%s'", search_query)
+    tokenized_query = search_query.split()
+    
+    # Step 5: Execute BM25 search
+    added_tokens, removed_tokens = [], []
+    if reusable:
+        new_counts, old_counts = Counter(tokenized_query), Counter(previous_state['query_tokens'])
+        added_tokens = list((new_counts - old_counts).elements())
+        removed_tokens = list((old_counts - new_counts).elements())
+    
+    ranked_rows = None
+    if reusable and len(added_tokens) + len(removed_tokens) < len(tokenized_query):
+        scores = previous_state['scores']
+        if added_tokens:
+            scores = scores + index.get_scores(added_tokens)[:len(people)]
+        if removed_tokens:
+            scores = scores - index.get_scores(removed_tokens)[:len(people)]
+        rescored_tokens = len(added_tokens) + len(removed_tokens)
+    else:
+        # Large corpora are scored in document-range shards on all cores
+        scorer = get_sharded_scorer(index)
+        scores = None
+        if scorer is not None:
+            try:
+                scores, ranked_rows = scorer.score(tokenized_query, len(people), candidate_mask, MIN_SCORE_THRESHOLD)
+            except Exception as error:
+                logger.warning("⚠️ Sharded scoring failed, scoring in-thread: %s", error)
+        if scores is None:
+            scores = index.get_scores(tokenized_query)[:len(people)]
+        rescored_tokens = len(tokenized_query)
+    
+    if duplicates is not None and duplicates.merged_rows:
+        scores, rescored = score_canonical_records(index, duplicates, tokenized_query, scores)
+        if rescored:
+            ranked_rows = None  # The shard top-k was ranked on the representatives' own rows
+    
+    return {
+        'index': index,
+        'row_count': len(people),
+        'doc_count': index.doc_count,
+        'hard_constraints': hard_constraints,
+        'candidate_mask': candidate_mask,
+        'duplicates': duplicates,
+        'query_tokens': tokenized_query,
+        'scores': scores,
+        'ranked_rows': ranked_rows,
+        'mask_reused': mask_reused,
+        'rescored_tokens': rescored_tokens
+    }
+
+def score_canonical_records(
+    index: BM25Index,
+    duplicates: Any,
+    query_tokens: List[str],
+    scores: np.ndarray
+) -> Tuple[np.ndarray, bool]:
+    """
+    Scores with cluster representatives scored on their merged canonical record
+
+    Returns the scores (copied when any changed) and whether any changed.
+    """
+    rows = duplicates.merged_rows
+    for row in rows:
+        if row not in duplicates.canonical_tokens:
+            duplicates.canonical_tokens[row] = tokenize_document(duplicates.canonical_records[row])
+    canonical_scores = index.score_documents([duplicates.canonical_tokens[row] for row in rows], query_tokens)
+    row_array = np.array(rows, dtype=np.int64)
+    if np.allclose(canonical_scores, scores[row_array], rtol=0, atol=1e-9):
+        return scores, False
+    scores = scores.copy()
+    scores[row_array] = canonical_scores
+    return scores, True
+
 def create_searchable_document(person: Dict[str, Any]) -> str:
     """
     Create a searchable text document from a person profile
@@ -149,148 +581,104 @@ def apply_hard_constraints(people: List[Dict[str, Any]], hard_constraints: Dict[
     Apply hard constraints to filter the dataset before BM25 search
     """
     filtered_people = []
+    columns = detect_constraint_columns(people)
     
     for person in people:
-        if passes_hard_constraints(person, hard_constraints):
+        if passes_hard_constraints(person, hard_constraints, columns=columns):
             filtered_people.append(person)
     
     return filtered_people
 
-def passes_hard_constraints(person: Dict[str, Any], hard_constraints: Dict[str, List[str]]) -> bool:
+def passes_hard_constraints(
+    person: Dict[str, Any],
+    hard_constraints: Dict[str, List[str]],
+    rejections: Optional[Counter] = None,
+    columns: Optional[Dict[str, List[str]]] = None
+) -> bool:
     """
     Check if a person passes all hard constraints (name, location, title, company)
+
+    Each constraint is matched only in its own columns, exactly like
+    field_index.FieldIndex: ``columns`` are the dataset's constraint columns
+    from detect_constraint_columns, else the person's own. Failures are
+    counted per constraint in ``rejections`` rather than logged one by one;
+    per-record details are only logged for debug requests.
     """
-    person_text = json.dumps(person).lower()
-    
-    # Check name matches
-    name_matches = hard_constraints.get('nameMatches', [])
-    if name_matches:
-        has_name_match = False
-        for required_name in name_matches:
-            # Check in various name fields
-            name_fields = ['name', 'full_name', 'fullname', 'first_name', 'last_name']
-            for field in name_fields:
-                if field in person and person[field]:
-                    if required_name.lower() in person[field].lower():
-                        has_name_match = True
-                        break
-            if has_name_match:
-                break
-        
-        if not has_name_match:
-            print(f"❌ Name constraint failed for {person.get('name', 'unknown')}. Required: {name_matches}")
-            return False
-    
-    # Check location requirements
-    location_requirements = hard_constraints.get('locationRequirements', [])
-    if location_requirements:
-        has_location_match = any(
-            location.lower() in person_text 
-            for location in location_requirements
-        )
-        if not has_location_match:
-            print(f"❌ Location constraint failed for {person.get('name', 'unknown')}. Required: {location_requirements}")
-            return False
-    
-    # Check title requirements
-    title_requirements = hard_constraints.get('titleRequirements', [])
-    if title_requirements:
-        has_title_match = any(
-            title.lower() in person_text 
-            for title in title_requirements
-        )
-        if not has_title_match:
-            print(f"❌ Title constraint failed for {person.get('name', 'unknown')}. Required: {title_requirements}")
-            return False
-    
-    # Check company requirements
-    company_requirements = hard_constraints.get('companyRequirements', [])
-    if company_requirements:
-        has_company_match = any(
-            company.lower() in person_text 
-            for company in company_requirements
-        )
-        if not has_company_match:
-            print(f"❌ Company constraint failed for {person.get('name', 'unknown')}. Required: {company_requirements}")
-            return False
-    
-    # Check exclusions
-    exclusions = hard_constraints.get('exclusions', [])
-    if exclusions:
-        for exclusion in exclusions:
-            if exclusion.lower() in person_text:
-                print(f"❌ Exclusion constraint failed for {person.get('name', 'unknown')}. Excluded: {exclusion}")
-                return False
+    if columns is None:
+        columns = detect_constraint_columns([person])
     
+    failure = failed_constraint(person, hard_constraints, columns)
+    if failure is not None:
+        record_rejection(person, *failure, rejections)
+        return False
     return True
 
-def passes_soft_filters(person: Dict[str, Any], criteria: Dict[str, Any]) -> bool:
+def record_rejection(person: Dict[str, Any], constraint: str, required: Any, rejections: Optional[Counter]) -> None:
+    """
+    Count a hard constraint failure, logging only a sample for debug requests
+    """
+    if rejections is not None:
+        rejections[constraint] += 1
+        if rejections[constraint] > LOG_SAMPLE_SIZE:
+            return
+    if debug_enabled():
+        logger.debug("❌ %s constraint failed for %s. Required: %s", constraint.capitalize(), person.get('name', 'unknown'), required)
+
+def summarize_rejections(rejections: Counter) -> str:
+    """
+    Describe rejection counts, e.g. "12,403 rejected by location, 20 by name"
+    """
+    parts = [f"{count:,} {'rejected ' if i == 0 else ''}by {constraint}" for i, (constraint, count) in enumerate(rejections.most_common())]
+    return ', '.join(parts) if parts else 'none rejected'
+
+def passes_soft_filters(person: Dict[str, Any], criteria: Dict[str, Any], matches: Optional[Dict[str, List[str]]] = None) -> bool:
     """
     Apply soft filters (preferences that affect ranking but don't exclude)
+
+    ``matches`` is the person's term scan from term_matcher, when the caller
+    already has it.
     """
     textual_criteria = criteria.get('textualCriteria', {})
     keyword_search = textual_criteria.get('keywordSearch', {})
     
     # Check exclusion keywords (these are still hard filters)
-    excluded = keyword_search.get('excluded', [])
-    if excluded:
-        person_text = json.dumps(person).lower()
-        
-        for excluded_term in excluded:
-            if excluded_term.lower() in person_text:
-                return False
+    if keyword_search.get('excluded'):
+        if matches is None:
+            matches = get_criteria_matcher(criteria).scan_record(person)
+        if matches.get('excluded'):
+            return False
     
     # All other criteria are now soft preferences handled by scoring
     return True
 
-def analyze_field_matches(person: Dict[str, Any], criteria: Dict[str, Any]) -> Dict[str, List[str]]:
+def analyze_field_matches(person: Dict[str, Any], criteria: Dict[str, Any], matches: Optional[Dict[str, List[str]]] = None) -> Dict[str, List[str]]:
     """
     Analyze which specific fields matched the search criteria
     """
-    matches = {}
+    if matches is None:
+        matches = get_criteria_matcher(criteria).scan_record(person)
     
-    textual_criteria = criteria.get('textualCriteria', {})
-    field_search = textual_criteria.get('fieldSpecificSearch', {})
-    
-    for field_type, search_terms in field_search.items():
-        if not isinstance(search_terms, list) or not search_terms:
-            continue
-            
-        matched_terms = []
-        person_text = json.dumps(person).lower()
-        
-        for term in search_terms:
-            if term.lower() in person_text:
-                matched_terms.append(term)
-        
-        if matched_terms:
-            matches[field_type] = matched_terms
-    
-    return matches
+    return {
+        category[len('field:'):]: terms
+        for category, terms in matches.items()
+        if category.startswith('field:')
+    }
 
-def generate_preliminary_reasons(person: Dict[str, Any], criteria: Dict[str, Any]) -> List[str]:
+def generate_preliminary_reasons(person: Dict[str, Any], criteria: Dict[str, Any], matches: Optional[Dict[str, List[str]]] = None) -> List[str]:
     """
     Generate preliminary match reasons based on BM25 results
     """
     reasons = []
-    
-    textual_criteria = criteria.get('textualCriteria', {})
-    keyword_search = textual_criteria.get('keywordSearch', {})
+    if matches is None:
+        matches = get_criteria_matcher(criteria).scan_record(person)
     
     # Check keyword matches
-    required = keyword_search.get('required', [])
-    if required:
-        person_text = json.dumps(person).lower()
-        matched_keywords = [
-            keyword for keyword in required 
-            if keyword.lower() in person_text
-        ]
-        
-        if matched_keywords:
-            reasons.append(f"Contains required keywords: {', '.join(matched_keywords)}")
+    matched_keywords = matches.get('required')
+    if matched_keywords:
+        reasons.append(f"Contains required keywords: {', '.join(matched_keywords)}")
     
     # Check field-specific matches
-    field_matches = analyze_field_matches(person, criteria)
+    field_matches = analyze_field_matches(person, criteria, matches)
     for field_type, terms in field_matches.items():
         field_name = field_type.replace('_', ' ').title()
         reasons.append(f"{field_name} match: {', '.join(terms)}")
@@ -300,9 +688,12 @@ def generate_preliminary_reasons(person: Dict[str, Any], criteria: Dict[str, Any
     
     return reasons
 
-def generate_person_id(person: Dict[str, Any]) -> str:
+def generate_person_id(person: Dict[str, Any], namespace: str = '') -> str:
     """
-    Generate a unique ID for a person
+    Generate a stable ID for a person from their name and profile content
+
+    The same profile always gets the same ID, so results can be cached,
+    diffed and reused across requests.
     """
     # Try to find name fields
     name_fields = ['name', 'full_name', 'fullname', 'first_name', 'last_name']
@@ -310,11 +701,10 @@ def generate_person_id(person: Dict[str, Any]) -> str:
     
     for field in name_fields:
         if field in person and person[field]:
-            name = re.sub(r'[^a-z0-9]', '_', person[field].lower())
+            name = NON_SLUG_CHARS.sub('_', person[field].lower())
             break
     
-    # Add some randomness to ensure uniqueness
-    import random
-    import string
-    random_suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=5))
-    return f"{name}_{random_suffix}"
+    # Content hash keeps the ID unique without any randomness
+    payload = namespace + json.dumps(person, sort_keys=True)
+    content_hash = hashlib.sha1(payload.encode('utf-8')).hexdigest()[:10]
+    return f"{name}_{content_hash}"
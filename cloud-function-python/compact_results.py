@@ -0,0 +1,120 @@
+"""
+Compact persistence of search results
+
+This module handles:
+1. Reducing stored recommendations to row references: the stable row ID
+   (prefixed with the dataset ID in federated searches), scores and LLM
+   analysis, without the profile; dataset versions are stored once in the
+   metadata
+2. Trimming the metadata written with progress updates and final results
+3. Hydrating compact recommendations with their profiles on read, from the
+   dataset store that keeps recently searched datasets in memory
+
+Row IDs are derived from record content, so they still resolve after rows
+were appended to a dataset; rows that were removed hydrate without data.
+"""
+
+import time
+from typing import List, Dict, Any, Callable, Optional, Tuple
+
+from structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Configuration
+RESULTS_FORMAT = 'compact'  # Marker in the stored metadata
+PROGRESS_FIELDS = ('filtered_count', 'candidates_found', 'final_results', 'hard_constraints', 'error_type', 'error_message')
+
+def compact_recommendations(recommendations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Recommendations without their profiles and empty fields
+    """
+    return [
+        {key: value for key, value in recommendation.items() if key != 'data' and value is not None}
+        for recommendation in recommendations
+    ]
+
+def split_recommendation_id(recommendation_id: str, dataset_versions: Dict[str, str], federated: bool) -> Tuple[str, str]:
+    """
+    (dataset ID, row ID) of a recommendation
+    """
+    if federated:
+        for dataset_id in dataset_versions:
+            if recommendation_id.startswith(f'{dataset_id}:'):
+                return dataset_id, recommendation_id[len(dataset_id) + 1:]
+    return next(iter(dataset_versions)), recommendation_id
+
+def result_dataset_versions(metadata: Dict[str, Any], dataset_id: str) -> Dict[str, str]:
+    """
+    Versions of the datasets a search ran on, by dataset ID
+    """
+    federation = metadata.get('federation')
+    if federation:
+        return {dataset['dataset_id']: dataset['dataset_version'] for dataset in federation['datasets']}
+    return {dataset_id: metadata.get('dataset_version')}
+
+def compact_metadata(metadata: Dict[str, Any], dataset_versions: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Result metadata without per-call LLM logs, marked as compact and with
+    the versions of the datasets the recommendations reference
+    """
+    compact = {**metadata, 'results_format': RESULTS_FORMAT, 'result_datasets': dataset_versions}
+    if compact.get('llm_usage'):
+        compact['llm_usage'] = {key: value for key, value in compact['llm_usage'].items() if key != 'call_log'}
+    return compact
+
+def slim_progress_data(substep_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The fields of a progress update worth storing
+    """
+    return {key: value for key, value in substep_data.items() if key in PROGRESS_FIELDS}
+
+def is_compact(metadata: Optional[Dict[str, Any]]) -> bool:
+    return bool(metadata) and metadata.get('results_format') == RESULTS_FORMAT
+
+def hydrate_recommendations(
+    recommendations: List[Dict[str, Any]],
+    dataset_versions: Dict[str, str],
+    load_dataset_entry: Callable[[str], Any]
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Add the profile of every compact recommendation back as 'data'
+
+    ``dataset_versions`` is the 'result_datasets' metadata of the stored
+    results and ``load_dataset_entry`` returns the dataset_store entry of a
+    dataset ID. Recommendations of near-duplicate clusters get the merged
+    canonical record. Returns the hydrated recommendations and stats.
+    """
+    start = time.time()
+    federated = len(dataset_versions) > 1
+    references = [split_recommendation_id(recommendation['id'], dataset_versions, federated) for recommendation in recommendations]
+    datasets: Dict[str, Any] = {}
+    failed: Dict[str, str] = {}
+    for dataset_id in dict.fromkeys(dataset_id for dataset_id, _ in references):
+        try:
+            datasets[dataset_id] = load_dataset_entry(dataset_id)
+        except Exception as error:
+            logger.warning("⚠️ Could not load dataset %s to hydrate results: %s", dataset_id, error)
+            failed[dataset_id] = str(error)
+
+    hydrated, missing = [], 0
+    for recommendation, (dataset_id, row_id) in zip(recommendations, references):
+        dataset = datasets.get(dataset_id)
+        record = dataset.get_record(row_id) if dataset is not None else None
+        if record is None:
+            missing += 1
+        elif recommendation.get('duplicates'):
+            record = dataset.get_duplicate_clusters().canonical_record(dataset.row_positions[row_id], record)
+        hydrated.append({**recommendation, 'data': record})
+
+    stats = {
+        'hydrated': len(recommendations) - missing,
+        'missing': missing,
+        'version_changed': sorted(
+            dataset_id for dataset_id, dataset in datasets.items() if dataset.version != dataset_versions.get(dataset_id)
+        ),
+        'failed_datasets': failed,
+        'seconds': round(time.time() - start, 3)
+    }
+    logger.info("💧 Hydrated %s of %s stored results", stats['hydrated'], len(recommendations))
+    return hydrated, stats
@@ -10,68 +10,99 @@ This module handles:
 
 import io
 import re
-from typing import List, Dict, Any
-import pandas as pd
-import chardet
-from google.cloud import storage
+from typing import List, Dict, Any, Optional, TYPE_CHECKING
+
+from structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+# pandas, chardet and google-cloud-storage are imported where they are used so
+# that importing this module (e.g. for the health check) stays cheap
+if TYPE_CHECKING:
+    from google.cloud import storage
 
 BUCKET_NAME = 'chief_of_staff_datasets'
 RAW_DATASETS_FOLDER = 'raw_datasets'
 
-def parse_dataset(dataset_id: str, storage_client: storage.Client) -> List[Dict[str, Any]]:
+def parse_dataset(dataset_id: str, storage_client: 'storage.Client') -> List[Dict[str, Any]]:
     """
     Parse dataset from Google Cloud Storage with proper encoding handling
     """
     try:
-        print(f"📊 Loading dataset {dataset_id} from Google Cloud Storage")
+        logger.info("📊 Loading dataset %s from Google Cloud Storage", dataset_id)
         
         # Step 1: Download file from GCS
         file_buffer, file_name = download_dataset_buffer(dataset_id, storage_client)
         
         # Step 2: Determine file type and parse accordingly
-        file_extension = file_name.lower().split('.')[-1] if '.' in file_name else 'csv'
-        
-        if file_extension == 'csv':
-            people = parse_csv_buffer(file_buffer)
-        elif file_extension in ['xlsx', 'xls']:
-            people = parse_excel_buffer(file_buffer)
-        else:
-            raise Exception(f"Unsupported file format: {file_extension}")
+        people = parse_dataset_buffer(file_buffer, file_name)
         
         # Step 3: Clean and validate data
         cleaned_people = validate_and_clean_data(people)
         
-        print(f"✅ Successfully parsed {len(cleaned_people)} records from {file_name}")
+        logger.info("✅ Successfully parsed %s records from %s", len(cleaned_people), file_name)
         return cleaned_people
         
     except Exception as error:
-        print(f"❌ Error parsing dataset: {str(error)}")
+        logger.error("❌ Error parsing dataset: %s", error)
         raise Exception(f"Failed to parse dataset: {str(error)}")
 
-def download_dataset_buffer(dataset_path: str, storage_client: storage.Client) -> tuple:
+def get_file_extension(file_name: str) -> str:
+    """
+    Get the lowercase file extension, defaulting to CSV
+    """
+    return file_name.lower().split('.')[-1] if '.' in file_name else 'csv'
+
+def parse_dataset_buffer(file_buffer: bytes, file_name: str) -> List[Dict[str, Any]]:
+    """
+    Parse a raw dataset buffer based on its file extension
+    """
+    file_extension = get_file_extension(file_name)
+    
+    if file_extension == 'csv':
+        return parse_csv_buffer(file_buffer)
+    elif file_extension in ['xlsx', 'xls']:
+        return parse_excel_buffer(file_buffer)
+    else:
+        raise Exception(f"Unsupported file format: {file_extension}")
+
+def resolve_dataset_blob(dataset_path: str, storage_client: 'storage.Client') -> 'storage.Blob':
+    """
+    Resolve a dataset path or legacy ID to a GCS blob with its metadata loaded
+    """
+    bucket = storage_client.bucket(BUCKET_NAME)
+    
+    # Handle both full paths and legacy timestamp prefixes
+    if dataset_path.startswith('raw_datasets/'):
+        # Full GCS path provided (new approach)
+        file_blob = bucket.get_blob(dataset_path)
+        if file_blob is None:
+            raise Exception(f"Dataset {dataset_path} not found in Google Cloud Storage")
+    else:
+        # Legacy: Find the file by datasetId (timestamp prefix)
+        blobs = bucket.list_blobs(prefix=f"{RAW_DATASETS_FOLDER}/{dataset_path}")
+        matching_files = list(blobs)
+        if not matching_files:
+            raise Exception(f"Dataset {dataset_path} not found in Google Cloud Storage")
+        file_blob = matching_files[0]
+    
+    return file_blob
+
+def get_dataset_version(file_blob: 'storage.Blob') -> str:
+    """
+    Build a version string that changes whenever the dataset object is re-uploaded
+    """
+    return f"{file_blob.name}#{file_blob.generation}"
+
+def download_dataset_buffer(dataset_path: str, storage_client: 'storage.Client') -> tuple:
     """
     Download dataset as buffer from GCS using full path and return buffer with filename
     """
     try:
-        bucket = storage_client.bucket(BUCKET_NAME)
-        
-        # Handle both full paths and legacy timestamp prefixes
-        if dataset_path.startswith('raw_datasets/'):
-            # Full GCS path provided (new approach)
-            file_blob = bucket.blob(dataset_path)
-            if not file_blob.exists():
-                raise Exception(f"Dataset {dataset_path} not found in Google Cloud Storage")
-            file_name = dataset_path.split('/')[-1]
-        else:
-            # Legacy: Find the file by datasetId (timestamp prefix)
-            blobs = bucket.list_blobs(prefix=f"{RAW_DATASETS_FOLDER}/{dataset_path}")
-            matching_files = list(blobs)
-            if not matching_files:
-                raise Exception(f"Dataset {dataset_path} not found in Google Cloud Storage")
-            file_blob = matching_files[0]
-            file_name = file_blob.name.split('/')[-1]
-        
-        print(f"📥 Downloading: {file_blob.name}")
+        file_blob = resolve_dataset_blob(dataset_path, storage_client)
+        file_name = file_blob.name.split('/')[-1]
+        
+        logger.info("📥 Downloading: %s", file_blob.name)
         
         # Download as bytes
         file_buffer = file_blob.download_as_bytes()
@@ -81,25 +112,37 @@ def download_dataset_buffer(dataset_path: str, storage_client: storage.Client) -
     except Exception as error:
         raise Exception(f"Failed to download dataset: {str(error)}")
 
-def parse_csv_buffer(buffer: bytes) -> List[Dict[str, Any]]:
+def detect_encoding(buffer: bytes) -> str:
+    """
+    Detect the text encoding of a raw buffer
+    """
+    import chardet
+    
+    detected = chardet.detect(buffer)
+    encoding = detected.get('encoding') or 'utf-8'
+    confidence = detected.get('confidence', 0)
+    
+    logger.info("📊 Detected encoding: %s (confidence: %.2f)", encoding, confidence)
+    return encoding
+
+def parse_csv_buffer(buffer: bytes, encoding: Optional[str] = None) -> List[Dict[str, Any]]:
     """
     Parse CSV buffer with proper encoding detection
     """
+    import pandas as pd
+    
     try:
-        print('📋 Parsing CSV file with encoding detection...')
+        logger.info('📋 Parsing CSV file with encoding detection...')
         
-        # Detect encoding
-        detected = chardet.detect(buffer)
-        encoding = detected.get('encoding', 'utf-8')
-        confidence = detected.get('confidence', 0)
-        
-        print(f"📊 Detected encoding: {encoding} (confidence: {confidence:.2f})")
+        # Detect encoding unless the caller already knows it
+        if not encoding:
+            encoding = detect_encoding(buffer)
         
         # Try to decode with detected encoding, fallback to utf-8
         try:
             text_content = buffer.decode(encoding)
         except (UnicodeDecodeError, LookupError):
-            print("⚠️ Falling back to UTF-8 encoding")
+            logger.warning("⚠️ Falling back to UTF-8 encoding")
             text_content = buffer.decode('utf-8', errors='ignore')
         
         # Use pandas to parse CSV for robust handling
@@ -117,19 +160,21 @@ def parse_csv_buffer(buffer: bytes) -> List[Dict[str, Any]]:
         # Convert to list of dictionaries
         people = df.to_dict('records')
         
-        print(f"✅ CSV parsing completed: {len(people)} records")
+        logger.info("✅ CSV parsing completed: %s records", len(people))
         return people
         
     except Exception as error:
-        print(f"❌ CSV parsing error: {str(error)}")
+        logger.error("❌ CSV parsing error: %s", error)
         raise Exception(f"CSV parsing failed: {str(error)}")
 
 def parse_excel_buffer(buffer: bytes) -> List[Dict[str, Any]]:
     """
     Parse Excel buffer using pandas
     """
+    import pandas as pd
+    
     try:
-        print('📋 Parsing Excel file...')
+        logger.info('📋 Parsing Excel file...')
         
         # Use pandas to read Excel file
         excel_io = io.BytesIO(buffer)
@@ -145,15 +190,15 @@ def parse_excel_buffer(buffer: bytes) -> List[Dict[str, Any]]:
         # Convert to list of dictionaries
         people = df.to_dict('records')
         
-        print(f"✅ Excel parsing completed: {len(people)} records")
+        logger.info("✅ Excel parsing completed: %s records", len(people))
         return people
         
     except Exception as error:
-        print(f"❌ Excel parsing error: {str(error)}")
+        logger.error("❌ Excel parsing error: %s", error)
         
         # Try with xlrd engine for older .xls files
         try:
-            print("🔄 Trying xlrd engine for legacy Excel format...")
+            logger.info("🔄 Trying xlrd engine for legacy Excel format...")
             excel_io = io.BytesIO(buffer)
             df = pd.read_excel(
                 excel_io,
@@ -162,18 +207,20 @@ def parse_excel_buffer(buffer: bytes) -> List[Dict[str, Any]]:
                 na_filter=False
             )
             people = df.to_dict('records')
-            print(f"✅ Excel parsing completed with xlrd: {len(people)} records")
+            logger.info("✅ Excel parsing completed with xlrd: %s records", len(people))
             return people
             
         except Exception as xlrd_error:
-            print(f"❌ xlrd parsing also failed: {str(xlrd_error)}")
+            logger.error("❌ xlrd parsing also failed: %s", xlrd_error)
             raise Exception(f"Excel parsing failed: {str(error)}")
 
 def validate_and_clean_data(people: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
     Validate and clean person data
     """
-    print("🧹 Cleaning and validating data...")
+    import pandas as pd
+    
+    logger.info("🧹 Cleaning and validating data...")
     
     cleaned_people = []
     
@@ -204,7 +251,7 @@ def validate_and_clean_data(people: List[Dict[str, Any]]) -> List[Dict[str, Any]
         if has_meaningful_data and len(clean_person) >= 2:
             cleaned_people.append(clean_person)
     
-    print(f"✅ Data cleaning completed: {len(cleaned_people)} valid records")
+    logger.info("✅ Data cleaning completed: %s valid records", len(cleaned_people))
     return cleaned_people
 
 def clean_field_name(field_name: str) -> str:
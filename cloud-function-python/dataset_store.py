@@ -0,0 +1,347 @@
+"""
+Instance-level dataset store with incremental index maintenance
+
+This module keeps parsed datasets and their BM25 indexes warm between
+requests on the same instance:
+1. Resolving the dataset version from GCS object metadata
+2. Reusing cached records and index when the version is unchanged
+3. Detecting appended rows by per-row content hashes
+4. Parsing and cleaning only the delta and merging it into the index
+5. Assigning stable row IDs that survive re-uploads and appends
+6. Coalescing concurrent loads of the same dataset into one
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, TYPE_CHECKING
+
+import metrics
+from bm25_search import BM25Index, build_bm25_index, tokenize_document, generate_person_id
+from single_flight import SingleFlight
+from field_index import FieldIndex
+from dense_retrieval import DenseIndex, build_dense_index
+from near_duplicates import DuplicateClusters, find_duplicate_clusters
+from structured_logging import get_logger
+from data_parser import (
+    resolve_dataset_blob,
+    get_dataset_version,
+    get_file_extension,
+    detect_encoding,
+    parse_csv_buffer,
+    parse_dataset_buffer,
+    validate_and_clean_data
+)
+
+logger = get_logger(__name__)
+
+if TYPE_CHECKING:
+    from google.cloud import storage
+
+# Configuration
+INCREMENTAL_INDEX_ENABLED = os.getenv('DATASET_INCREMENTAL_INDEX', 'true').lower() == 'true'
+MAX_CACHED_DATASETS = int(os.getenv('DATASET_CACHE_MAX_ENTRIES', '4'))
+DEDUP_ON_LOAD = os.getenv('DATASET_DEDUP', 'false').lower() == 'true'  # Find near-duplicates at ingestion
+
+class DatasetEntry:
+    """
+    A parsed dataset version together with its search index
+    """
+
+    def __init__(self, dataset_id: str, version: str, file_name: str):
+        self.dataset_id = dataset_id
+        self.version = version
+        self.file_name = file_name
+        self.records: List[Dict[str, Any]] = []
+        self.row_ids: List[str] = []
+        self.row_positions: Dict[str, int] = {}
+        self.row_hashes: List[str] = []
+        self.index: BM25Index = BM25Index()
+        self.encoding: Optional[str] = None
+        self.csv_header: bytes = b''
+        self.source_length = 0
+        self.source_digest = ''
+        self.load_stats: Dict[str, Any] = {}
+        self._field_index: Optional[FieldIndex] = None
+        self._field_index_lock = threading.Lock()
+        self._dense_index: Optional[DenseIndex] = None
+        self._dense_index_lock = threading.Lock()
+        self._duplicates: Optional[DuplicateClusters] = None
+        self._duplicates_lock = threading.Lock()
+        self._previous_signatures = None  # MinHash signatures of the version this one appended to
+
+    def get_record(self, row_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cleaned record by its stable row ID
+        """
+        position = self.row_positions.get(row_id)
+        return self.records[position] if position is not None else None
+
+    def get_field_index(self) -> FieldIndex:
+        """
+        Hard constraint field indexes for this version, built on first use
+        """
+        with self._field_index_lock:
+            if self._field_index is None:
+                self._field_index = FieldIndex(self.records, self.version)
+            return self._field_index
+
+    def get_dense_index(self) -> DenseIndex:
+        """
+        Profile vectors for hybrid search, built on first use
+        """
+        with self._dense_index_lock:
+            if self._dense_index is None:
+                self._dense_index = build_dense_index(self.records, self.index)
+            return self._dense_index
+
+    def built_dense_index(self) -> Optional[DenseIndex]:
+        """
+        Profile vectors if they were built already, without building them or
+        waiting for a build in progress
+        """
+        return self._dense_index
+
+    def built_duplicate_clusters(self) -> Optional[DuplicateClusters]:
+        """
+        Near-duplicate clusters if they were found already, without finding
+        them or waiting for a search in progress
+        """
+        return self._duplicates
+
+    def get_duplicate_clusters(self) -> DuplicateClusters:
+        """
+        Near-duplicate clusters for this version, found on first use
+        """
+        with self._duplicates_lock:
+            if self._duplicates is None:
+                self._duplicates = find_duplicate_clusters(self.records, self.row_ids, self._previous_signatures)
+                self._previous_signatures = None
+            return self._duplicates
+
+# Cached datasets by dataset ID, least recently used first
+_datasets: 'OrderedDict[str, DatasetEntry]' = OrderedDict()
+_store_lock = threading.Lock()
+
+# Coalesces concurrent loads of the same dataset
+_dataset_loads = SingleFlight('dataset load')
+
+def load_dataset(
+    dataset_id: str,
+    storage_client: 'storage.Client',
+    file_blob: Optional['storage.Blob'] = None
+) -> DatasetEntry:
+    """
+    Load a dataset, reusing or incrementally updating the cached version
+
+    ``file_blob`` can be passed when the caller already resolved the object.
+    """
+    load_start = time.time()
+    if file_blob is None:
+        file_blob = resolve_dataset_blob(dataset_id, storage_client)
+    version = get_dataset_version(file_blob)
+
+    with _store_lock:
+        cached = _datasets.get(dataset_id)
+        if cached:
+            _datasets.move_to_end(dataset_id)
+
+    if cached and cached.version == version:
+        logger.info("♻️ Dataset %s unchanged - reusing cached index (%s records)", dataset_id, f"{len(cached.records):,}")
+        cached.load_stats = {'mode': 'cached', 'rows_added': 0, 'load_time': round(time.time() - load_start, 3)}
+        return cached
+
+    # Concurrent loads of the same dataset share one download, parse and index build.
+    # Keyed by dataset ID so an append is computed once per new version; a
+    # caller that joined a load of an older version retries once for its own.
+    entry = _dataset_loads.do(dataset_id, refresh_dataset, dataset_id, file_blob, version, load_start)
+    if entry.version != version:
+        entry = _dataset_loads.do(dataset_id, refresh_dataset, dataset_id, file_blob, version, load_start)
+    return entry
+
+def is_dataset_cached(dataset_id: str, version: str) -> bool:
+    """
+    Whether a dataset version is loaded on this instance
+    """
+    with _store_lock:
+        cached = _datasets.get(dataset_id)
+    return cached is not None and cached.version == version
+
+def refresh_dataset(dataset_id: str, file_blob: 'storage.Blob', version: str, load_start: float) -> DatasetEntry:
+    """
+    Download and index a dataset version that is not cached yet
+    """
+    with _store_lock:
+        cached = _datasets.get(dataset_id)
+
+    # Another load may have finished this version while we waited
+    if cached and cached.version == version:
+        return cached
+
+    logger.info("📥 Downloading: %s", file_blob.name)
+    file_buffer = file_blob.download_as_bytes()
+    file_name = file_blob.name.split('/')[-1]
+
+    entry = None
+    if cached and INCREMENTAL_INDEX_ENABLED:
+        try:
+            entry = apply_appended_rows(cached, file_buffer, version)
+        except Exception as error:
+            logger.warning("⚠️ Incremental update failed, rebuilding index: %s", error)
+            entry = None
+
+    if entry is None:
+        entry = build_dataset_entry(dataset_id, version, file_name, file_buffer)
+
+    # Ingestion stage: searches of this version reuse the clusters instead of finding them
+    if DEDUP_ON_LOAD:
+        try:
+            entry.get_duplicate_clusters()
+        except Exception as error:
+            logger.warning("⚠️ Near-duplicate detection failed for %s: %s", dataset_id, error)
+
+    entry.load_stats['load_time'] = round(time.time() - load_start, 3)
+    metrics.observe('dataset_load_seconds', time.time() - load_start, mode=entry.load_stats['mode'])
+
+    with _store_lock:
+        _datasets[dataset_id] = entry
+        _datasets.move_to_end(dataset_id)
+        while len(_datasets) > MAX_CACHED_DATASETS:
+            evicted_id, _ = _datasets.popitem(last=False)
+            logger.info("🗑️ Evicted dataset %s from instance cache", evicted_id)
+
+    return entry
+
+def build_dataset_entry(dataset_id: str, version: str, file_name: str, file_buffer: bytes) -> DatasetEntry:
+    """
+    Fully parse, clean and index a dataset buffer
+    """
+    entry = DatasetEntry(dataset_id, version, file_name)
+
+    if get_file_extension(file_name) == 'csv':
+        entry.encoding = detect_encoding(file_buffer)
+        raw_rows = parse_csv_buffer(file_buffer, entry.encoding)
+        entry.csv_header = file_buffer.split(b'\n', 1)[0] + b'\n'
+    else:
+        raw_rows = parse_dataset_buffer(file_buffer, file_name)
+
+    entry.row_hashes = [hash_row(row) for row in raw_rows]
+    entry.records = validate_and_clean_data(raw_rows)
+    assign_row_ids(entry, entry.records)
+    entry.index = build_bm25_index(entry.records)
+    remember_source(entry, file_buffer)
+
+    entry.load_stats = {'mode': 'full', 'rows_added': len(entry.records)}
+    logger.info("✅ Indexed %s records from %s", f"{len(entry.records):,}", file_name)
+    return entry
+
+def apply_appended_rows(cached: DatasetEntry, file_buffer: bytes, version: str) -> Optional[DatasetEntry]:
+    """
+    Merge rows appended to a previously indexed file into a new entry
+
+    Returns None when the new file is not an append of the cached one.
+    """
+    delta_rows = None
+
+    # CSV fast path: the old file is a byte prefix, so only the tail needs parsing
+    if (cached.csv_header and cached.source_length and len(file_buffer) > cached.source_length
+            and hashlib.sha256(file_buffer[:cached.source_length]).hexdigest() == cached.source_digest):
+        tail = file_buffer[cached.source_length:]
+        delta_rows = parse_csv_buffer(cached.csv_header + tail, cached.encoding)
+
+    # General path: parse everything, but only clean and index rows whose hashes are new
+    if delta_rows is None:
+        raw_rows = parse_dataset_buffer(file_buffer, cached.file_name)
+        row_hashes = [hash_row(row) for row in raw_rows]
+        if len(row_hashes) < len(cached.row_hashes) or row_hashes[:len(cached.row_hashes)] != cached.row_hashes:
+            logger.info("🔄 Dataset changed beyond appended rows - full rebuild required")
+            return None
+        delta_rows = raw_rows[len(cached.row_hashes):]
+
+    delta_records = validate_and_clean_data(delta_rows)
+
+    entry = DatasetEntry(cached.dataset_id, version, cached.file_name)
+    entry.encoding = cached.encoding
+    entry.csv_header = cached.csv_header
+    entry.records = cached.records + delta_records
+    entry.row_ids = list(cached.row_ids)
+    entry.row_positions = dict(cached.row_positions)
+    assign_row_ids(entry, delta_records)
+    entry.row_hashes = cached.row_hashes + [hash_row(row) for row in delta_rows]
+    # Copy-on-append: the previous entry keeps its index and corpus statistics,
+    # so searches still running on it (or a failed update) never see the new rows
+    entry.index = cached.index.extended([tokenize_document(record) for record in delta_records])
+    remember_source(entry, file_buffer)
+
+    # Embed only the appended rows when the previous version already has vectors
+    with cached._dense_index_lock:
+        previous_dense_index = cached._dense_index
+    if previous_dense_index is not None:
+        entry._dense_index = previous_dense_index.extended(delta_records)
+
+    # Hash only the appended rows when duplicates are looked for again
+    with cached._duplicates_lock:
+        if cached._duplicates is not None:
+            entry._previous_signatures = cached._duplicates.signatures
+
+    entry.load_stats = {'mode': 'incremental', 'rows_added': len(delta_records)}
+    logger.info("➕ Merged %s appended records into index (%s total)", f"{len(delta_records):,}", f"{len(entry.records):,}")
+    return entry
+
+def assign_row_ids(entry: DatasetEntry, new_records: List[Dict[str, Any]]) -> None:
+    """
+    Assign stable IDs to newly added records
+
+    IDs are derived from the dataset ID and record content rather than the
+    dataset version, so appending rows never changes existing IDs.
+    """
+    for record in new_records:
+        row_id = generate_person_id(record, entry.dataset_id)
+        
+        # Identical rows get a numbered suffix in file order
+        if row_id in entry.row_positions:
+            suffix = 2
+            while f"{row_id}_{suffix}" in entry.row_positions:
+                suffix += 1
+            row_id = f"{row_id}_{suffix}"
+        
+        entry.row_positions[row_id] = len(entry.row_ids)
+        entry.row_ids.append(row_id)
+
+def remember_source(entry: DatasetEntry, file_buffer: bytes) -> None:
+    """
+    Record the raw file fingerprint used to detect pure appends next time
+    """
+    # A file without a trailing newline would glue appended bytes onto its last row
+    if entry.csv_header and file_buffer.endswith(b'\n'):
+        entry.source_length = len(file_buffer)
+        entry.source_digest = hashlib.sha256(file_buffer).hexdigest()
+    else:
+        entry.source_length = 0
+        entry.source_digest = ''
+
+def hash_row(row: Dict[str, Any]) -> str:
+    """
+    Content hash of a raw parsed row
+    """
+    payload = json.dumps(row, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def collect_dataset_metrics() -> List[metrics.Sample]:
+    """
+    Cached datasets with their record and index term counts
+    """
+    with _store_lock:
+        entries = list(_datasets.values())
+    samples: List[metrics.Sample] = [('datasets_cached', 'gauge', {}, len(entries))]
+    for entry in entries:
+        samples.append(('dataset_records', 'gauge', {'dataset': entry.dataset_id}, len(entry.records)))
+        samples.append(('dataset_index_terms', 'gauge', {'dataset': entry.dataset_id}, len(entry.index.postings)))
+        if entry._duplicates is not None:
+            samples.append(('dataset_duplicate_rows', 'gauge', {'dataset': entry.dataset_id}, entry._duplicates.stats['rows_suppressed']))
+    return samples
+
+metrics.register_collector(collect_dataset_metrics)
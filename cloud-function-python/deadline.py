@@ -0,0 +1,147 @@
+"""
+Per-request latency budgets
+
+A search may pass deadlineMs. Each stage gets a share of whatever is left of
+the budget when it starts; a stage that cannot finish in time is degraded
+(rule-based criteria, fallback scoring, no dedup or dense retrieval) instead
+of overrunning, and the degraded stages are reported with the results. Only
+a dataset that can't be loaded in time fails the request (DeadlineExceeded).
+"""
+
+import os
+import time
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from typing import Any, Callable, Dict, List, Optional
+
+from structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Configuration
+MIN_DEADLINE_MS = 1000
+MAX_DEADLINE_MS = int(os.getenv('MAX_DEADLINE_MS', '600000'))  # The function timeout
+RESPONSE_MARGIN_SECONDS = float(os.getenv('DEADLINE_RESPONSE_MARGIN_SECONDS', '0.5'))  # Kept for building the response
+LLM_BATCH_SECONDS_ESTIMATE = float(os.getenv('LLM_BATCH_SECONDS_ESTIMATE', '10'))
+
+DEADLINE_WORKERS = int(os.getenv('DEADLINE_WORKERS', '16'))
+MAX_ABANDONED_CALLS = int(os.getenv('DEADLINE_MAX_ABANDONED_CALLS', str(DEADLINE_WORKERS // 2)))
+
+# Share of the remaining budget a stage may use; later stages need the rest
+STAGE_BUDGET_SHARES = {
+    'criteria_generation': 0.35,
+    'dataset_loading': 0.8,
+    'dedup': 0.25,
+    'dense_retrieval': 0.25,
+    'llm_refinement': 1.0
+}
+
+# Stages that overran keep running here after the pipeline moved on
+_stage_executor = ThreadPoolExecutor(max_workers=DEADLINE_WORKERS, thread_name_prefix='deadline')
+
+# Timed-out calls that were already running and still occupy a worker
+_abandoned = {'calls': 0}
+_abandoned_lock = threading.Lock()
+
+# Recent LLM batch latency (exponential moving average)
+_batch_latency = {'seconds': LLM_BATCH_SECONDS_ESTIMATE}
+_batch_latency_lock = threading.Lock()
+BATCH_LATENCY_SMOOTHING = 0.3
+
+class DeadlineExceeded(Exception):
+    """
+    A stage that can't be degraded did not finish within the budget
+    """
+
+class Deadline:
+    """
+    Wall-clock budget of one request
+    """
+
+    def __init__(self, budget_ms: int, start_time: float):
+        self.budget_ms = budget_ms
+        self.expires_at = start_time + budget_ms / 1000
+        self.degraded_stages: List[str] = []
+
+    def remaining(self) -> float:
+        """
+        Seconds left for work, keeping a margin to build the response
+        """
+        return max(0.0, self.expires_at - time.time() - RESPONSE_MARGIN_SECONDS)
+
+    def stage_timeout(self, stage: str) -> float:
+        """
+        Seconds a stage may take from now
+        """
+        return self.remaining() * STAGE_BUDGET_SHARES.get(stage, 1.0)
+
+    def degrade(self, stage: str, reason: str) -> None:
+        if stage not in self.degraded_stages:
+            self.degraded_stages.append(stage)
+        logger.warning("⏰ Degrading %s: %s (%.1fs left)", stage, reason, self.remaining())
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'budget_ms': self.budget_ms,
+            'remaining_ms': int(max(0.0, self.expires_at - time.time()) * 1000),
+            'degraded_stages': list(self.degraded_stages)
+        }
+
+def parse_deadline_ms(value: Any) -> Optional[int]:
+    """
+    Validate a deadlineMs request value (None when absent)
+
+    Raises ValueError for values that are not a positive number.
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+        raise ValueError('deadlineMs must be a positive number of milliseconds')
+    return int(min(max(value, MIN_DEADLINE_MS), MAX_DEADLINE_MS))
+
+def run_with_timeout(timeout: float, func: Callable, *args, **kwargs) -> Any:
+    """
+    Run func on a worker thread and wait at most timeout seconds
+
+    Raises concurrent.futures.TimeoutError when it doesn't finish in time. A
+    call still queued then is cancelled; one already running keeps running
+    and its result is discarded. While MAX_ABANDONED_CALLS such calls hold
+    workers, new calls raise straight away so the caller falls back instead
+    of queueing behind them.
+    """
+    if timeout <= 0:
+        raise FuturesTimeoutError('no time left in the budget')
+    with _abandoned_lock:
+        if _abandoned['calls'] >= MAX_ABANDONED_CALLS:
+            logger.warning("⏰ %s abandoned calls still running - not starting another", _abandoned['calls'])
+            raise FuturesTimeoutError('deadline workers busy with abandoned calls')
+
+    future = _stage_executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+    try:
+        return future.result(timeout=timeout)
+    except FuturesTimeoutError:
+        if not future.cancel():
+            with _abandoned_lock:
+                _abandoned['calls'] += 1
+            future.add_done_callback(_release_abandoned)
+        raise
+
+def abandoned_calls() -> int:
+    with _abandoned_lock:
+        return _abandoned['calls']
+
+def _release_abandoned(future: Future) -> None:
+    with _abandoned_lock:
+        _abandoned['calls'] -= 1
+
+def estimate_batch_seconds() -> float:
+    """
+    Expected duration of the next LLM batch
+    """
+    with _batch_latency_lock:
+        return _batch_latency['seconds']
+
+def record_batch_seconds(seconds: float) -> None:
+    with _batch_latency_lock:
+        _batch_latency['seconds'] += BATCH_LATENCY_SMOOTHING * (seconds - _batch_latency['seconds'])
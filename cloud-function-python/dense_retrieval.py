@@ -0,0 +1,303 @@
+"""
+Dense retrieval over precomputed profile vectors
+
+This module handles:
+1. Pluggable embedders: LSA over the BM25 postings (default), feature
+   hashing, or an OpenAI embedding model
+2. A NumPy matrix of normalized profile vectors per dataset version,
+   extended for appended rows instead of recomputed
+3. Cosine similarity of every profile to a query, fused with the BM25
+   ranking in bm25_search
+
+Profiles are scored with one matrix-vector product rather than an ANN
+index: for the dataset sizes one instance holds, a rows x 128 float32
+product takes a few milliseconds.
+"""
+
+import os
+import re
+import math
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from bm25_search import BM25Index, tokenize_document, tokenize_text, create_searchable_document
+from llm_gateway import embed_texts
+from structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Configuration
+DENSE_EMBEDDER = os.getenv('DENSE_EMBEDDER', 'lsa')  # 'lsa', 'hashing' or 'openai'
+DENSE_DIM = int(os.getenv('DENSE_DIM', '128'))
+DENSE_VOCAB_SIZE = int(os.getenv('DENSE_VOCAB_SIZE', '20000'))
+DENSE_SVD_SAMPLE = int(os.getenv('DENSE_SVD_SAMPLE', '5000'))
+DENSE_EMBEDDING_MODEL = os.getenv('DENSE_EMBEDDING_MODEL', 'text-embedding-3-small')
+DENSE_EMBEDDING_BATCH = 256
+DENSE_MAX_DOCUMENT_CHARS = 8000
+
+# Terms in more than this share of profiles (field labels, etc.) carry no topic
+MAX_DOCUMENT_FREQUENCY = 0.5
+SVD_OVERSAMPLING = 10
+SVD_POWER_ITERATIONS = 2
+SPARSE_CHUNK_SIZE = 50000
+
+WORD_CHARS = re.compile(r'[a-z0-9]+')
+
+class TermEmbedder(ABC):
+    """
+    Embed token bags as tf-idf weighted sums of term vectors
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.idf: Dict[str, float] = {}
+        self.default_idf = 1.0
+
+    def fit(self, index: BM25Index, row_count: int) -> None:
+        """
+        Freeze IDF weights from the corpus so later rows embed consistently
+        """
+        self.idf = {
+            term: math.log((1 + row_count) / (1 + len(docs))) + 1
+            for term, docs in index.postings.items()
+        }
+        self.default_idf = math.log(1 + row_count) + 1
+
+    @abstractmethod
+    def term_vector(self, term: str) -> Optional[np.ndarray]:
+        """
+        Unit vector of an indexed term, or None for terms without one
+        """
+
+    def index_terms(self, index: BM25Index) -> List[str]:
+        return list(index.postings)
+
+    def embed_tokens(self, tokens: List[str]) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for term, frequency in Counter(tokens).items():
+            term_vector = self.term_vector(term)
+            if term_vector is not None:
+                vector += (1 + math.log(frequency)) * self.idf.get(term, self.default_idf) * term_vector
+        return normalize_rows(vector[None, :])[0]
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed_tokens(tokenize_text(text))
+
+    def embed_records(self, records: List[Dict[str, Any]]) -> np.ndarray:
+        if not records:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.vstack([self.embed_tokens(tokenize_document(record)) for record in records])
+
+    def embed_corpus(self, records: List[Dict[str, Any]], index: BM25Index) -> np.ndarray:
+        """
+        Embed every indexed profile term by term from the BM25 postings
+        """
+        row_count = len(records)
+        matrix = np.zeros((row_count, self.dim), dtype=np.float32)
+        for term in self.index_terms(index):
+            term_vector = self.term_vector(term)
+            if term_vector is None:
+                continue
+            doc_ids, frequencies = index.get_postings(term)
+            in_snapshot = doc_ids < row_count  # The index may cover more rows than ``records``
+            weights = (1 + np.log(frequencies[in_snapshot])) * self.idf.get(term, self.default_idf)
+            matrix[doc_ids[in_snapshot]] += weights[:, None].astype(np.float32) * term_vector
+        return normalize_rows(matrix)
+
+class HashingEmbedder(TermEmbedder):
+    """
+    Signed feature hashing of words and their character trigrams
+
+    Needs no fitting beyond IDF and tolerates spelling variants, but has no
+    notion of synonyms.
+    """
+
+    def __init__(self, dim: int):
+        super().__init__(dim)
+        self._vectors: Dict[str, Optional[np.ndarray]] = {}
+
+    def term_vector(self, term: str) -> Optional[np.ndarray]:
+        if term in self._vectors:
+            return self._vectors[term]
+
+        word = ''.join(WORD_CHARS.findall(term))
+        vector = None
+        if word:
+            padded = f'#{word}#'
+            features = [(word, 1.0)] + [(padded[i:i + 3], 0.5) for i in range(len(word))]
+            vector = np.zeros(self.dim, dtype=np.float32)
+            for feature, weight in features:
+                hashed = zlib.crc32(feature.encode('utf-8'))
+                vector[hashed % self.dim] += weight if hashed & 0x80000000 else -weight
+            vector = normalize_rows(vector[None, :])[0]
+
+        self._vectors[term] = vector
+        return vector
+
+class LsaEmbedder(TermEmbedder):
+    """
+    Latent semantic analysis of the dataset's own vocabulary
+
+    A randomized truncated SVD of the tf-idf matrix of a row sample places
+    terms that occur in similar profiles (e.g. "fintech" and "payments")
+    close together.
+    """
+
+    def __init__(self, dim: int):
+        super().__init__(dim)
+        self.vocabulary: List[str] = []
+        self.term_positions: Dict[str, int] = {}
+        self.term_vectors = np.zeros((0, dim), dtype=np.float32)
+
+    def fit(self, index: BM25Index, row_count: int) -> None:
+        super().fit(index, row_count)
+        max_df = max(2, int(row_count * MAX_DOCUMENT_FREQUENCY))
+        candidates = [(len(docs), term) for term, docs in index.postings.items() if 2 <= len(docs) <= max_df]
+        self.vocabulary = [term for _, term in sorted(candidates, key=lambda item: (-item[0], item[1]))[:DENSE_VOCAB_SIZE]]
+        self.term_positions = {term: i for i, term in enumerate(self.vocabulary)}
+
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(row_count, size=min(row_count, DENSE_SVD_SAMPLE), replace=False))
+        sample_positions = np.full(row_count, -1, dtype=np.int64)
+        sample_positions[sample] = np.arange(len(sample))
+
+        # Sparse tf-idf matrix of the sample as (row, column, value) triplets
+        rows, cols, vals = [], [], []
+        for col, term in enumerate(self.vocabulary):
+            doc_ids, frequencies = index.get_postings(term)
+            in_snapshot = doc_ids < row_count
+            positions = sample_positions[doc_ids[in_snapshot]]
+            sampled = positions >= 0
+            rows.append(positions[sampled])
+            cols.append(np.full(int(sampled.sum()), col, dtype=np.int64))
+            vals.append((1 + np.log(frequencies[in_snapshot][sampled])) * self.idf[term])
+
+        rank = min(self.dim, len(self.vocabulary) - 1, len(sample) - 1)
+        if rank < 1 or not rows:
+            self.dim = max(rank, 1)
+            self.term_vectors = np.zeros((len(self.vocabulary), self.dim), dtype=np.float32)
+            return
+
+        rows, cols, vals = np.concatenate(rows), np.concatenate(cols), np.concatenate(vals).astype(np.float32)
+        row_norms = np.sqrt(np.bincount(rows, weights=vals ** 2, minlength=len(sample))).astype(np.float32)
+        vals /= np.maximum(row_norms[rows], 1e-12)
+
+        # Randomized range finder with power iterations (Halko et al.)
+        width = rank + SVD_OVERSAMPLING
+        omega = rng.standard_normal((len(self.vocabulary), width)).astype(np.float32)
+        basis = sparse_dot(rows, cols, vals, omega, len(sample))
+        for _ in range(SVD_POWER_ITERATIONS):
+            basis, _ = np.linalg.qr(basis)
+            term_basis, _ = np.linalg.qr(sparse_dot(cols, rows, vals, basis, len(self.vocabulary)))
+            basis = sparse_dot(rows, cols, vals, term_basis, len(sample))
+        basis, _ = np.linalg.qr(basis)
+
+        # Right singular vectors of S are the left singular vectors of S^T Q
+        projected = sparse_dot(cols, rows, vals, basis, len(self.vocabulary))
+        term_singular_vectors, _, _ = np.linalg.svd(projected, full_matrices=False)
+
+        self.dim = rank
+        self.term_vectors = np.ascontiguousarray(term_singular_vectors[:, :rank], dtype=np.float32)
+
+    def term_vector(self, term: str) -> Optional[np.ndarray]:
+        position = self.term_positions.get(term)
+        return self.term_vectors[position] if position is not None else None
+
+    def index_terms(self, index: BM25Index) -> List[str]:
+        return self.vocabulary
+
+class OpenAIEmbedder:
+    """
+    Profile embeddings from an OpenAI embedding model
+
+    Embedding a dataset makes one API call per DENSE_EMBEDDING_BATCH profiles.
+    Calls go through llm_gateway, so they share the model's rate limits and
+    retries and are accounted in the request's LLM usage.
+    """
+
+    def __init__(self, model: str):
+        self.model = model
+
+    def fit(self, index: BM25Index, row_count: int) -> None:
+        pass
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return normalize_rows(np.array(embed_texts(self.model, [text], 'query_embedding'), dtype=np.float32))[0]
+
+    def embed_records(self, records: List[Dict[str, Any]]) -> np.ndarray:
+        texts = [create_searchable_document(record)[:DENSE_MAX_DOCUMENT_CHARS] for record in records]
+        vectors = []
+        for start in range(0, len(texts), DENSE_EMBEDDING_BATCH):
+            vectors.extend(embed_texts(self.model, texts[start:start + DENSE_EMBEDDING_BATCH], 'profile_embedding'))
+        return normalize_rows(np.array(vectors, dtype=np.float32))
+
+    def embed_corpus(self, records: List[Dict[str, Any]], index: BM25Index) -> np.ndarray:
+        return self.embed_records(records)
+
+class DenseIndex:
+    """
+    Normalized profile vectors of one dataset version
+    """
+
+    def __init__(self, embedder: Any, matrix: np.ndarray):
+        self.embedder = embedder
+        self.matrix = matrix
+
+    def extended(self, records: List[Dict[str, Any]]) -> 'DenseIndex':
+        """
+        Copy of the index with appended records embedded by the same embedder
+        """
+        return DenseIndex(self.embedder, np.vstack([self.matrix, self.embedder.embed_records(records)]))
+
+    def score_query(self, query_text: str, row_count: int) -> np.ndarray:
+        """
+        Cosine similarity of the query to the first row_count profiles
+        """
+        query_vector = self.embedder.embed_query(query_text)
+        return (self.matrix[:row_count] @ query_vector).astype(np.float64)
+
+def create_embedder(name: str = DENSE_EMBEDDER) -> Any:
+    """
+    Create the configured embedder
+    """
+    if name == 'openai':
+        return OpenAIEmbedder(DENSE_EMBEDDING_MODEL)
+    if name == 'hashing':
+        return HashingEmbedder(DENSE_DIM)
+    return LsaEmbedder(DENSE_DIM)
+
+def build_dense_index(records: List[Dict[str, Any]], index: BM25Index) -> DenseIndex:
+    """
+    Fit the embedder on a dataset version and embed all of its profiles
+    """
+    build_start = time.time()
+    embedder = create_embedder()
+    embedder.fit(index, len(records))
+    matrix = embedder.embed_corpus(records, index)
+    logger.info(
+        "🧭 Built %s vector index: %s profiles x %s dims in %.1fs",
+        DENSE_EMBEDDER, f"{len(records):,}", matrix.shape[1], time.time() - build_start
+    )
+    return DenseIndex(embedder, matrix)
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    L2-normalize each row, leaving all-zero rows at zero
+    """
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+def sparse_dot(rows: np.ndarray, cols: np.ndarray, vals: np.ndarray, dense: np.ndarray, row_count: int) -> np.ndarray:
+    """
+    Product of a sparse (rows, cols, vals) matrix with a dense matrix
+    """
+    result = np.zeros((row_count, dense.shape[1]), dtype=np.float32)
+    for start in range(0, len(rows), SPARSE_CHUNK_SIZE):
+        end = start + SPARSE_CHUNK_SIZE
+        np.add.at(result, rows[start:end], vals[start:end, None] * dense[cols[start:end]])
+    return result
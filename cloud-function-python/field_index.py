@@ -0,0 +1,310 @@
+"""
+Per-field inverted indexes for hard constraint filtering
+
+This module handles:
+1. Token postings for name, location, company and title columns
+2. Turning each constraint term into a row bitmap (numpy bool mask)
+3. Combining constraint bitmaps with AND/OR/NOT
+4. An LRU cache of term bitmaps per (dataset version, field, term)
+
+Postings only narrow the candidate rows; every candidate is still checked
+with the same substring test as before, so a term matches exactly the rows
+whose field text contains it. Indexed tokens containing a term token are
+found through a 2-/3-gram index of each field's vocabulary. Categories
+without a recognizable column fall back to the whole record ('any').
+failed_constraint checks single records against the same columns, so
+searches without an index filter exactly the same rows.
+"""
+
+import os
+import re
+import json
+import threading
+from collections import Counter, OrderedDict
+from typing import List, Dict, Any, Optional, Set, Tuple
+
+import numpy as np
+
+import metrics
+from structured_logging import get_logger, debug_enabled, LOG_SAMPLE_SIZE
+
+logger = get_logger(__name__)
+
+# Configuration
+FILTER_CACHE_MAX_ENTRIES = int(os.getenv('FILTER_CACHE_MAX_ENTRIES', '256'))
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+def column_pattern(*words: str) -> 're.Pattern[str]':
+    """
+    Pattern for column names containing one of the words between underscores
+    """
+    return re.compile(r'(?:^|_)(?:%s)(?:_|$)' % '|'.join(words))
+
+# Column names per constraint category (field names are cleaned to snake_case at parse time,
+# so only words split by underscores or the name's ends count: "firm" is not in "confirmed")
+NAME_COLUMNS = {'name', 'full_name', 'fullname', 'first_name', 'last_name'}
+FIELD_COLUMN_PATTERNS = {
+    'location': column_pattern('location', 'city', 'state', 'country', 'region', '(?<!email_)address', 'metro'),
+    'company': column_pattern('company', 'companyname', 'organization', 'organisation', 'org', 'employer', 'firm'),
+    'title': column_pattern('title', 'jobtitle', 'position', 'role', 'headline', 'occupation', 'job')
+}
+
+# Substrings of vocabulary tokens that are indexed; shorter term tokens scan the vocabulary
+VOCABULARY_GRAM_SIZES = (2, 3)
+
+# Hard constraint keys in evaluation order, with the category they search
+CONSTRAINT_FIELDS = [
+    ('nameMatches', 'name'),
+    ('locationRequirements', 'location'),
+    ('titleRequirements', 'title'),
+    ('companyRequirements', 'company')
+]
+
+# Term bitmaps by (dataset version, category, term), least recently used first
+_bitmap_cache: 'OrderedDict[Tuple[str, str, str], np.ndarray]' = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+class FieldIndex:
+    """
+    Inverted token indexes over the constraint fields of one dataset version
+    """
+
+    def __init__(self, records: List[Dict[str, Any]], version: str):
+        self.records = records
+        self.version = version
+        self.row_count = len(records)
+        self.columns = detect_constraint_columns(records)
+        self._texts: Dict[str, List[str]] = {}
+        self._postings: Dict[str, Dict[str, np.ndarray]] = {}
+        self._vocabularies: Dict[str, List[str]] = {}
+        self._grams: Dict[str, Dict[str, List[int]]] = {}
+        self._lock = threading.Lock()
+
+    def resolve_category(self, category: str) -> str:
+        """
+        Category actually searched: the field itself, or 'any' without matching columns
+        """
+        return resolve_column_category(self.columns, category)
+
+    def term_mask(self, category: str, term: str) -> np.ndarray:
+        """
+        Bitmap of rows whose field text contains the term
+        """
+        category = self.resolve_category(category)
+        term = term.lower().strip()
+        key = (self.version, category, term)
+
+        with _cache_lock:
+            mask = _bitmap_cache.get(key)
+            if mask is not None:
+                _bitmap_cache.move_to_end(key)
+                _cache_stats['hits'] += 1
+                return mask
+            _cache_stats['misses'] += 1
+
+        texts = self._get_field(category)
+        candidates = self._candidate_rows(category, term)
+        mask = np.zeros(self.row_count, dtype=bool)
+        if candidates is None:
+            candidates = range(self.row_count)
+        for row in candidates:
+            if term in texts[row]:
+                mask[row] = True
+
+        with _cache_lock:
+            _bitmap_cache[key] = mask
+            while len(_bitmap_cache) > FILTER_CACHE_MAX_ENTRIES:
+                _bitmap_cache.popitem(last=False)
+                _cache_stats['evictions'] += 1
+        return mask
+
+    def any_term_mask(self, category: str, terms: List[str]) -> np.ndarray:
+        """
+        OR of the term bitmaps
+        """
+        mask = np.zeros(self.row_count, dtype=bool)
+        for term in terms:
+            if term and term.strip():
+                mask |= self.term_mask(category, term)
+        return mask
+
+    def constraint_mask(self, hard_constraints: Dict[str, List[str]], rejections: Optional[Counter] = None) -> np.ndarray:
+        """
+        AND of the hard constraints, with NOT for exclusions
+
+        Rejections are attributed to the first failing constraint, in the same
+        order the per-record check used.
+        """
+        remaining = np.ones(self.row_count, dtype=bool)
+        checks = [
+            (category, self.any_term_mask(category, constraint_terms(hard_constraints, key)))
+            for key, category in CONSTRAINT_FIELDS if constraint_terms(hard_constraints, key)
+        ]
+        exclusions = constraint_terms(hard_constraints, 'exclusions')
+        if exclusions:
+            checks.append(('exclusion', ~self.any_term_mask('any', exclusions)))
+
+        for constraint, mask in checks:
+            failing = remaining & ~mask
+            if rejections is not None:
+                rejections[constraint] += int(failing.sum())
+            if debug_enabled():
+                for row in np.nonzero(failing)[0][:LOG_SAMPLE_SIZE]:
+                    logger.debug("❌ %s constraint failed for %s", constraint.capitalize(), self.records[row].get('name', 'unknown'))
+            remaining &= mask
+
+        return remaining
+
+    def record_passes(self, record: Dict[str, Any], hard_constraints: Dict[str, List[str]]) -> bool:
+        """
+        Whether a record outside the index (e.g. a merged canonical record)
+        passes the hard constraints, matching the same fields as constraint_mask
+        """
+        return failed_constraint(record, hard_constraints, self.columns) is None
+
+    def _get_field(self, category: str) -> List[str]:
+        """
+        Build the searchable texts, token postings and vocabulary grams for a
+        category on first use
+        """
+        with self._lock:
+            if category not in self._postings:
+                texts = [record_text(record, category, self.columns) for record in self.records]
+
+                rows_by_token: Dict[str, List[int]] = {}
+                for row, text in enumerate(texts):
+                    for token in set(TOKEN_PATTERN.findall(text)):
+                        rows_by_token.setdefault(token, []).append(row)
+
+                vocabulary = list(rows_by_token)
+                grams: Dict[str, List[int]] = {}
+                for position, token in enumerate(vocabulary):
+                    for gram in token_grams(token, VOCABULARY_GRAM_SIZES):
+                        grams.setdefault(gram, []).append(position)
+
+                self._texts[category] = texts
+                self._vocabularies[category] = vocabulary
+                self._grams[category] = grams
+                self._postings[category] = {
+                    token: np.array(rows, dtype=np.int64) for token, rows in rows_by_token.items()
+                }
+                logger.info("🗂️ Indexed %s field (%s) with %s terms", category, ', '.join(self.columns.get(category, ['all'])), len(rows_by_token))
+            return self._texts[category]
+
+    def _matching_tokens(self, category: str, query_token: str) -> List[str]:
+        """
+        Indexed tokens of a category that contain the query token
+        """
+        vocabulary, grams = self._vocabularies[category], self._grams[category]
+        if len(query_token) < min(VOCABULARY_GRAM_SIZES):
+            return [token for token in vocabulary if query_token in token]
+        if len(query_token) <= max(VOCABULARY_GRAM_SIZES):
+            return [vocabulary[position] for position in grams.get(query_token, [])]
+
+        # Tokens containing every trigram of the query token, verified on the full token
+        gram_lists = sorted((grams.get(gram, []) for gram in token_grams(query_token, (max(VOCABULARY_GRAM_SIZES),))), key=len)
+        positions: Set[int] = set(gram_lists[0])
+        for gram_list in gram_lists[1:]:
+            if not positions:
+                break
+            positions.intersection_update(gram_list)
+        return [vocabulary[position] for position in positions if query_token in vocabulary[position]]
+
+    def _candidate_rows(self, category: str, term: str) -> Optional[np.ndarray]:
+        """
+        Rows that contain every token of the term as part of an indexed token
+
+        Returns None when the term has no tokens to narrow on.
+        """
+        postings = self._postings[category]
+        candidates = None
+        for query_token in sorted(set(TOKEN_PATTERN.findall(term)), key=len, reverse=True):
+            # A term token can sit inside a longer field token ("york" in "newyork")
+            matching = [postings[token] for token in self._matching_tokens(category, query_token)]
+            rows = np.unique(np.concatenate(matching)) if matching else np.array([], dtype=np.int64)
+            candidates = rows if candidates is None else np.intersect1d(candidates, rows, assume_unique=True)
+            if not len(candidates):
+                break
+        return candidates
+
+def token_grams(token: str, sizes: Tuple[int, ...]) -> Set[str]:
+    """
+    Distinct substrings of the given lengths of a token
+    """
+    return {token[i:i + size] for size in sizes for i in range(len(token) - size + 1)}
+
+def constraint_terms(hard_constraints: Dict[str, List[str]], key: str) -> List[str]:
+    """
+    Lowercased non-empty terms of one hard constraint
+    """
+    return [term.lower().strip() for term in hard_constraints.get(key) or [] if term and term.strip()]
+
+def resolve_column_category(columns: Dict[str, List[str]], category: str) -> str:
+    """
+    The category itself when it has columns, else 'any' (the whole record)
+    """
+    return category if category == 'any' or columns.get(category) else 'any'
+
+def record_text(record: Dict[str, Any], category: str, columns: Dict[str, List[str]]) -> str:
+    """
+    Lowercased text of a record's columns for a category
+    """
+    if category == 'any':
+        return json.dumps(record).lower()
+    # Newline-separated so a term can't match across two columns
+    return '\n'.join(str(record[column]).lower() for column in columns[category] if record.get(column))
+
+def failed_constraint(
+    record: Dict[str, Any],
+    hard_constraints: Dict[str, List[str]],
+    columns: Dict[str, List[str]]
+) -> Optional[Tuple[str, List[str]]]:
+    """
+    First hard constraint a record fails, as (constraint, terms), or None
+
+    Each category is searched only in its ``columns`` (from
+    detect_constraint_columns), in the order constraint_mask applies them.
+    """
+    for key, category in CONSTRAINT_FIELDS:
+        terms = constraint_terms(hard_constraints, key)
+        if terms:
+            text = record_text(record, resolve_column_category(columns, category), columns)
+            if not any(term in text for term in terms):
+                return category, terms
+    exclusions = constraint_terms(hard_constraints, 'exclusions')
+    if exclusions:
+        text = record_text(record, 'any', columns)
+        for term in exclusions:
+            if term in text:
+                return 'exclusion', [term]
+    return None
+
+def detect_constraint_columns(records: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """
+    Find the columns that hold names, locations, companies and titles
+    """
+    keys = list(dict.fromkeys(key for record in records for key in record))
+    columns = {'name': [key for key in keys if key in NAME_COLUMNS]}
+    for category, pattern in FIELD_COLUMN_PATTERNS.items():
+        columns[category] = [key for key in keys if pattern.search(key)]
+    return columns
+
+def get_filter_cache_stats() -> Dict[str, Any]:
+    """
+    Hit/miss counters of the term bitmap cache
+    """
+    with _cache_lock:
+        return {**_cache_stats, 'entries': len(_bitmap_cache)}
+
+def collect_filter_cache_metrics() -> List[metrics.Sample]:
+    stats = get_filter_cache_stats()
+    return [
+        ('filter_cache_lookups_total', 'counter', {'result': 'hit'}, stats['hits']),
+        ('filter_cache_lookups_total', 'counter', {'result': 'miss'}, stats['misses']),
+        ('filter_cache_evictions_total', 'counter', {}, stats['evictions']),
+        ('filter_cache_entries', 'gauge', {}, stats['entries'])
+    ]
+
+metrics.register_collector(collect_filter_cache_metrics)
@@ -0,0 +1,99 @@
+"""
+Bounded in-process job queue for asynchronous searches
+
+This module handles:
+1. A fixed pool of worker threads started on first use
+2. Admission control: submissions are rejected once the queue is full
+3. Queue statistics for status responses and monitoring
+
+Jobs run after the HTTP response is sent, so the instance needs CPU
+allocated outside of requests for background work to make progress.
+"""
+
+import os
+import time
+import queue
+import threading
+import contextvars
+from typing import Callable, Dict, Any, List
+
+from structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Configuration
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+JOB_QUEUE_MAX_PENDING = int(os.getenv('JOB_QUEUE_MAX_PENDING', '32'))
+
+class JobQueue:
+    """
+    Work queue drained by a fixed number of worker threads
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_pending: int = JOB_QUEUE_MAX_PENDING):
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.active_jobs = 0
+        self.completed_jobs = 0
+        self.failed_jobs = 0
+        self.rejected_jobs = 0
+        self._queue: 'queue.Queue' = queue.Queue(maxsize=max_pending)
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def submit(self, job_id: str, func: Callable, *args, **kwargs) -> bool:
+        """
+        Enqueue a job; returns False when the queue is full
+
+        The job runs in a copy of the caller's context (e.g. the request's log settings).
+        """
+        self._ensure_workers()
+        try:
+            self._queue.put_nowait((job_id, func, args, kwargs, time.time(), contextvars.copy_context()))
+            return True
+        except queue.Full:
+            with self._lock:
+                self.rejected_jobs += 1
+            logger.warning("🚦 Job queue full (%s pending) - rejecting job %s", self.max_pending, job_id)
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'pending': self._queue.qsize(),
+                'max_pending': self.max_pending,
+                'active': self.active_jobs,
+                'completed': self.completed_jobs,
+                'failed': self.failed_jobs,
+                'rejected': self.rejected_jobs
+            }
+
+    def _ensure_workers(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f'search-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _worker(self) -> None:
+        while True:
+            job_id, func, args, kwargs, enqueued_at, context = self._queue.get()
+            with self._lock:
+                self.active_jobs += 1
+            logger.info("⚙️ Starting job %s after %.1fs in queue", job_id, time.time() - enqueued_at)
+
+            try:
+                context.run(func, *args, **kwargs)
+                with self._lock:
+                    self.completed_jobs += 1
+            except Exception as error:
+                with self._lock:
+                    self.failed_jobs += 1
+                logger.error("❌ Job %s failed: %s", job_id, error)
+            finally:
+                with self._lock:
+                    self.active_jobs -= 1
+                self._queue.task_done()
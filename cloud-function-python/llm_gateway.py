@@ -0,0 +1,376 @@
+"""
+Shared gateway for every LLM call of the process
+
+This module handles:
+1. One pooled HTTP client shared by all LangChain OpenAI chat and embedding
+   models
+2. Token buckets for requests and tokens per minute, per model
+3. A concurrency limit per model
+4. Retries with jittered exponential backoff that honor Retry-After
+5. Coalescing identical in-flight prompts (single-flight)
+
+A 429 pauses the model's buckets for the Retry-After interval, so callers
+queue briefly instead of all failing into fallback results at once.
+"""
+
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import metrics
+from single_flight import SingleFlight
+from llm_usage import record_llm_call
+from token_budget import estimate_tokens
+from structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Configuration
+LLM_RPM_LIMIT = int(os.getenv('LLM_RPM_LIMIT', '500'))  # 0 disables the request bucket
+LLM_TPM_LIMIT = int(os.getenv('LLM_TPM_LIMIT', '300000'))  # 0 disables the token bucket
+LLM_MODEL_CONCURRENCY = int(os.getenv('LLM_MODEL_CONCURRENCY', '16'))
+LLM_MODEL_LIMITS = json.loads(os.getenv('LLM_MODEL_LIMITS', '{}'))  # {"gpt-4o": {"rpm": ..., "tpm": ..., "concurrency": ...}}
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '4'))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv('LLM_BACKOFF_BASE_SECONDS', '1.0'))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv('LLM_BACKOFF_MAX_SECONDS', '30'))
+LLM_REQUEST_TIMEOUT_SECONDS = float(os.getenv('LLM_REQUEST_TIMEOUT_SECONDS', '120'))
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv('LLM_HTTP_MAX_CONNECTIONS', '100'))
+
+# Status codes worth retrying: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+RETRYABLE_ERROR_NAMES = {'APIConnectionError', 'APITimeoutError', 'ConnectError', 'ReadTimeout', 'RemoteProtocolError'}
+
+# Completion tokens reserved per call on top of the prompt estimate
+COMPLETION_TOKEN_RESERVE = 1000
+
+_http_client = None
+_chat_models: Dict[Tuple[str, float], Any] = {}
+_embedding_models: Dict[str, Any] = {}
+_limiters: Dict[str, 'ModelLimiter'] = {}
+_gateway_lock = threading.Lock()
+_stats = {'calls': 0, 'retries': 0, 'rate_limited': 0, 'failures': 0, 'throttle_wait_seconds': 0.0}
+
+# Identical prompts already in flight share one API call
+llm_requests = SingleFlight('LLM')
+
+class TokenBucket:
+    """
+    Continuously refilling budget of units per minute
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.available = float(per_minute)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float) -> float:
+        """
+        Take units, waiting for the bucket to refill; returns seconds waited
+        """
+        amount = min(amount, self.capacity)  # A call larger than the bucket waits for a full one
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.available >= amount:
+                    self.available -= amount
+                    return waited
+                delay = max(self.paused_until - now, (amount - self.available) / self.rate)
+            time.sleep(delay)
+            waited += delay
+
+    def refund(self, amount: float) -> None:
+        """
+        Return units reserved beyond what a call actually used
+        """
+        with self._lock:
+            self.available = min(self.capacity, self.available + amount)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Hold every caller back, e.g. after the API answered 429
+        """
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+class ModelLimiter:
+    """
+    Rate and concurrency limits of one model
+    """
+
+    def __init__(self, model: str):
+        limits = LLM_MODEL_LIMITS.get(model, {})
+        rpm = limits.get('rpm', LLM_RPM_LIMIT)
+        tpm = limits.get('tpm', LLM_TPM_LIMIT)
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.concurrency = threading.BoundedSemaphore(limits.get('concurrency', LLM_MODEL_CONCURRENCY))
+
+    def acquire(self, tokens: int) -> float:
+        waited = 0.0
+        if self.requests:
+            waited += self.requests.acquire(1)
+        if self.tokens:
+            waited += self.tokens.acquire(tokens)
+        return waited
+
+    def pause(self, seconds: float) -> None:
+        for bucket in (self.requests, self.tokens):
+            if bucket:
+                bucket.pause(seconds)
+
+def get_http_client():
+    """
+    Pooled HTTP client shared by all chat models, created on first use
+    """
+    global _http_client
+    with _gateway_lock:
+        if _http_client is None:
+            import httpx
+
+            _http_client = httpx.Client(
+                limits=httpx.Limits(max_connections=LLM_HTTP_MAX_CONNECTIONS, max_keepalive_connections=LLM_HTTP_MAX_CONNECTIONS),
+                timeout=httpx.Timeout(LLM_REQUEST_TIMEOUT_SECONDS, connect=10.0)
+            )
+        return _http_client
+
+class EmbeddingResponse:
+    """
+    Vectors of one embedding call, with its estimated token usage
+    """
+
+    def __init__(self, vectors: List[List[float]], input_tokens: int):
+        self.vectors = vectors
+        self.usage_metadata = {'input_tokens': input_tokens, 'output_tokens': 0, 'total_tokens': input_tokens}
+
+def is_api_key_configured(api_key: Optional[str]) -> bool:
+    return bool(api_key and api_key.startswith('sk-') and len(api_key) > 20)
+
+def get_chat_model(model: str, temperature: float):
+    """
+    Get the shared LangChain chat model for a model and temperature
+
+    Returns None when the OpenAI API key is not configured. Retries are left
+    to the gateway, so the OpenAI SDK's own retries are turned off.
+    """
+    key = (model, temperature)
+    if key in _chat_models:
+        return _chat_models[key]
+
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not is_api_key_configured(api_key):
+        logger.warning('⚠️ OpenAI API key not configured properly. Key: %s...', api_key[:10] if api_key else "None")
+        chat_model = None
+    else:
+        try:
+            from langchain_openai import ChatOpenAI
+
+            chat_model = ChatOpenAI(
+                model=model,
+                api_key=api_key,
+                temperature=temperature,
+                max_retries=0,
+                http_client=get_http_client()
+            )
+            logger.info('✅ OpenAI chat model %s initialized', model)
+        except Exception as e:
+            chat_model = None
+            logger.warning('⚠️ Failed to initialize OpenAI chat model %s: %s', model, e)
+
+    with _gateway_lock:
+        return _chat_models.setdefault(key, chat_model)
+
+def get_embedding_model(model: str):
+    """
+    Get the shared LangChain embedding model, or None without an API key
+    """
+    if model in _embedding_models:
+        return _embedding_models[model]
+
+    api_key = os.getenv('OPENAI_API_KEY')
+    embedding_model = None
+    if is_api_key_configured(api_key):
+        from langchain_openai import OpenAIEmbeddings
+
+        embedding_model = OpenAIEmbeddings(model=model, api_key=api_key, max_retries=0, http_client=get_http_client())
+
+    with _gateway_lock:
+        return _embedding_models.setdefault(model, embedding_model)
+
+def get_limiter(model: str) -> ModelLimiter:
+    with _gateway_lock:
+        limiter = _limiters.get(model)
+        if limiter is None:
+            limiter = _limiters[model] = ModelLimiter(model)
+        return limiter
+
+def invoke_llm(llm: Any, messages: List[Any], purpose: str = 'other') -> Any:
+    """
+    Call a chat model through the rate limits, retrying transient failures
+
+    Identical prompts already in flight share one API call. ``purpose``
+    labels the call in the usage accounting of the current request.
+    """
+    return llm_requests.do(prompt_key(llm.model_name, messages), call_with_retries, llm, messages, purpose)
+
+def embed_texts(model: str, texts: List[str], purpose: str = 'embedding') -> List[List[float]]:
+    """
+    Embed texts with an OpenAI embedding model through the rate limits
+
+    The call is accounted like a chat call, with estimated input tokens.
+    """
+    embedding_model = get_embedding_model(model)
+    if embedding_model is None:
+        raise RuntimeError('OpenAI API key not configured for embeddings')
+    input_tokens = sum(estimate_tokens(text) for text in texts)
+    response = call_model_with_retries(
+        model, input_tokens, lambda: EmbeddingResponse(embedding_model.embed_documents(texts), input_tokens), purpose
+    )
+    return response.vectors
+
+def call_with_retries(llm: Any, messages: List[Any], purpose: str = 'other') -> Any:
+    """
+    Invoke a chat model within its limits, backing off on transient errors
+    """
+    reserved_tokens = sum(estimate_tokens(str(message.content)) for message in messages) + COMPLETION_TOKEN_RESERVE
+    return call_model_with_retries(llm.model_name, reserved_tokens, lambda: llm.invoke(messages), purpose)
+
+def call_model_with_retries(model: str, reserved_tokens: int, call: Callable[[], Any], purpose: str) -> Any:
+    """
+    Make an API call of a model within its limits, backing off on transient errors
+    """
+    limiter = get_limiter(model)
+    started = time.time()
+
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        waited = limiter.acquire(reserved_tokens)
+        with _gateway_lock:
+            _stats['calls'] += 1
+            _stats['throttle_wait_seconds'] += waited
+        metrics.observe('llm_throttle_wait_seconds', waited, model=model)
+
+        call_start = time.time()
+        try:
+            with limiter.concurrency:
+                response = call()
+        except Exception as error:
+            retryable, status_code = classify_error(error)
+            metrics.inc('llm_calls_total', model=model, outcome=str(status_code or type(error).__name__))
+            if not retryable or attempt == LLM_MAX_RETRIES:
+                with _gateway_lock:
+                    _stats['failures'] += 1
+                metrics.inc('llm_failures_total', model=model)
+                record_llm_call(model, purpose, None, time.time() - started, attempt + 1)
+                raise
+
+            delay = backoff_delay(attempt, get_retry_after(error))
+            with _gateway_lock:
+                _stats['retries'] += 1
+                _stats['rate_limited'] += status_code == 429
+            metrics.inc('llm_retries_total', model=model)
+            if status_code == 429:
+                limiter.pause(delay)  # Every caller of the model waits, not just this one
+            logger.warning(
+                '⏳ %s call failed (%s), retry %s/%s in %.1fs',
+                model, status_code or type(error).__name__, attempt + 1, LLM_MAX_RETRIES, delay
+            )
+            time.sleep(delay)
+            continue
+
+        metrics.inc('llm_calls_total', model=model, outcome='success')
+        metrics.observe('llm_call_seconds', time.time() - call_start, model=model)
+        record_llm_call(model, purpose, response, time.time() - started, attempt + 1)
+        settle_token_reservation(limiter, reserved_tokens, response)
+        return response
+
+def classify_error(error: Exception) -> Tuple[bool, Optional[int]]:
+    """
+    Whether an API error is transient, and its HTTP status code if any
+    """
+    status_code = getattr(error, 'status_code', None)
+    if status_code is None and getattr(error, 'response', None) is not None:
+        status_code = getattr(error.response, 'status_code', None)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES, status_code
+    return type(error).__name__ in RETRYABLE_ERROR_NAMES, None
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """
+    Seconds the API asked us to wait, from Retry-After(-ms) headers
+    """
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        value = headers.get('retry-after')
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        pass
+    return None
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    Full-jitter exponential backoff, never shorter than Retry-After
+    """
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+    if retry_after is not None:
+        delay = min(LLM_BACKOFF_MAX_SECONDS, retry_after) + random.uniform(0, LLM_BACKOFF_BASE_SECONDS)
+    return delay
+
+def settle_token_reservation(limiter: ModelLimiter, reserved_tokens: int, response: Any) -> None:
+    """
+    Refund the part of the token reservation the call did not use
+    """
+    usage = getattr(response, 'usage_metadata', None) or {}
+    used_tokens = usage.get('total_tokens')
+    if limiter.tokens and used_tokens is not None and used_tokens < reserved_tokens:
+        limiter.tokens.refund(reserved_tokens - used_tokens)
+
+def prompt_key(model_name: str, messages: List[Any]) -> str:
+    """
+    Key identifying an LLM call by model and message contents
+    """
+    payload = json.dumps(
+        [model_name] + [[type(message).__name__, message.content] for message in messages],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def get_gateway_stats() -> Dict[str, Any]:
+    """
+    Call, retry and throttling counters plus single-flight sharing
+    """
+    with _gateway_lock:
+        stats = dict(_stats)
+    stats['throttle_wait_seconds'] = round(stats['throttle_wait_seconds'], 3)
+    stats['single_flight'] = llm_requests.stats()
+    return stats
+
+def collect_gateway_metrics() -> List[metrics.Sample]:
+    """
+    Prompts served from an identical in-flight call, and calls in flight
+    """
+    sharing = llm_requests.stats()
+    return [
+        ('llm_single_flight_shared_total', 'counter', {}, sharing['shared']),
+        ('llm_single_flight_in_flight', 'gauge', {}, sharing['in_flight'])
+    ]
+
+metrics.register_collector(collect_gateway_metrics)
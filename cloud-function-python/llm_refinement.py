@@ -6,57 +6,144 @@ analysis of candidates beyond simple keyword matching.
 """
 
 import os
+import re
 import json
+import time
 import asyncio
-from typing import List, Dict, Any, Optional
-from langchain_openai import ChatOpenAI
-from langchain.schema import HumanMessage, SystemMessage
-
-# Initialize LangChain OpenAI client
-try:
-    api_key = os.getenv('OPENAI_API_KEY')
-    if api_key and api_key.startswith('sk-') and len(api_key) > 20:
-        llm = ChatOpenAI(
-            model="gpt-4o",
-            api_key=api_key,
-            temperature=0.7  # GPT-4o optimal temperature
-        )
-        print(f'✅ LangChain OpenAI client initialized successfully')
-    else:
-        llm = None
-        print(f'⚠️ OpenAI API key not configured properly. Key: {api_key[:10] if api_key else "None"}...')
-except Exception as e:
-    llm = None
-    print(f'⚠️ Failed to initialize LangChain OpenAI client: {str(e)}')
+from collections import deque
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from typing import List, Dict, Any, Optional, Tuple
+
+import metrics
+from token_budget import build_candidate_payload, compact_json, estimate_tokens, pack_batches
+from llm_gateway import get_chat_model, invoke_llm
+from deadline import Deadline, run_with_timeout, estimate_batch_seconds, record_batch_seconds
+from structured_logging import get_logger, debug_enabled, LazyJson
+
+logger = get_logger(__name__)
+
+# Chat model comes from the shared LLM gateway and is created on first use
+ANALYSIS_MODEL = "gpt-4o"
+
+def get_llm():
+    """
+    Get the LangChain OpenAI client (None when not configured)
+    """
+    return get_chat_model(ANALYSIS_MODEL, temperature=0.7)  # GPT-4o optimal temperature
+
+# Default score weights when the criteria don't specify any
+LLM_SCORE_WEIGHTS = {'bm25Score': 0.4, 'llmRelevance': 0.5, 'fieldMatches': 0.1}
+FALLBACK_SCORE_WEIGHTS = {'bm25Score': 0.6, 'llmRelevance': 0.3, 'fieldMatches': 0.1}
+
+# Stop sending batches once the remaining candidates can't reach the top results
+EARLY_STOP_ENABLED = os.getenv('LLM_EARLY_STOP', 'true').lower() == 'true'
+
+# Re-ask for candidates a batch response missed, in halving sub-batches
+BATCH_RECOVERY_ENABLED = os.getenv('LLM_BATCH_RECOVERY', 'true').lower() == 'true'
+RECOVERY_CALL_BUDGET = int(os.getenv('LLM_RECOVERY_CALL_BUDGET', '4'))  # Extra LLM calls per refinement
+
+# Start of a candidate analysis object in a (possibly broken) response
+CANDIDATE_OBJECT_START = re.compile(r'\{\s*"candidate_id"')
+TRAILING_COMMA = re.compile(r',(\s*[}\]])')
 
 def refine_candidates_with_llm(
     bm25_results: List[Dict[str, Any]], 
     criteria: Dict[str, Any], 
-    final_limit: int
+    final_limit: int,
+    early_stop: bool = EARLY_STOP_ENABLED,
+    stats: Optional[Dict[str, Any]] = None,
+    deadline: Optional[Deadline] = None
 ) -> List[Dict[str, Any]]:
     """
     Use LLM to analyze and refine candidate matches with contextual understanding
+
+    Candidates are analyzed in the order given (BM25, fused or reranked). With
+    ``early_stop`` batching stops as soon as no remaining candidate can beat
+    the current k-th best score.
+    With a ``deadline``, batches that can't finish in time are not sent (or
+    abandoned) and their candidates get fallback scores instead.
+    Batch counts are written into ``stats`` when provided.
     """
-    if not llm:
-        print('⚠️ LangChain not configured, using fallback refinement')
+    if stats is None:
+        stats = {}
+
+    if not get_llm():
+        logger.warning('⚠️ LangChain not configured, using fallback refinement')
+        metrics.inc('fallbacks_total', kind='refinement', reason='llm_unavailable')
         return fallback_refinement(bm25_results, criteria, final_limit)
 
     try:
-        print(f'🧠 Starting LLM refinement on {len(bm25_results)} candidates')
+        logger.info('🧠 Starting LLM refinement on %s candidates', len(bm25_results))
         
-        # Process candidates in batches to avoid token limits
-        batch_size = 5
+        # Pack candidates into batches sized by estimated prompt tokens
+        system_prompt = build_analysis_system_prompt(criteria)
+        batches = pack_batches(bm25_results, fixed_tokens=estimate_tokens(system_prompt))
+        total_batches = len(batches)
         refined_candidates = []
         
-        for i in range(0, len(bm25_results), batch_size):
-            batch = bm25_results[i:i + batch_size]
-            batch_num = (i // batch_size) + 1
-            total_batches = (len(bm25_results) + batch_size - 1) // batch_size
+        logger.info('📦 Packed %s candidates into %s batches: %s', len(bm25_results), total_batches, [len(b) for b in batches])
+        
+        # Best score any candidate from batch i onwards could still reach; a suffix
+        # maximum, so the bound holds in any candidate order
+        remaining_bounds = [0.0] * (total_batches + 1)
+        for i in range(total_batches - 1, -1, -1):
+            batch_bound = max(score_upper_bound(candidate, criteria) for candidate in batches[i])
+            remaining_bounds[i] = max(batch_bound, remaining_bounds[i + 1])
+        
+        recovery = {'calls_left': RECOVERY_CALL_BUDGET, 'calls': 0, 'recovered': 0, 'fallbacks': 0, 'deadline': deadline}
+        processed_batches = 0
+        deadline_skipped_batches = 0
+        timed_out_batches = 0
+        for batch_num, batch in enumerate(batches, start=1):
+            if early_stop and len(refined_candidates) >= final_limit:
+                kth_best = sorted((c['overall_score'] for c in refined_candidates), reverse=True)[final_limit - 1]
+                if kth_best >= remaining_bounds[batch_num - 1]:
+                    logger.info('⏹️ Top %s settled (k-th best %.3f >= bound %.3f) - skipping %s batches', final_limit, kth_best, remaining_bounds[batch_num - 1], total_batches - processed_batches)
+                    break
+            
+            if deadline is not None and deadline.remaining() < estimate_batch_seconds():
+                # Not enough time left for another round trip: score the rest locally
+                unsent = [candidate for pending in batches[batch_num - 1:] for candidate in pending]
+                deadline.degrade('llm_refinement', f'{len(unsent)} candidates left without LLM analysis')
+                refined_candidates.extend(create_fallback_candidate(candidate, criteria) for candidate in unsent)
+                metrics.inc('fallbacks_total', len(unsent), kind='candidate', reason='deadline')
+                deadline_skipped_batches = total_batches - processed_batches
+                break
             
-            print(f'🔍 Processing batch {batch_num}/{total_batches}')
+            logger.info('🔍 Processing batch %s/%s', batch_num, total_batches)
             
-            batch_results = process_batch_with_llm(batch, criteria)
+            batch_start = time.time()
+            batch_recovery = recovery if BATCH_RECOVERY_ENABLED else None
+            if deadline is None:
+                batch_results = process_batch_with_llm(batch, criteria, system_prompt, batch_recovery)
+                record_batch_seconds(time.time() - batch_start)
+            else:
+                try:
+                    batch_results = run_with_timeout(
+                        deadline.remaining(), process_batch_with_llm, batch, criteria, system_prompt, batch_recovery
+                    )
+                    record_batch_seconds(time.time() - batch_start)
+                except FuturesTimeoutError:
+                    # The call finishes in the background; its result is discarded
+                    recovery['calls_left'] = 0
+                    deadline.degrade('llm_refinement', f'batch {batch_num} abandoned after {time.time() - batch_start:.1f}s')
+                    batch_results = [create_fallback_candidate(candidate, criteria) for candidate in batch]
+                    metrics.inc('fallbacks_total', len(batch), kind='candidate', reason='timeout')
+                    timed_out_batches += 1
             refined_candidates.extend(batch_results)
+            processed_batches += 1
+        
+        stats.update({
+            'llm_batches_total': total_batches,
+            'llm_batches_processed': processed_batches,
+            'llm_batches_skipped': total_batches - processed_batches,
+            'llm_batches_deadline_skipped': deadline_skipped_batches,
+            'llm_batches_timed_out': timed_out_batches,
+            'early_stopped': processed_batches + deadline_skipped_batches < total_batches,
+            'llm_recovery_calls': recovery['calls'],
+            'llm_recovered_candidates': recovery['recovered'],
+            'llm_fallback_candidates': recovery['fallbacks']
+        })
         
         # Sort by combined score and return top results
         final_results = sorted(
@@ -65,31 +152,43 @@ def refine_candidates_with_llm(
             reverse=True
         )[:final_limit]
         
-        print(f'✅ LLM refinement completed: {len(final_results)} final candidates')
+        logger.info('✅ LLM refinement completed: %s final candidates', len(final_results))
         return final_results
         
     except Exception as error:
-        print(f'❌ Error in LLM refinement: {str(error)}')
+        logger.error('❌ Error in LLM refinement: %s', error)
         # Fallback to BM25 results if LLM fails
+        metrics.inc('fallbacks_total', kind='refinement', reason='error')
         return fallback_refinement(bm25_results, criteria, final_limit)
 
-def process_batch_with_llm(
-    candidate_batch: List[Dict[str, Any]], 
-    criteria: Dict[str, Any]
-) -> List[Dict[str, Any]]:
+def score_upper_bound(candidate: Dict[str, Any], criteria: Dict[str, Any]) -> float:
     """
-    Process a batch of candidates with LLM analysis
+    Highest overall_score a candidate could get from LLM or fallback scoring
     """
-    system_prompt = f"""
+    field_match_score = len(candidate.get('field_matches', {})) * 0.1
+    weight_sets = [criteria['weights']] if criteria.get('weights') else [LLM_SCORE_WEIGHTS, FALLBACK_SCORE_WEIGHTS]
+    
+    return round(max(
+        candidate['bm25_score'] * weights.get('bm25Score', 0) +
+        1.0 * weights.get('llmRelevance', 0) +
+        field_match_score * weights.get('fieldMatches', 0)
+        for weights in weight_sets
+    ), 3)
+
+def build_analysis_system_prompt(criteria: Dict[str, Any]) -> str:
+    """
+    Build the system prompt shared by every analysis batch of a search
+    """
+    return f"""
 You are an expert recruiter and talent evaluator. Your job is to analyze candidates and provide detailed assessments of their fit for a specific search.
 
 CRITICAL: These candidates have already passed hard constraint filtering. Your job is to rank and assess them for soft criteria and overall fit.
 
 SEARCH CRITERIA:
-{json.dumps(criteria, indent=2)}
+{compact_json(criteria)}
 
 HARD CONSTRAINTS (already satisfied):
-{json.dumps(criteria.get('hardConstraints', {}), indent=2)}
+{compact_json(criteria.get('hardConstraints', {}))}
 
 For each candidate, provide:
 1. Detailed relevance analysis based on soft criteria and contextual fit
@@ -130,124 +229,258 @@ Return your analysis as a JSON object with this structure:
 }}
 """
 
-    candidate_data = []
+def process_batch_with_llm(
+    candidate_batch: List[Dict[str, Any]], 
+    criteria: Dict[str, Any],
+    system_prompt: Optional[str] = None,
+    recovery: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Process a batch of candidates with LLM analysis
+
+    Every candidate whose analysis parsed is kept. With a ``recovery`` budget
+    (see refine_candidates_with_llm) the missing ones are asked for again in
+    smaller sub-batches; only what is still missing falls back.
+    """
+    if system_prompt is None:
+        system_prompt = build_analysis_system_prompt(criteria)
+
+    try:
+        analyses = request_batch_analyses(candidate_batch, criteria, system_prompt)
+    except Exception as error:
+        logger.exception('❌ Error in LLM batch processing: %s', error)
+        analyses = {}
+
+    missing = [candidate for candidate in candidate_batch if candidate['id'] not in analyses]
+    if missing:
+        logger.warning("⚠️ No LLM analysis found for %s of %s candidates", len(missing), len(candidate_batch))
+        if recovery is not None:
+            analyses.update(recover_missing_analyses(missing, criteria, system_prompt, recovery))
+
+    enhanced_candidates = []
     for candidate in candidate_batch:
-        candidate_data.append({
-            'id': candidate['id'],
-            'bm25_score': candidate['bm25_score'],
-            'profile': candidate['data'],
-            'preliminary_reasons': candidate['preliminary_reasons']
-        })
+        llm_analysis = analyses.get(candidate['id'])
+        if llm_analysis:
+            enhanced_candidates.append(create_analyzed_candidate(candidate, llm_analysis, criteria))
+        else:
+            enhanced_candidates.append(create_fallback_candidate(candidate, criteria))
+            metrics.inc('fallbacks_total', kind='candidate', reason='missing_analysis')
+            if recovery is not None:
+                recovery['fallbacks'] += 1
+    return enhanced_candidates
+
+def request_batch_analyses(
+    candidate_batch: List[Dict[str, Any]],
+    criteria: Dict[str, Any],
+    system_prompt: str,
+    purpose: str = 'candidate_analysis'
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Ask the LLM to analyze a batch and return the usable analyses by candidate ID
+    """
+    from langchain.schema import HumanMessage, SystemMessage
+
+    # Compact profiles: no null/irrelevant fields, capped field length, no indentation
+    candidate_data = [build_candidate_payload(candidate) for candidate in candidate_batch]
 
     user_prompt = f"""
 Analyze these {len(candidate_batch)} candidates for fit with the search criteria:
 
-{json.dumps(candidate_data, indent=2)}
+{compact_json(candidate_data)}
 
 Provide detailed analysis for each candidate.
 """
 
-    try:
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_prompt)
-        ]
-        
-        response = llm.invoke(messages)
-        content = response.content
-        
-        print(f'🔍 Raw OpenAI LLM response: {repr(content)}')
-        
-        # Check if content is empty or None
-        if not content or content.strip() == '':
-            print('⚠️ OpenAI returned empty content for LLM analysis, using fallback')
-            return [create_fallback_candidate(candidate, criteria) for candidate in candidate_batch]
-        
-        # Clean the content - sometimes AI adds extra text before/after JSON
-        content = content.strip()
-        
-        # Try to find JSON in the response
-        start_brace = content.find('{')
-        end_brace = content.rfind('}')
-        
-        if start_brace == -1 or end_brace == -1:
-            print('⚠️ No JSON braces found in LLM response, using fallback')
-            return [create_fallback_candidate(candidate, criteria) for candidate in candidate_batch]
-            
-        json_content = content[start_brace:end_brace + 1]
-        print(f'🔍 Extracted LLM JSON: {json_content[:500]}...')  # First 500 chars
-        
-        # Parse JSON response
-        analysis = json.loads(json_content)
-        
-        # Validate the result has expected structure
-        if not isinstance(analysis, dict) or 'candidates' not in analysis:
-            print('⚠️ Invalid LLM response structure, using fallback')
-            return [create_fallback_candidate(candidate, criteria) for candidate in candidate_batch]
-        
-        # Combine LLM analysis with original candidate data
-        enhanced_candidates = []
-        for candidate in candidate_batch:
-            llm_analysis = next(
-                (c for c in analysis['candidates'] if c['candidate_id'] == candidate['id']), 
-                None
-            )
-            
-            if not llm_analysis:
-                print(f"⚠️ No LLM analysis found for candidate {candidate['id']}")
-                enhanced_candidates.append(create_fallback_candidate(candidate, criteria))
-                continue
-            
-            # Calculate combined score
-            weights = criteria.get('weights', {
-                'bm25Score': 0.4, 
-                'llmRelevance': 0.5, 
-                'fieldMatches': 0.1
-            })
-            
-            field_match_score = len(candidate.get('field_matches', {})) * 0.1
-            
-            overall_score = (
-                (candidate['bm25_score'] * weights['bm25Score']) +
-                (llm_analysis['llm_relevance_score'] * weights['llmRelevance']) +
-                (field_match_score * weights['fieldMatches'])
-            )
-            
-            # Extract display name from LLM analysis or fallback to manual extraction
-            display_name = llm_analysis.get('display_name') or extract_name_from_data(candidate['data'])
-            print(f'🏷️ Display name for candidate {candidate["id"]}: "{display_name}" (from LLM: {bool(llm_analysis.get("display_name"))})')
-            
-            enhanced_candidates.append({
-                'id': candidate['id'],
-                'data': candidate['data'],
-                'bm25_score': candidate['bm25_score'],
-                'llm_relevance_score': llm_analysis['llm_relevance_score'],
-                'overall_score': round(overall_score, 3),
-                'match_score': round(overall_score, 3),  # Frontend expects match_score
-                'llm_analysis': llm_analysis['detailed_analysis'],
-                'match_strengths': llm_analysis.get('match_strengths', []),
-                'potential_concerns': llm_analysis.get('potential_concerns', []),
-                'cultural_fit_assessment': llm_analysis.get('cultural_fit_assessment', ''),
-                'recommendation': llm_analysis.get('recommendation', 'Consider'),
-                'field_matches': candidate.get('field_matches', {}),
-                'match_reasons': generate_final_match_reasons(candidate, llm_analysis),
-                'display_name': display_name
-            })
-        
-        return enhanced_candidates
-        
-    except json.JSONDecodeError as error:
-        print(f'❌ JSON parsing error in LLM batch processing: {str(error)}')
-        print(f'🔍 Content that failed to parse: {repr(content) if "content" in locals() else "No content"}')
-        # Return fallback candidates if JSON parsing fails
-        return [create_fallback_candidate(candidate, criteria) for candidate in candidate_batch]
-        
-    except Exception as error:
-        print(f'❌ Error in LLM batch processing: {str(error)}')
-        import traceback
-        print(f'🔍 Full traceback: {traceback.format_exc()}')
-        # Return fallback candidates if LLM processing fails
-        return [create_fallback_candidate(candidate, criteria) for candidate in candidate_batch]
+    llm = get_llm()
+    messages = [
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=user_prompt)
+    ]
+    
+    # Rate-limited and retried; identical prompts in flight share one call
+    response = invoke_llm(llm, messages, purpose)
+    content = response.content or ''
+    
+    logger.debug('🔍 Raw OpenAI LLM response: %r', content)
+    
+    batch_ids = {candidate['id'] for candidate in candidate_batch}
+    analyses = {}
+    for analysis in parse_candidate_analyses(content):
+        if is_valid_analysis(analysis) and analysis['candidate_id'] in batch_ids:
+            analyses[analysis['candidate_id']] = analysis
+    return analyses
+
+def recover_missing_analyses(
+    missing: List[Dict[str, Any]],
+    criteria: Dict[str, Any],
+    system_prompt: str,
+    recovery: Dict[str, Any]
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Re-request missing candidates by bisection within the recovery call budget
+
+    A group that comes back incomplete is split in half again; a single
+    candidate gets one retry of its own.
+    """
+    recovered = {}
+    groups = deque(split_in_half(missing) if len(missing) > 1 else [missing])
+    deadline = recovery.get('deadline')
+    while groups and recovery['calls_left'] > 0:
+        if deadline is not None and deadline.remaining() < estimate_batch_seconds():
+            break
+        group = groups.popleft()
+        recovery['calls_left'] -= 1
+        recovery['calls'] += 1
+        try:
+            analyses = request_batch_analyses(group, criteria, system_prompt, 'batch_recovery')
+        except Exception as error:
+            logger.warning('⚠️ Recovery call for %s candidates failed: %s', len(group), error)
+            analyses = {}
+        recovered.update(analyses)
+
+        still_missing = [candidate for candidate in group if candidate['id'] not in analyses]
+        if len(still_missing) > 1:
+            groups.extend(split_in_half(still_missing))
+
+    recovery['recovered'] += len(recovered)
+    if recovered:
+        logger.info('🩹 Recovered %s of %s missing analyses (%s recovery calls left)', len(recovered), len(missing), recovery['calls_left'])
+    return recovered
+
+def split_in_half(items: List[Any]) -> List[List[Any]]:
+    middle = (len(items) + 1) // 2
+    return [items[:middle], items[middle:]]
+
+def parse_candidate_analyses(content: str) -> List[Dict[str, Any]]:
+    """
+    Pull every complete candidate analysis out of an LLM response
+
+    The whole response is tried as JSON first. Otherwise each object that
+    starts with "candidate_id" is decoded on its own, so prose around the
+    JSON, a response cut off mid-object, // comments or one malformed
+    candidate don't lose the other candidates.
+    """
+    start_brace = content.find('{')
+    end_brace = content.rfind('}')
+    if start_brace != -1 and end_brace > start_brace:
+        try:
+            analysis = json.loads(content[start_brace:end_brace + 1])
+            if isinstance(analysis, dict) and isinstance(analysis.get('candidates'), list):
+                return [candidate for candidate in analysis['candidates'] if isinstance(candidate, dict)]
+        except json.JSONDecodeError:
+            pass
+
+    analyses = []
+    position = 0
+    for match in CANDIDATE_OBJECT_START.finditer(content):
+        if match.start() < position:
+            continue  # Nested inside an object already decoded
+        scanned = scan_json_object(content, match.start())
+        if scanned is None:
+            break  # Truncated: no complete objects follow
+        text, end = scanned
+        try:
+            analysis = json.loads(TRAILING_COMMA.sub(r'\1', text))
+        except json.JSONDecodeError:
+            logger.debug('🔍 Skipping malformed candidate analysis: %s', LazyJson(text, max_chars=200))
+            continue
+        if isinstance(analysis, dict):
+            analyses.append(analysis)
+            position = end
+
+    logger.info('🔍 Leniently parsed %s candidate analyses from an invalid response', len(analyses))
+    return analyses
+
+def scan_json_object(content: str, start: int) -> Optional[Tuple[str, int]]:
+    """
+    Text of the balanced object starting at ``start`` without // comments
+
+    Returns the cleaned text and the end offset, or None when the object is
+    not closed before the content ends.
+    """
+    depth = 0
+    in_string = False
+    escaped = False
+    pieces = []
+    segment_start = start
+    i = start
+    while i < len(content):
+        char = content[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == '/' and content.startswith('//', i):
+            pieces.append(content[segment_start:i])
+            newline = content.find('\n', i)
+            i = len(content) if newline == -1 else newline
+            segment_start = i
+            continue
+        elif char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                pieces.append(content[segment_start:i + 1])
+                return ''.join(pieces), i + 1
+        i += 1
+    return None
+
+def is_valid_analysis(analysis: Dict[str, Any]) -> bool:
+    """
+    Whether an analysis has the fields scoring depends on
+    """
+    score = analysis.get('llm_relevance_score')
+    return (
+        isinstance(analysis.get('candidate_id'), str) and
+        isinstance(score, (int, float)) and not isinstance(score, bool) and 0 <= score <= 1
+    )
+
+def create_analyzed_candidate(
+    candidate: Dict[str, Any],
+    llm_analysis: Dict[str, Any],
+    criteria: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Combine LLM analysis with original candidate data
+    """
+    # Calculate combined score
+    weights = criteria.get('weights', LLM_SCORE_WEIGHTS)
+    
+    field_match_score = len(candidate.get('field_matches', {})) * 0.1
+    
+    overall_score = (
+        (candidate['bm25_score'] * weights['bm25Score']) +
+        (llm_analysis['llm_relevance_score'] * weights['llmRelevance']) +
+        (field_match_score * weights['fieldMatches'])
+    )
+    
+    # Extract display name from LLM analysis or fallback to manual extraction
+    display_name = llm_analysis.get('display_name') or extract_name_from_data(candidate['data'])
+    if debug_enabled():
+        logger.debug('🏷️ Display name for candidate %s: "%s" (from LLM: %s)', candidate['id'], display_name, bool(llm_analysis.get('display_name')))
+    
+    return with_duplicates(candidate, {
+        'id': candidate['id'],
+        'data': candidate['data'],
+        'bm25_score': candidate['bm25_score'],
+        'llm_relevance_score': llm_analysis['llm_relevance_score'],
+        'overall_score': round(overall_score, 3),
+        'match_score': round(overall_score, 3),  # Frontend expects match_score
+        'llm_analysis': llm_analysis.get('detailed_analysis', ''),
+        'match_strengths': llm_analysis.get('match_strengths', []),
+        'potential_concerns': llm_analysis.get('potential_concerns', []),
+        'cultural_fit_assessment': llm_analysis.get('cultural_fit_assessment', ''),
+        'recommendation': llm_analysis.get('recommendation', 'Consider'),
+        'field_matches': candidate.get('field_matches', {}),
+        'match_reasons': generate_final_match_reasons(candidate, llm_analysis),
+        'display_name': display_name
+    })
 
 def generate_final_match_reasons(
     candidate: Dict[str, Any], 
@@ -310,7 +543,8 @@ def extract_name_from_data(data: Dict[str, Any]) -> str:
             if value and not is_location_or_company(value):
                 return value
     
-    print(f'⚠️ Could not extract name from data: {list(data.keys())}')
+    if debug_enabled():
+        logger.debug('⚠️ Could not extract name from data: %s', list(data.keys()))
     return "N/A"
 
 def is_location_or_company(value: str) -> bool:
@@ -353,11 +587,7 @@ def create_fallback_candidate(
     """
     Create fallback candidate when LLM analysis fails
     """
-    weights = criteria.get('weights', {
-        'bm25Score': 0.6, 
-        'llmRelevance': 0.3, 
-        'fieldMatches': 0.1
-    })
+    weights = criteria.get('weights', FALLBACK_SCORE_WEIGHTS)
     
     field_match_score = len(candidate.get('field_matches', {})) * 0.1
     fallback_llm_score = 0.5  # Neutral LLM score
@@ -368,7 +598,7 @@ def create_fallback_candidate(
         (field_match_score * weights['fieldMatches'])
     )
     
-    return {
+    return with_duplicates(candidate, {
         'id': candidate['id'],
         'data': candidate['data'],
         'bm25_score': candidate['bm25_score'],
@@ -383,7 +613,17 @@ def create_fallback_candidate(
         'field_matches': candidate.get('field_matches', {}),
         'match_reasons': candidate.get('preliminary_reasons', ['Profile relevance']),
         'display_name': extract_name_from_data(candidate['data'])
-    }
+    })
+
+def with_duplicates(candidate: Dict[str, Any], recommendation: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Add the rows collapsed into a near-duplicate cluster representative
+
+    Other recommendations keep the response shape they had without dedup.
+    """
+    if candidate.get('duplicates'):
+        recommendation['duplicates'] = candidate['duplicates']
+    return recommendation
 
 def fallback_refinement(
     bm25_results: List[Dict[str, Any]], 
@@ -393,7 +633,7 @@ def fallback_refinement(
     """
     Fallback refinement when LLM is not available
     """
-    print('🔄 Using fallback refinement without LLM')
+    logger.info('🔄 Using fallback refinement without LLM')
     
     # Simple scoring based on BM25 and field matches
     scored_results = []
@@ -401,7 +641,7 @@ def fallback_refinement(
         field_match_score = len(candidate.get('field_matches', {})) * 0.2
         overall_score = (candidate['bm25_score'] * 0.7) + (field_match_score * 0.3)
         
-        scored_results.append({
+        scored_results.append(with_duplicates(candidate, {
             'id': candidate['id'],
             'data': candidate['data'],
             'bm25_score': candidate['bm25_score'],
@@ -415,7 +655,7 @@ def fallback_refinement(
             'recommendation': 'Consider',
             'field_matches': candidate.get('field_matches', {}),
             'match_reasons': candidate.get('preliminary_reasons', ['Profile relevance'])
-        })
+        }))
     
     return sorted(
         scored_results, 
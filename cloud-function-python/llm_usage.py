@@ -0,0 +1,183 @@
+"""
+Per-query LLM token and cost accounting
+
+This module handles:
+1. Recording every gateway call with its model, purpose, prompt and
+   completion tokens, latency and estimated cost
+2. A usage ledger per request, kept in a context variable so worker threads
+   started with a copied context report into the same ledger
+3. Per-dataset rollups of finished queries, exposed through metrics
+
+Costs are estimates from a per-model price table (USD per million tokens).
+Identical prompts coalesced by the gateway are recorded once, by the query
+that made the call.
+"""
+
+import os
+import json
+import threading
+import contextvars
+from typing import Any, Dict, List, Optional, Tuple
+
+import metrics
+from structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Configuration
+DEFAULT_MODEL_PRICES = {
+    'gpt-4o': {'input': 2.50, 'cached_input': 1.25, 'output': 10.00},
+    'gpt-5-2025-08-07': {'input': 1.25, 'cached_input': 0.125, 'output': 10.00},
+    'text-embedding-3-small': {'input': 0.02, 'output': 0.0},
+    'text-embedding-3-large': {'input': 0.13, 'output': 0.0}
+}
+MODEL_PRICES = {**DEFAULT_MODEL_PRICES, **json.loads(os.getenv('LLM_MODEL_PRICES', '{}'))}  # {"model": {"input": ..., "output": ...}}
+MAX_LOGGED_CALLS = int(os.getenv('LLM_USAGE_MAX_LOGGED_CALLS', '50'))  # Per-call entries kept in result metadata
+
+TOTAL_FIELDS = ('calls', 'failed_calls', 'input_tokens', 'cached_input_tokens', 'output_tokens', 'cost_usd', 'llm_seconds')
+
+_current_ledger: contextvars.ContextVar[Optional['UsageLedger']] = contextvars.ContextVar('llm_usage_ledger', default=None)
+
+# Usage of finished queries by dataset ID
+_dataset_usage: Dict[str, Dict[str, float]] = {}
+_dataset_lock = threading.Lock()
+
+class UsageLedger:
+    """
+    LLM calls made on behalf of one request
+    """
+
+    def __init__(self):
+        self.totals = dict.fromkeys(TOTAL_FIELDS, 0)
+        self.by_purpose: Dict[str, Dict[str, float]] = {}
+        self.by_model: Dict[str, Dict[str, float]] = {}
+        self.call_log: List[Dict[str, Any]] = []
+        self.unpriced_models: List[str] = []
+        self._lock = threading.Lock()
+
+    def record(self, call: Dict[str, Any]) -> None:
+        with self._lock:
+            for totals in (
+                self.totals,
+                self.by_purpose.setdefault(call['purpose'], dict.fromkeys(TOTAL_FIELDS, 0)),
+                self.by_model.setdefault(call['model'], dict.fromkeys(TOTAL_FIELDS, 0))
+            ):
+                _add_call(totals, call)
+            if call['cost_usd'] is None and call['model'] not in self.unpriced_models:
+                self.unpriced_models.append(call['model'])
+            if len(self.call_log) < MAX_LOGGED_CALLS:
+                self.call_log.append(call)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **_rounded(self.totals),
+                'total_tokens': self.totals['input_tokens'] + self.totals['output_tokens'],
+                'by_purpose': {purpose: _rounded(totals) for purpose, totals in self.by_purpose.items()},
+                'by_model': {model: _rounded(totals) for model, totals in self.by_model.items()},
+                'unpriced_models': list(self.unpriced_models),
+                'call_log': list(self.call_log)
+            }
+
+def start_usage_tracking() -> Tuple[UsageLedger, contextvars.Token]:
+    """
+    Give the current request a fresh ledger
+    """
+    ledger = UsageLedger()
+    return ledger, _current_ledger.set(ledger)
+
+def end_usage_tracking(token: contextvars.Token) -> None:
+    """
+    Restore the ledger that was active before start_usage_tracking
+    """
+    _current_ledger.reset(token)
+
+def record_llm_call(model: str, purpose: str, response: Any, seconds: float, attempts: int) -> None:
+    """
+    Account one gateway call; ``response`` is None when the call failed
+    """
+    usage = (getattr(response, 'usage_metadata', None) or {}) if response is not None else {}
+    input_tokens = usage.get('input_tokens') or 0
+    output_tokens = usage.get('output_tokens') or 0
+    cached_input_tokens = (usage.get('input_token_details') or {}).get('cache_read') or 0
+    cost = estimate_cost(model, input_tokens, cached_input_tokens, output_tokens)
+
+    call = {
+        'model': model,
+        'purpose': purpose,
+        'failed': response is None,
+        'input_tokens': input_tokens,
+        'cached_input_tokens': cached_input_tokens,
+        'output_tokens': output_tokens,
+        'seconds': round(seconds, 3),
+        'attempts': attempts,
+        'cost_usd': round(cost, 6) if cost is not None else None
+    }
+
+    for kind, count in (('input', input_tokens), ('output', output_tokens)):
+        if count:
+            metrics.inc('llm_tokens_total', count, model=model, kind=kind)
+    if cost:
+        metrics.inc('llm_cost_usd_total', cost, model=model)
+
+    ledger = _current_ledger.get()
+    if ledger is not None:
+        ledger.record(call)
+
+def estimate_cost(model: str, input_tokens: int, cached_input_tokens: int, output_tokens: int) -> Optional[float]:
+    """
+    Estimated USD cost of a call, or None for models without a price
+    """
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return None
+    uncached_tokens = input_tokens - cached_input_tokens
+    return (
+        uncached_tokens * prices['input'] +
+        cached_input_tokens * prices.get('cached_input', prices['input']) +
+        output_tokens * prices['output']
+    ) / 1_000_000
+
+def record_dataset_usage(dataset_id: str, summary: Dict[str, Any]) -> None:
+    """
+    Add a finished query's usage to its dataset's rollup
+    """
+    with _dataset_lock:
+        totals = _dataset_usage.setdefault(dataset_id, {'queries': 0, **dict.fromkeys(TOTAL_FIELDS, 0)})
+        totals['queries'] += 1
+        for field in TOTAL_FIELDS:
+            totals[field] += summary[field]
+
+def get_dataset_usage() -> Dict[str, Dict[str, float]]:
+    """
+    LLM usage rollups of the datasets queried on this instance
+    """
+    with _dataset_lock:
+        return {dataset_id: _rounded(totals) for dataset_id, totals in _dataset_usage.items()}
+
+def collect_dataset_usage_metrics() -> List[metrics.Sample]:
+    samples = []
+    for dataset_id, totals in get_dataset_usage().items():
+        labels = {'dataset': dataset_id}
+        samples.append(('dataset_queries_total', 'counter', labels, totals['queries']))
+        samples.append(('dataset_llm_cost_usd_total', 'counter', labels, totals['cost_usd']))
+        samples.append(('dataset_llm_tokens_total', 'counter', {**labels, 'kind': 'input'}, totals['input_tokens']))
+        samples.append(('dataset_llm_tokens_total', 'counter', {**labels, 'kind': 'output'}, totals['output_tokens']))
+    return samples
+
+metrics.register_collector(collect_dataset_usage_metrics)
+
+def _add_call(totals: Dict[str, float], call: Dict[str, Any]) -> None:
+    totals['calls'] += 1
+    totals['failed_calls'] += call['failed']
+    totals['input_tokens'] += call['input_tokens']
+    totals['cached_input_tokens'] += call['cached_input_tokens']
+    totals['output_tokens'] += call['output_tokens']
+    totals['cost_usd'] += call['cost_usd'] or 0
+    totals['llm_seconds'] += call['seconds']
+
+def _rounded(totals: Dict[str, float]) -> Dict[str, float]:
+    return {
+        field: round(value, 6) if field == 'cost_usd' else round(value, 3) if field == 'llm_seconds' else value
+        for field, value in totals.items()
+    }
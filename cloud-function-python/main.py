@@ -13,58 +13,143 @@ Handles HTTP requests and orchestrates the multi-stage pipeline:
 import os
 import json
 import time
+import uuid
+import threading
+import contextvars
+from collections import Counter
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from flask import Request, jsonify
 from flask_cors import cross_origin
 import functions_framework
-from google.cloud import storage
-from supabase import create_client, Client
 
-from ai_agent import generate_follow_up_questions, translate_query_to_criteria
-from bm25_search import search_with_bm25
-from llm_refinement import refine_candidates_with_llm
-from data_parser import parse_dataset
+from ai_agent import generate_follow_up_questions, translate_query_to_criteria, create_fallback_criteria, extract_hard_constraints
+from reranker import rerank_candidates, RERANK_ENABLED
+from query_planner import plan_query, QUERY_PLANNER_ENABLED
+from data_parser import resolve_dataset_blob, get_dataset_version
+from result_cache import MemoryCache, create_result_cache, make_result_cache_key, make_query_cache_key, RESULT_CACHE_ENABLED
+from job_queue import JobQueue
+import metrics
+from deadline import Deadline, DeadlineExceeded, parse_deadline_ms, run_with_timeout, abandoned_calls
+from llm_usage import start_usage_tracking, end_usage_tracking, record_dataset_usage
+from compact_results import (
+    compact_recommendations,
+    compact_metadata,
+    result_dataset_versions,
+    slim_progress_data,
+    hydrate_recommendations,
+    is_compact
+)
+from structured_logging import get_logger, start_request_logging, end_request_logging, LazyJson
 
-# Initialize Google Cloud Storage
-storage_client = storage.Client()
+logger = get_logger(__name__)
+
+# Heavy clients (GCS, Supabase) are created on first use to keep cold starts fast;
+# search-only modules (pandas, numpy, langchain) are imported inside the pipeline
+_storage_client = None
+_supabase_client = None
+_supabase_warning_logged = False
+_client_lock = threading.Lock()
+
+def get_storage_client():
+    """Get the Google Cloud Storage client, creating it on first use"""
+    global _storage_client
+    with _client_lock:
+        if _storage_client is None:
+            from google.cloud import storage
+            _storage_client = storage.Client()
+        return _storage_client
 
 # Initialize Supabase client
-def get_supabase_client() -> Client:
-    """Initialize Supabase client with service role key"""
+def get_supabase_client():
+    """Get the Supabase client with service role key, creating it on first use"""
+    global _supabase_client, _supabase_warning_logged
+    if _supabase_client is not None:
+        return _supabase_client
+    
     # Try both possible environment variable names
     supabase_url = os.environ.get('SUPABASE_URL') or os.environ.get('NEXT_PUBLIC_SUPABASE_URL')
     supabase_service_key = os.environ.get('SUPABASE_SERVICE_ROLE_KEY')
     
     if not supabase_url or not supabase_service_key:
-        print("⚠️ Supabase credentials not configured - database updates disabled")
-        print(f"   SUPABASE_URL: {'✅' if supabase_url else '❌'}")
-        print(f"   SUPABASE_SERVICE_ROLE_KEY: {'✅' if supabase_service_key else '❌'}")
+        # Warn once per instance rather than on every progress update
+        if not _supabase_warning_logged:
+            _supabase_warning_logged = True
+            logger.warning(
+                "⚠️ Supabase credentials not configured - database updates disabled (SUPABASE_URL: %s, SUPABASE_SERVICE_ROLE_KEY: %s)",
+                '✅' if supabase_url else '❌', '✅' if supabase_service_key else '❌'
+            )
         return None
     
     try:
-        print(f"🔗 Connecting to Supabase: {supabase_url}")
-        client = create_client(supabase_url, supabase_service_key)
-        print("✅ Supabase client initialized successfully")
-        return client
+        from supabase import create_client
+        
+        with _client_lock:
+            if _supabase_client is None:
+                logger.info("🔗 Connecting to Supabase: %s", supabase_url)
+                _supabase_client = create_client(supabase_url, supabase_service_key)
+                logger.info("✅ Supabase client initialized successfully")
+        return _supabase_client
     except Exception as error:
-        print(f"❌ Failed to initialize Supabase client: {str(error)}")
-        print(f"   Error type: {type(error).__name__}")
+        logger.error("❌ Failed to initialize Supabase client: %s (%s)", error, type(error).__name__)
         # Import version info for debugging
         try:
             import supabase
-            print(f"   Supabase version: {supabase.__version__}")
+            logger.debug("   Supabase version: %s", supabase.__version__)
         except:
-            print("   Could not determine Supabase version")
+            logger.debug("   Could not determine Supabase version")
         try:
             import httpx
-            print(f"   httpx version: {httpx.__version__}")
+            logger.debug("   httpx version: %s", httpx.__version__)
         except:
-            print("   Could not determine httpx version")
+            logger.debug("   Could not determine httpx version")
         return None
 
-# In-memory storage for async results (use Redis/Firestore in production)
-results_store = {}
+# Background dataset prewarms in flight, by dataset ID
+DATASET_PREWARM_ENABLED = os.getenv('DATASET_PREWARM', 'true').lower() == 'true'
+_prewarm_threads: Dict[str, threading.Thread] = {}
+_prewarm_lock = threading.Lock()
+
+# Bounded in-memory storage for async results; status polls that reach another
+# instance fall back to the query's row in query_history
+results_store = MemoryCache(
+    max_entries=int(os.getenv('RESULTS_STORE_MAX_ENTRIES', '500')),
+    max_bytes=int(os.getenv('RESULTS_STORE_MAX_BYTES', str(64 * 1024 * 1024))),
+    ttl_seconds=float(os.getenv('RESULTS_STORE_TTL_SECONDS', '3600'))
+)
+
+# Cache of full search responses keyed by dataset version and criteria
+result_cache = create_result_cache()
+
+# Bounded worker pool for asynchronous ('submit') searches
+job_queue = JobQueue()
+
+# Speculative BM25 retrieval with rule-based criteria while the criteria LLM runs
+SPECULATIVE_SEARCH_ENABLED = os.getenv('SPECULATIVE_SEARCH', 'true').lower() == 'true'
+speculation_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('SPECULATION_WORKERS', '4')), thread_name_prefix='speculation'
+)
+speculation_counts = {'attempts': 0, 'hits': 0, 'partial': 0, 'misses': 0, 'failures': 0}
+_speculation_lock = threading.Lock()
+
+# Hybrid retrieval: fuse BM25 with dense profile vectors (see dense_retrieval)
+HYBRID_SEARCH_ENABLED = os.getenv('HYBRID_SEARCH', 'false').lower() == 'true'
+
+# Near-duplicate rows are collapsed into one canonical result (see near_duplicates).
+# Opt-in: clusters are then found when a dataset version is loaded; requests can
+# still ask for 'dedupe', which finds them within the request deadline.
+DEDUP_ENABLED = os.getenv('DATASET_DEDUP', 'false').lower() == 'true'
+
+# Store row references instead of full profiles in query_history (see compact_results);
+# compact results are read back with profiles through the 'results' stage
+COMPACT_RESULTS_ENABLED = os.getenv('COMPACT_RESULT_STORAGE', 'false').lower() == 'true'
+
+# Federated search: the datasets of one request are loaded and searched concurrently
+MAX_FEDERATED_DATASETS = int(os.getenv('MAX_FEDERATED_DATASETS', '10'))
+federation_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('FEDERATION_WORKERS', '4')), thread_name_prefix='federation'
+)
 
 @functions_framework.http
 @cross_origin()
@@ -72,12 +157,18 @@ def get_recommendations(request: Request):
     """
     Main Cloud Function entry point
     
-    Supports two stages:
-    - 'questions': Generate follow-up questions for query refinement
+    Supports six stages:
+    - 'questions': Generate follow-up questions and prewarm the dataset if datasetId is given
     - 'search': Execute full search pipeline with BM25 + LLM analysis
+      (over several datasets at once when datasetIds is given)
+    - 'submit': Queue the search pipeline and return 202 with the queryId
+    - 'status': Poll a submitted search for its status and results
+    - 'results': Stored results of a query, with compact results hydrated
+    - 'metrics': Instance metrics as JSON or Prometheus text (also GET ?stage=metrics)
     """
     
     start_time = time.time()
+    log_tokens = None
     
     try:
         # Handle CORS preflight
@@ -89,6 +180,9 @@ def get_recommendations(request: Request):
             })
         
         if request.method == 'GET':
+            if request.args.get('stage') == 'metrics':
+                # Scrape endpoint, Prometheus text unless format=json
+                return handle_metrics(request.args.get('format', 'prometheus'))
             # Health check endpoint
             return handle_health_check()
         
@@ -100,16 +194,26 @@ def get_recommendations(request: Request):
                 'error': 'Invalid JSON in request body'
             }), 400
         
+        # Per-request debug logging, e.g. to inspect raw LLM responses for one query
+        log_tokens = start_request_logging(request_json.get('debug', False), request_json.get('queryId'))
+        
         stage = request_json.get('stage', 'search')
         query = request_json.get('query')
         dataset_id = request_json.get('datasetId')
+        dataset_ids = request_json.get('datasetIds')  # Federated search over several datasets
         dataset_schema = request_json.get('datasetSchema')
         follow_up_answers = request_json.get('followUpAnswers', {})
         limit = request_json.get('limit', 10)
         top_k = request_json.get('topK', 50)
         query_id = request_json.get('queryId')  # ID to update in database
+        rerank = request_json.get('rerank', RERANK_ENABLED)  # Local rerank before LLM analysis
+        use_planner = request_json.get('queryPlanner', QUERY_PLANNER_ENABLED)  # Rule-based criteria for simple queries
+        use_cache = request_json.get('useCache', RESULT_CACHE_ENABLED)  # Reuse identical searches
+        speculative = request_json.get('speculative', SPECULATIVE_SEARCH_ENABLED)  # Retrieve while the criteria LLM runs
+        hybrid = request_json.get('hybrid', HYBRID_SEARCH_ENABLED)  # Fuse BM25 with dense retrieval
+        dedupe = request_json.get('dedupe', DEDUP_ENABLED)  # Collapse near-duplicate rows
         
-        print(f"🚀 Starting {stage} stage for query: '{query}'")
+        logger.info("🚀 Starting %s stage for query: '%s'", stage, query)
         
         # === STAGE 1: FOLLOW-UP QUESTIONS ===
         if stage == 'questions':
@@ -119,7 +223,19 @@ def get_recommendations(request: Request):
                     'error': 'Query is required for follow-up questions'
                 }), 400
             
-            questions = generate_follow_up_questions(query, dataset_schema)
+            # Load the dataset while the user answers the questions
+            prewarm_status = start_dataset_prewarm(dataset_id) if dataset_id else None
+            if dataset_ids and isinstance(dataset_ids, list):
+                prewarm_status = {
+                    str(prewarm_id): start_dataset_prewarm(str(prewarm_id))
+                    for prewarm_id in dataset_ids[:MAX_FEDERATED_DATASETS]
+                }
+            
+            usage_ledger, usage_token = start_usage_tracking()
+            try:
+                questions = generate_follow_up_questions(query, dataset_schema)
+            finally:
+                end_usage_tracking(usage_token)
             
             return jsonify({
                 'success': True,
@@ -127,61 +243,258 @@ def get_recommendations(request: Request):
                 'query': query,
                 'questions': questions,
                 'metadata': {
-                    'processing_time': time.time() - start_time
+                    'processing_time': time.time() - start_time,
+                    'dataset_prewarm': prewarm_status,
+                    'llm_usage': usage_ledger.summary()
                 }
             })
         
         # === STAGE 2-5: FULL SEARCH PIPELINE ===
-        elif stage == 'search':
+        elif stage in ('search', 'submit'):
+            if dataset_ids is not None:
+                if (not isinstance(dataset_ids, list) or not dataset_ids
+                        or not all(isinstance(item, str) and item for item in dataset_ids)):
+                    return jsonify({
+                        'success': False,
+                        'error': 'datasetIds must be a non-empty list of dataset IDs'
+                    }), 400
+                dataset_ids = list(dict.fromkeys(dataset_ids))
+                if len(dataset_ids) > MAX_FEDERATED_DATASETS:
+                    return jsonify({
+                        'success': False,
+                        'error': f'datasetIds supports at most {MAX_FEDERATED_DATASETS} datasets'
+                    }), 400
+                dataset_id = dataset_ids[0]
+            
             if not query or not dataset_id:
                 return jsonify({
                     'success': False,
-                    'error': 'Missing required parameters: query and datasetId'
+                    'error': 'Missing required parameters: query and datasetId (or datasetIds)'
                 }), 400
             
-            # Execute the full pipeline
-            results = execute_search_pipeline(
-                query, dataset_id, dataset_schema, 
-                follow_up_answers, limit, top_k, start_time, query_id
-            )
+            try:
+                deadline_ms = parse_deadline_ms(request_json.get('deadlineMs'))  # Latency budget of the search
+            except ValueError as error:
+                return jsonify({
+                    'success': False,
+                    'error': str(error)
+                }), 400
             
-            # Update database if query_id provided
-            if query_id and results.get('success'):
-                try:
-                    update_query_in_database(query_id, results)
-                except Exception as db_error:
-                    print(f"⚠️ Failed to update database: {str(db_error)}")
-                    # Don't fail the whole request for database errors
+            search_args = {
+                'query': query,
+                'dataset_id': dataset_id,
+                'dataset_schema': dataset_schema,
+                'follow_up_answers': follow_up_answers,
+                'limit': limit,
+                'top_k': top_k,
+                'query_id': query_id,
+                'rerank': rerank,
+                'use_planner': use_planner,
+                'use_cache': use_cache,
+                'speculative': speculative,
+                'hybrid': hybrid,
+                'dedupe': dedupe,
+                'dataset_ids': dataset_ids,
+                'deadline_ms': deadline_ms
+            }
+            
+            if stage == 'search':
+                # Execute the full pipeline while the client waits
+                return jsonify(run_search(search_args, start_time))
+            
+            # Asynchronous mode: queue the pipeline and return immediately
+            query_id = query_id or str(uuid.uuid4())
+            search_args['query_id'] = query_id
+            store_results(query_id, {'status': 'queued', 'submitted_at': datetime.now().isoformat()})
+            
+            if not job_queue.submit(query_id, run_search_job, query_id, search_args):
+                results_store.delete(query_id)
+                return jsonify({
+                    'success': False,
+                    'error': 'Search queue is full, please retry shortly',
+                    'queue': job_queue.stats()
+                }), 503, {'Retry-After': '5'}
+            
+            return jsonify({
+                'success': True,
+                'stage': 'submitted',
+                'queryId': query_id,
+                'status': 'queued',
+                'queue': job_queue.stats()
+            }), 202
+        
+        # === STORED RESULTS ===
+        elif stage == 'results':
+            if not query_id:
+                return jsonify({
+                    'success': False,
+                    'error': 'queryId is required to read stored results'
+                }), 400
+            if not get_supabase_client():
+                return jsonify({
+                    'success': False,
+                    'error': 'Database not configured'
+                }), 503
+            
+            stored = load_query_results(query_id)
+            if not stored:
+                return jsonify({
+                    'success': False,
+                    'error': f'Unknown queryId: {query_id}'
+                }), 404
+            
+            return jsonify({
+                'success': True,
+                'stage': 'results',
+                'queryId': query_id,
+                **stored
+            })
+        
+        # === INSTANCE METRICS ===
+        elif stage == 'metrics':
+            return handle_metrics(request_json.get('format', 'json'))
+        
+        # === ASYNC STATUS POLL ===
+        elif stage == 'status':
+            if not query_id:
+                return jsonify({
+                    'success': False,
+                    'error': 'queryId is required for status polling'
+                }), 400
             
-            return jsonify(results)
+            job = get_stored_results(query_id)
+            if not job:
+                return jsonify({
+                    'success': False,
+                    'error': f'Unknown or expired queryId: {query_id}'
+                }), 404
+            
+            return jsonify({
+                'success': True,
+                'stage': 'status',
+                'queryId': query_id,
+                **job
+            })
         
         else:
             return jsonify({
                 'success': False,
-                'error': 'Invalid stage. Must be "questions" or "search"'
+                'error': 'Invalid stage. Must be "questions", "search", "submit", "status", "results" or "metrics"'
             }), 400
             
+    except DeadlineExceeded as error:
+        logger.warning("⏰ %s", error)
+        return jsonify({
+            'success': False,
+            'error': str(error),
+            'stage': 'error'
+        }), 504, {'Retry-After': '5'}
+    
     except Exception as error:
-        print(f"❌ Error in get_recommendations: {str(error)}")
+        logger.exception("❌ Error in get_recommendations: %s", error)
         return jsonify({
             'success': False,
             'error': str(error),
             'stage': 'error'
         }), 500
+    
+    finally:
+        if log_tokens:
+            end_request_logging(log_tokens)
 
-def handle_health_check():
-    """Health check endpoint"""
+def run_search(search_args: Dict[str, Any], start_time: float) -> Dict[str, Any]:
+    """Execute the search pipeline and persist results for the query"""
+    query_id = search_args.get('query_id')
+    results = execute_search_pipeline(
+        search_args['query'], search_args['dataset_id'], search_args['dataset_schema'],
+        search_args['follow_up_answers'], search_args['limit'], search_args['top_k'],
+        start_time, query_id,
+        rerank=search_args['rerank'],
+        use_planner=search_args['use_planner'],
+        use_cache=search_args['use_cache'],
+        speculative=search_args['speculative'],
+        hybrid=search_args['hybrid'],
+        dedupe=search_args.get('dedupe', DEDUP_ENABLED),
+        dataset_ids=search_args.get('dataset_ids'),
+        deadline_ms=search_args.get('deadline_ms')
+    )
+    
+    # Update database if query_id provided
+    if query_id and results.get('success'):
+        try:
+            update_query_in_database(query_id, results, search_args['dataset_id'])
+        except Exception as db_error:
+            logger.warning("⚠️ Failed to update database: %s", db_error)
+            # Don't fail the whole request for database errors
+    
+    return results
+
+def run_search_job(query_id: str, search_args: Dict[str, Any]) -> None:
+    """Run a submitted search on a worker thread and record its outcome"""
+    store_results(query_id, {'status': 'processing', 'started_at': datetime.now().isoformat()})
     try:
-        # Test Google Cloud Storage connection
-        buckets = list(storage_client.list_buckets(max_results=1))
+        results = run_search(search_args, time.time())
+        store_results(query_id, {'status': 'completed', 'results': results})
+    except Exception as error:
+        store_results(query_id, {'status': 'error', 'error': str(error)})
+        raise
+
+def start_dataset_prewarm(dataset_id: str) -> str:
+    """
+    Start downloading and indexing a dataset in a background thread
+
+    Returns 'started', 'in_progress' or 'disabled'. Like queued jobs, the
+    prewarm keeps running after the response only if the instance has CPU
+    allocated outside of requests.
+    """
+    if not DATASET_PREWARM_ENABLED:
+        return 'disabled'
+    
+    with _prewarm_lock:
+        thread = _prewarm_threads.get(dataset_id)
+        if thread and thread.is_alive():
+            return 'in_progress'
+        thread = threading.Thread(
+            target=contextvars.copy_context().run, args=(prewarm_dataset, dataset_id),
+            name=f'prewarm-{dataset_id}', daemon=True
+        )
+        _prewarm_threads[dataset_id] = thread
+    
+    thread.start()
+    return 'started'
+
+def prewarm_dataset(dataset_id: str) -> None:
+    """
+    Load a dataset into the instance cache so the following search finds it hot
+    """
+    prewarm_start = time.time()
+    try:
+        # Imported here so the questions stage itself stays light
+        from dataset_store import load_dataset
         
+        # Shares the load with a search that arrives while the prewarm is running
+        dataset = load_dataset(dataset_id, get_storage_client())
+        dataset.index.get_scores([])  # Build IDF and document length arrays ahead of the first query
+        if HYBRID_SEARCH_ENABLED:
+            dataset.get_dense_index()
+        logger.info("🔥 Prewarmed dataset %s in %.1fs (%s)", dataset_id, time.time() - prewarm_start, dataset.load_stats.get('mode'))
+    except Exception as error:
+        logger.warning("⚠️ Dataset prewarm failed for %s: %s", dataset_id, error)
+    finally:
+        with _prewarm_lock:
+            _prewarm_threads.pop(dataset_id, None)
+
+def handle_health_check():
+    """Health check endpoint (no network calls; see the metrics stage for details)"""
+    try:
         return jsonify({
             'status': 'healthy',
             'timestamp': datetime.now().isoformat(),
             'services': {
-                'storage': 'connected',
+                'storage': 'initialized' if _storage_client is not None else 'not_initialized',
                 'openai': 'configured' if os.getenv('OPENAI_API_KEY') else 'not_configured'
             },
+            'queue': job_queue.stats(),
             'version': '2.0.0-python-bm25'
         })
     except Exception as error:
@@ -191,6 +504,50 @@ def handle_health_check():
             'timestamp': datetime.now().isoformat()
         }), 500
 
+def handle_metrics(output_format: str):
+    """Instance metrics as Prometheus text or JSON"""
+    if output_format == 'json':
+        return jsonify({
+            'success': True,
+            'stage': 'metrics',
+            'metrics': metrics.get_metrics_snapshot(),
+            'timestamp': datetime.now().isoformat()
+        })
+    return metrics.render_prometheus(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+def collect_service_metrics() -> List[metrics.Sample]:
+    """Result cache, async results store, deadline workers, job queue and speculation counters"""
+    samples = []
+    cache_stats = result_cache.stats()
+    for tier, stats in cache_stats.items():
+        samples.append(('result_cache_entries', 'gauge', {'tier': tier}, stats['entries']))
+        samples.append(('result_cache_bytes', 'gauge', {'tier': tier}, stats['bytes']))
+    memory_stats = cache_stats['memory']
+    samples.extend([
+        ('result_cache_lookups_total', 'counter', {'result': 'hit'}, memory_stats['hits']),
+        ('result_cache_lookups_total', 'counter', {'result': 'miss'}, memory_stats['misses']),
+        ('result_cache_evictions_total', 'counter', {}, memory_stats['evictions'])
+    ])
+    
+    store_stats = results_store.stats()
+    samples.append(('results_store_entries', 'gauge', {}, store_stats['entries']))
+    samples.append(('results_store_bytes', 'gauge', {}, store_stats['bytes']))
+    samples.append(('deadline_abandoned_calls', 'gauge', {}, abandoned_calls()))
+    
+    queue_stats = job_queue.stats()
+    for key in ('pending', 'active'):
+        samples.append((f'job_queue_{key}', 'gauge', {}, queue_stats[key]))
+    for key in ('completed', 'failed', 'rejected'):
+        samples.append(('job_queue_jobs_total', 'counter', {'outcome': key}, queue_stats[key]))
+    
+    with _speculation_lock:
+        counts = dict(speculation_counts)
+    for key in ('hits', 'partial', 'misses', 'failures'):
+        samples.append(('speculation_total', 'counter', {'outcome': key}, counts[key]))
+    return samples
+
+metrics.register_collector(collect_service_metrics)
+
 def execute_search_pipeline(
     query: str, 
     dataset_id: str, 
@@ -199,31 +556,53 @@ def execute_search_pipeline(
     limit: int, 
     top_k: int, 
     start_time: float,
-    query_id: Optional[str] = None
+    query_id: Optional[str] = None,
+    rerank: bool = RERANK_ENABLED,
+    use_planner: bool = QUERY_PLANNER_ENABLED,
+    use_cache: bool = RESULT_CACHE_ENABLED,
+    speculative: bool = SPECULATIVE_SEARCH_ENABLED,
+    hybrid: bool = HYBRID_SEARCH_ENABLED,
+    dedupe: bool = DEDUP_ENABLED,
+    dataset_ids: Optional[List[str]] = None,
+    deadline_ms: Optional[int] = None
 ) -> Dict[str, Any]:
     """
     Execute the full search pipeline with detailed logging and progress updates
+
+    With more than one of ``dataset_ids`` the datasets are searched together:
+    one criteria call, parallel retrieval and a single LLM pass over the
+    merged candidates. With ``dedupe`` near-duplicate rows are searched and
+    returned once, as a merged canonical record. With ``deadline_ms`` stages that would overrun the
+    budget fall back to rule-based criteria and fallback scoring.
     """
+    from bm25_search import search_with_bm25
+    from llm_refinement import refine_candidates_with_llm
+    from dataset_store import load_dataset
+    
     def log_stage(stage_name: str, message: str, progress: int = None, substep_data: Dict = None):
         timestamp = datetime.now().strftime("%H:%M:%S")[:-3]
         elapsed = time.time() - start_time
         progress_str = f" [{progress}%]" if progress is not None else ""
         
         # Simplified logging - less verbose
-        print(f'🕐 {elapsed:.1f}s | {stage_name}{progress_str}: {message}')
+        logger.info('🕐 %.1fs | %s%s: %s', elapsed, stage_name, progress_str, message)
         
         # Only log key data points, not everything
         if substep_data and any(key in substep_data for key in ['filtered_count', 'candidates_found', 'final_results', 'error_type']):
             key_data = {k: v for k, v in substep_data.items() if k in ['filtered_count', 'candidates_found', 'final_results', 'hard_constraints', 'error_type']}
             if key_data:
-                print(f'   📊 Key data: {json.dumps(key_data)}')
+                logger.info('   📊 Key data: %s', LazyJson(key_data), extra={'fields': key_data})
         
         # Update database with progress if query_id provided
         if query_id:
             try:
                 update_query_progress(query_id, stage_name, message, progress or 0, False, substep_data)
             except Exception as e:
-                print(f'⚠️  Progress update failed: {str(e)}')
+                logger.warning('⚠️  Progress update failed: %s', e)
+    
+    deadline = Deadline(deadline_ms, start_time) if deadline_ms else None
+    timer = metrics.StageTimer(start_time)
+    usage_ledger, usage_token = start_usage_tracking()  # LLM tokens and cost of this query
     
     try:
         log_stage('🚀 CRITERIA', f'Starting search pipeline for query: "{query}"', 0, {
@@ -233,31 +612,175 @@ def execute_search_pipeline(
             'top_k': top_k
         })
         
-        # Stage 2A: Smart Query Analysis
-        log_stage('📝 CRITERIA', 'Analyzing query with advanced AI...', 10)
+        def serve_cached(cached_results: Dict[str, Any], cache_level: str) -> Dict[str, Any]:
+            processing_time = time.time() - start_time
+            metrics.inc('searches_total', outcome='cache_hit')
+            metrics.observe('search_duration_seconds', processing_time, outcome='cache_hit')
+            log_stage('🎯 COMPLETED', f'✅ Served from result cache in {processing_time:.2f}s', 100, {
+                'final_results': len(cached_results['recommendations'])
+            })
+            if query_id:
+                try:
+                    update_query_progress(query_id, 'completed', 'Search completed successfully', 100, True)
+                except Exception as e:
+                    logger.warning('⚠️  Failed to update completion status: %s', e)
+            
+            return {
+                **cached_results,
+                'query': query,
+                'metadata': {
+                    **cached_results['metadata'],
+                    'cache_hit': True,
+                    'cache_level': cache_level,
+                    'llm_usage': usage_ledger.summary(),
+                    'processing_time': processing_time,
+                    'timestamp': datetime.now().isoformat()
+                }
+            }
+        
+        # Dataset version only needs object metadata, not the data
+        dataset_ids = dataset_ids or [dataset_id]
+        federated = len(dataset_ids) > 1
+        if federated:
+            blob_futures = [
+                federation_executor.submit(contextvars.copy_context().run, resolve_dataset_blob, blob_id, get_storage_client())
+                for blob_id in dataset_ids
+            ]
+            file_blobs = [future.result() for future in blob_futures]
+            dataset_version = '+'.join(get_dataset_version(blob) for blob in file_blobs)
+        else:
+            file_blob = resolve_dataset_blob(dataset_id, get_storage_client())
+            dataset_version = get_dataset_version(file_blob)
+        
+        # Stage 2A: Result cache lookup by query, before any LLM call or speculation
+        cache_options = {
+            'rerank': bool(rerank), 'hybrid': bool(hybrid), 'dedupe': bool(dedupe), 'planner': bool(use_planner)
+        }
+        query_cache_key = make_query_cache_key(
+            dataset_version, query, follow_up_answers, dataset_schema, limit, top_k, cache_options
+        )
+        if use_cache:
+            cache_alias = result_cache.get(query_cache_key)
+            cached_results = result_cache.get(cache_alias['criteria_key']) if cache_alias else None
+            timer.lap('cache_lookup')
+            if cached_results:
+                return serve_cached(cached_results, 'query')
+        
+        # Stage 2B: Smart Query Analysis (simple lookups skip the criteria LLM)
+        query_plan = plan_query(query, follow_up_answers) if use_planner else {'path': 'llm', 'confidence': None}
         
-        # Stage 2B: Intelligent Criteria Generation
-        criteria = translate_query_to_criteria(query, dataset_schema, follow_up_answers)
+        # Stage 2C: Intelligent Criteria Generation
+        speculation = None
+        if query_plan['path'] == 'rules':
+            log_stage('📝 CRITERIA', f'Simple {query_plan["query_type"].replace("_", " ")} - building criteria locally...', 10)
+            criteria = query_plan.pop('criteria')
+        else:
+            if speculative and not federated:
+                # Load and score with rule-based criteria during the LLM round trip
+                speculation = speculation_executor.submit(
+                    contextvars.copy_context().run, run_speculative_search, query, dataset_id, file_blob, dedupe
+                )
+            log_stage('📝 CRITERIA', 'Analyzing query with advanced AI...', 10)
+            if deadline is None:
+                criteria = translate_query_to_criteria(query, dataset_schema, follow_up_answers)
+            else:
+                try:
+                    criteria = run_with_timeout(
+                        deadline.stage_timeout('criteria_generation'),
+                        translate_query_to_criteria, query, dataset_schema, follow_up_answers
+                    )
+                except FuturesTimeoutError:
+                    deadline.degrade('criteria_generation', 'criteria LLM too slow, using rule-based criteria')
+                    metrics.inc('fallbacks_total', kind='criteria', reason='deadline')
+                    criteria = create_fallback_criteria(query, extract_hard_constraints(query))
         hard_constraints = criteria.get('hardConstraints', {})
         log_stage('📝 CRITERIA', f'✅ Intelligent criteria generated', 20, {
             'hard_constraints': {k: v for k, v in hard_constraints.items() if v}
         })
+        timer.lap('criteria_generation')
+
+        # Stage 2D: Result cache lookup by criteria (differently worded queries with the same criteria)
+        cache_key = make_result_cache_key(
+            dataset_version, criteria, limit, top_k, {'rerank': bool(rerank), 'hybrid': bool(hybrid), 'dedupe': bool(dedupe)}
+        )
+        if use_cache:
+            cached_results = result_cache.get(cache_key)
+            timer.lap('cache_lookup')
+            if cached_results:
+                if speculation is not None:
+                    speculation.cancel()  # Only stops it if it hasn't started yet
+                result_cache.set(query_cache_key, {'criteria_key': cache_key})
+                return serve_cached(cached_results, 'criteria')
+
+        # Stage 3: Dataset Loading (already done by the speculative search, if any)
+        federation_stats, speculation_stats = None, None
+        if federated:
+            # Stages 3-4 per dataset in parallel, merged into one candidate list
+            log_stage('📊 DATASET', f'Loading and searching {len(dataset_ids)} datasets in parallel...', 30)
+            datasets, bm25_results, federation_stats, dense_stats = search_federated(
+                dataset_ids, file_blobs, query, criteria, top_k, hybrid, dedupe, deadline
+            )
+            total_records = sum(len(dataset.records) for dataset in datasets)
+            log_stage('📊 DATASET', f'✅ {len(datasets)} datasets loaded: {total_records:,} records', 35)
+            timer.lap('federated_search')
+            dataset_load = {dataset.dataset_id: dataset.load_stats for dataset in datasets}
+            dedup_stats = {
+                dataset.dataset_id: clusters.stats if clusters is not None else None
+                for dataset in datasets for clusters in [dataset.built_duplicate_clusters()]
+            } if dedupe else None
+        else:
+            log_stage('📊 DATASET', f'Loading dataset...', 30)
+            dataset, search_state = None, None
+            if speculation is not None:
+                dataset, search_state, speculation_stats = finish_speculative_search(
+                    speculation, criteria, deadline.stage_timeout('dataset_loading') if deadline else None
+                )
+            if dataset is None:
+                dataset = load_dataset_within_deadline(dataset_id, file_blob, deadline)
+            people = dataset.records
+            total_records = len(people)
+            dataset_load = dataset.load_stats
+            log_stage('📊 DATASET', f'✅ Dataset loaded: {len(people):,} records ({dataset.load_stats["mode"]})', 35)
+            timer.lap('dataset_loading')
 
-        # Stage 3: Dataset Loading
-        log_stage('📊 DATASET', f'Loading dataset...', 30)
-        people = parse_dataset(dataset_id, storage_client)
-        log_stage('📊 DATASET', f'✅ Dataset loaded: {len(people):,} records', 35)
+            # Stage 3B: Near-duplicate clusters (found once per dataset version)
+            duplicates = get_duplicates_within_deadline(dataset, deadline) if dedupe else None
+            dedup_stats = duplicates.stats if duplicates is not None else None
+            if duplicates is not None:
+                timer.lap('dedup')
 
-        # Stage 4: Smart Search Algorithm
-        log_stage('🔍 BM25', f'Running intelligent search...', 50)
-        bm25_results = search_with_bm25(people, criteria, top_k)
+            # Stage 4: Smart Search Algorithm (optionally fused with dense retrieval)
+            dense_scores, dense_stats = None, None
+            if hybrid:
+                log_stage('🔍 BM25', f'Scoring profile vectors...', 45)
+                dense_scores, dense_stats = score_dense_retrieval(dataset, query, criteria, deadline)
+                timer.lap('dense_retrieval')
+            log_stage('🔍 BM25', f'Running intelligent search...', 50)
+            bm25_results = search_with_bm25(
+                people, criteria, top_k, index=dataset.index, row_ids=dataset.row_ids,
+                search_state=search_state, field_index=dataset.get_field_index(), dense_scores=dense_scores,
+                duplicates=duplicates
+            )
+            timer.lap('bm25_search')
         log_stage('🔍 BM25', f'✅ Found {len(bm25_results)} candidates', 60, {
             'candidates_found': len(bm25_results)
         })
 
+        # Stage 4B: Optional local rerank to shrink the LLM candidate set
+        llm_candidates = bm25_results
+        rerank_stats = None
+        if rerank:
+            llm_candidates, rerank_stats = rerank_candidates(bm25_results, criteria, limit)
+            timer.lap('rerank')
+            log_stage('🔍 BM25', f'✅ Reranked: {len(llm_candidates)} candidates need AI analysis', 65, {
+                'candidates_found': len(llm_candidates)
+            })
+
         # Stage 5: AI Analysis
         log_stage('🧠 LLM', f'Analyzing candidates with AI...', 70)
-        refined_results = refine_candidates_with_llm(bm25_results, criteria, limit)
+        llm_stats = {}
+        refined_results = refine_candidates_with_llm(llm_candidates, criteria, limit, stats=llm_stats, deadline=deadline)
+        timer.lap('llm_refinement')
         log_stage('🧠 LLM', f'✅ Analysis complete', 90, {
             'final_results': len(refined_results)
         })
@@ -266,37 +789,68 @@ def execute_search_pipeline(
         log_stage('🎯 COMPLETED', f'✅ Search completed in {processing_time:.1f}s', 100, {
             'final_results': len(refined_results)
         })
+        degraded_stages = list(deadline.degraded_stages) if deadline else []
+        outcome = 'degraded' if degraded_stages else 'completed'
+        metrics.inc('searches_total', outcome=outcome)
+        metrics.observe('search_duration_seconds', processing_time, outcome=outcome)
 
         # Final database update
         if query_id:
             try:
                 update_query_progress(query_id, 'completed', 'Search completed successfully', 100, True)
             except Exception as e:
-                print(f'⚠️  Failed to update completion status: {str(e)}')
+                logger.warning('⚠️  Failed to update completion status: %s', e)
 
-        return {
+        results = {
             'success': True,
             'stage': 'completed',
             'query': query,
             'criteria_used': criteria,
             'recommendations': refined_results,
             'metadata': {
-                'total_dataset_size': len(people),
+                'cache_hit': False,
+                'cache_level': None,
+                'total_dataset_size': total_records,
+                'dataset_version': dataset_version,
+                'criteria_path': query_plan['path'],
+                'query_plan': query_plan,
+                'dataset_load': dataset_load,
+                'dedup': dedup_stats,
+                'federation': federation_stats,
+                'speculation': speculation_stats,
+                'hybrid': dense_stats,
                 'bm25_candidates': len(bm25_results),
+                'llm_candidates': len(llm_candidates),
+                'rerank': rerank_stats,
+                'llm_refinement': llm_stats,
+                'llm_usage': usage_ledger.summary(),
                 'final_results': len(refined_results),
                 'processing_time': processing_time,
                 'timestamp': datetime.now().isoformat(),
+                'deadline': deadline.summary() if deadline else None,
+                'degraded_stages': degraded_stages,
                 'stages_completed': [
                     'criteria_generation',
                     'dataset_loading', 
+                    *(['dedup'] if dedupe and 'dedup' not in degraded_stages else []),
+                    *(['dense_retrieval'] if hybrid and 'dense_retrieval' not in degraded_stages else []),
                     'bm25_search',
+                    *(['rerank'] if rerank else []),
                     'llm_refinement'
                 ]
             }
         }
 
+        if use_cache and not degraded_stages:
+            # Degraded results would keep being served after the slowdown passed
+            result_cache.set(cache_key, results)
+            result_cache.set(query_cache_key, {'criteria_key': cache_key})
+
+        return results
+
     except Exception as error:
         elapsed = time.time() - start_time
+        metrics.inc('searches_total', outcome='error')
         import traceback
         error_details = {
             'error_type': type(error).__name__,
@@ -313,9 +867,239 @@ def execute_search_pipeline(
             try:
                 update_query_progress(query_id, 'error', f'Search failed: {str(error)}', 0, True, error_details)
             except Exception as e:
-                print(f'⚠️  Failed to update error status: {str(e)}')
+                logger.warning('⚠️  Failed to update error status: %s', e)
         
         raise error
+    
+    finally:
+        # Federated queries are rolled up under their joined dataset IDs
+        record_dataset_usage('+'.join(dataset_ids or [dataset_id]), usage_ledger.summary())
+        end_usage_tracking(usage_token)
+
+def load_dataset_within_deadline(dataset_id: str, file_blob, deadline: Optional[Deadline]) -> Any:
+    """
+    Load a dataset, raising DeadlineExceeded when it can't be loaded in time
+
+    A timed-out load keeps running, so a retry finds the dataset cached.
+    """
+    from dataset_store import load_dataset, is_dataset_cached
+    
+    if deadline is None or is_dataset_cached(dataset_id, get_dataset_version(file_blob)):
+        return load_dataset(dataset_id, get_storage_client(), file_blob)
+    try:
+        return run_with_timeout(
+            deadline.stage_timeout('dataset_loading'), load_dataset, dataset_id, get_storage_client(), file_blob
+        )
+    except FuturesTimeoutError:
+        deadline.degrade('dataset_loading', f'dataset {dataset_id} not loaded in time')
+        raise DeadlineExceeded(f'Dataset {dataset_id} could not be loaded within the deadline; retry shortly')
+
+def get_duplicates_within_deadline(dataset: Any, deadline: Optional[Deadline]) -> Optional[Any]:
+    """
+    Near-duplicate clusters of a dataset; None (search every row) when they
+    aren't found yet and finding them doesn't fit in the deadline
+    """
+    duplicates = dataset.built_duplicate_clusters()
+    if duplicates is not None:
+        return duplicates
+    if deadline is None:
+        return dataset.get_duplicate_clusters()
+    try:
+        return run_with_timeout(deadline.stage_timeout('dedup'), dataset.get_duplicate_clusters)
+    except FuturesTimeoutError:
+        deadline.degrade('dedup', 'near-duplicate clusters not found in time, searching every row')
+        return None
+
+def score_dense_retrieval(
+    dataset: Any, query: str, criteria: Dict[str, Any], deadline: Optional[Deadline] = None
+) -> Tuple[Any, Optional[Dict[str, Any]]]:
+    """
+    Similarity of every profile in a dataset to the query and its criteria terms
+
+    Returns (None, None) when the profile vectors aren't built yet and
+    building them doesn't fit in the deadline.
+    """
+    from bm25_search import build_bm25_query
+    
+    dense_start = time.time()
+    dense_index = dataset.built_dense_index()
+    if dense_index is None and deadline is not None:
+        try:
+            dense_index = run_with_timeout(deadline.stage_timeout('dense_retrieval'), dataset.get_dense_index)
+        except FuturesTimeoutError:
+            deadline.degrade('dense_retrieval', 'profile vectors not built in time, using BM25 only')
+            return None, None
+    elif dense_index is None:
+        dense_index = dataset.get_dense_index()
+    dense_scores = dense_index.score_query(f'{query} {build_bm25_query(criteria)}', len(dataset.records))
+    return dense_scores, {
+        'dimensions': int(dense_index.matrix.shape[1]),
+        'seconds': round(time.time() - dense_start, 3)
+    }
+
+def search_dataset_shard(
+    dataset_id: str, file_blob, query: str, criteria: Dict[str, Any], top_k: int, hybrid: bool, dedupe: bool,
+    deadline: Optional[Deadline] = None
+) -> Dict[str, Any]:
+    """
+    Load one dataset of a federated search and retrieve its top_k candidates
+    """
+    from bm25_search import search_with_bm25, prepare_bm25_search
+    
+    dataset = load_dataset_within_deadline(dataset_id, file_blob, deadline)
+    field_index = dataset.get_field_index()
+    duplicates = get_duplicates_within_deadline(dataset, deadline) if dedupe else None
+    search_state = prepare_bm25_search(
+        dataset.records, criteria, dataset.index, field_index=field_index, duplicates=duplicates
+    )
+    dense_scores, dense_stats = score_dense_retrieval(dataset, query, criteria, deadline) if hybrid else (None, None)
+    results = search_with_bm25(
+        dataset.records, criteria, top_k, index=dataset.index, row_ids=dataset.row_ids,
+        search_state=search_state, field_index=field_index, dense_scores=dense_scores
+    )
+    return {
+        'dataset': dataset,
+        'results': results,
+        'max_score': dataset.index.max_query_score(search_state['query_tokens']),
+        'dense_stats': dense_stats
+    }
+
+def search_federated(
+    dataset_ids: List[str], file_blobs: List[Any], query: str, criteria: Dict[str, Any], top_k: int, hybrid: bool,
+    dedupe: bool, deadline: Optional[Deadline] = None
+) -> Tuple[List[Any], List[Dict[str, Any]], Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    Search several datasets concurrently and merge their candidates into one top_k
+
+    BM25 scores are rescaled by each corpus's query score bound, since IDF and
+    document lengths differ between datasets. With hybrid retrieval the
+    rank-based fusion scores are already comparable and decide the merge.
+    Returns (datasets, merged candidates, federation stats, dense stats).
+    A dataset that fails is reported in the stats unless all of them fail.
+    """
+    futures = {
+        dataset_id: federation_executor.submit(
+            contextvars.copy_context().run, search_dataset_shard, dataset_id, file_blob, query, criteria, top_k, hybrid, dedupe, deadline
+        )
+        for dataset_id, file_blob in zip(dataset_ids, file_blobs)
+    }
+    shards, failures, timed_out = {}, {}, 0
+    for dataset_id, future in futures.items():
+        try:
+            shards[dataset_id] = future.result()
+        except Exception as error:
+            logger.warning("⚠️ Federated search failed for dataset %s: %s", dataset_id, error)
+            failures[dataset_id] = str(error)
+            timed_out += isinstance(error, DeadlineExceeded)
+    if not shards and timed_out == len(failures):
+        raise DeadlineExceeded(f"No dataset could be loaded within the deadline: {failures}")
+    if not shards:
+        raise Exception(f"Federated search failed for all datasets: {failures}")
+    
+    reference_score = max(shard['max_score'] for shard in shards.values()) or 1.0
+    candidates = []
+    for dataset_id, shard in shards.items():
+        scale = reference_score / shard['max_score'] if shard['max_score'] else 1.0
+        shard['scale'] = scale
+        for result in shard['results']:
+            candidates.append({
+                **result,
+                'id': f"{dataset_id}:{result['id']}",  # Row IDs are only unique within a dataset
+                'dataset_id': dataset_id,
+                'raw_bm25_score': result['bm25_score'],
+                'bm25_score': round(result['bm25_score'] * scale, 3)
+            })
+    
+    sort_key = 'fusion_score' if hybrid else 'bm25_score'
+    merged = sorted(candidates, key=lambda candidate: candidate[sort_key], reverse=True)[:top_k]
+    selected = Counter(candidate['dataset_id'] for candidate in merged)
+    
+    federation_stats = {
+        'datasets': [
+            {
+                'dataset_id': dataset_id,
+                'dataset_version': shard['dataset'].version,
+                'records': len(shard['dataset'].records),
+                'candidates': len(shard['results']),
+                'selected': selected.get(dataset_id, 0),
+                'score_scale': round(shard['scale'], 3)
+            }
+            for dataset_id, shard in shards.items()
+        ],
+        'failed': failures,
+        'merged_by': sort_key
+    }
+    dense_stats = None
+    if hybrid:
+        dense_stats = {dataset_id: shard['dense_stats'] for dataset_id, shard in shards.items()}
+    logger.info("🔀 Merged %s candidates from %s datasets into top %s", len(candidates), len(shards), len(merged))
+    return [shard['dataset'] for shard in shards.values()], merged, federation_stats, dense_stats
+
+def run_speculative_search(query: str, dataset_id: str, file_blob, dedupe: bool) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Load the dataset and score the query with rule-based fallback criteria
+    """
+    from ai_agent import create_fallback_criteria, extract_hard_constraints
+    from bm25_search import prepare_bm25_search
+    from dataset_store import load_dataset
+    
+    dataset = load_dataset(dataset_id, get_storage_client(), file_blob)
+    criteria = create_fallback_criteria(query, extract_hard_constraints(query))
+    # Only clusters found at load time; finding them is left to the deadline-bounded search
+    duplicates = dataset.built_duplicate_clusters() if dedupe else None
+    return dataset, prepare_bm25_search(
+        dataset.records, criteria, dataset.index, field_index=dataset.get_field_index(), duplicates=duplicates
+    )
+
+def finish_speculative_search(
+    speculation: Future, criteria: Dict[str, Any], timeout: Optional[float] = None
+) -> Tuple[Any, Optional[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Adapt a speculative search to the final criteria
+
+    The hard constraint mask is reused when the constraints match, and only
+    query terms that changed are re-scored. Returns (dataset, search_state,
+    stats); dataset is None when the speculative search failed or did not
+    finish within ``timeout`` seconds.
+    """
+    from bm25_search import prepare_bm25_search
+    
+    wait_start = time.time()
+    try:
+        dataset, speculative_state = speculation.result(timeout=timeout)
+    except Exception as error:
+        logger.warning("⚠️ Speculative search failed, loading normally: %s", error)
+        status, dataset, search_state, speculative_state = 'failed', None, None, None
+    
+    if dataset is not None:
+        search_state = prepare_bm25_search(
+            dataset.records, criteria, dataset.index, speculative_state, field_index=dataset.get_field_index(),
+            duplicates=speculative_state['duplicates']
+        )
+        if search_state['mask_reused'] and not search_state['rescored_tokens']:
+            status = 'hit'
+        elif search_state['mask_reused'] or search_state['rescored_tokens'] < len(search_state['query_tokens']):
+            status = 'partial'
+        else:
+            status = 'miss'
+    
+    with _speculation_lock:
+        speculation_counts['attempts'] += 1
+        speculation_counts[{'hit': 'hits', 'partial': 'partial', 'miss': 'misses', 'failed': 'failures'}[status]] += 1
+        counts = dict(speculation_counts)
+    
+    stats = {
+        'status': status,
+        'wait_time': round(time.time() - wait_start, 3),
+        'mask_reused': bool(search_state and search_state['mask_reused']),
+        'rescored_terms': search_state['rescored_tokens'] if search_state else None,
+        'query_terms': len(search_state['query_tokens']) if search_state else None,
+        'hit_rate': round(counts['hits'] / counts['attempts'], 3),
+        'reuse_rate': round((counts['hits'] + counts['partial']) / counts['attempts'], 3),
+        'counts': counts
+    }
+    logger.info("🔮 Speculative search %s (%s of %s terms re-scored)", status, stats['rescored_terms'], stats['query_terms'])
+    return dataset, search_state, stats
 
 # Helper functions for enhanced logging
 def analyze_dataset_fields(sample_people: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -393,7 +1177,7 @@ def update_query_progress(query_id: str, stage: str, message: str, progress: int
     try:
         supabase = get_supabase_client()
         if not supabase:
-            print(f"🔍 Progress update skipped - Supabase not configured")
+            logger.debug("🔍 Progress update skipped - Supabase not configured")
             return
         
         # Determine status based on stage and completion
@@ -413,6 +1197,8 @@ def update_query_progress(query_id: str, stage: str, message: str, progress: int
         }
         
         # Add substep data if provided
+        if substep_data and COMPACT_RESULTS_ENABLED:
+            substep_data = slim_progress_data(substep_data)
         if substep_data:
             metadata['substep_data'] = substep_data
             
@@ -422,51 +1208,99 @@ def update_query_progress(query_id: str, stage: str, message: str, progress: int
             'updated_at': datetime.now().isoformat()
         }
         
-        print(f"🔄 Updating query {query_id} in Supabase: {stage} ({progress}%)")
-        print(f"📊 Metadata being stored: {metadata}")
+        logger.debug("🔄 Updating query %s in Supabase: %s (%s%%)", query_id, stage, progress)
+        logger.debug("📊 Metadata being stored: %s", LazyJson(metadata))
         
+        write_start = time.time()
         result = supabase.table('query_history').update(update_data).eq('id', query_id).execute()
+        metrics.observe('db_write_seconds', time.time() - write_start, operation='progress')
         
         if result.data:
-            print(f"✅ Progress update successful - {len(result.data)} rows updated")
-            print(f"🔍 Updated data: {result.data[0] if result.data else 'No data'}")
+            logger.debug("✅ Progress update successful - %s rows updated", len(result.data))
         else:
-            print(f"⚠️ No rows updated - query {query_id} may not exist")
-            print(f"🔍 Update data was: {update_data}")
+            logger.warning("⚠️ No rows updated - query %s may not exist", query_id)
+            logger.debug("🔍 Update data was: %s", LazyJson(update_data))
             
     except Exception as error:
-        print(f"⚠️ Progress update error: {str(error)}")
+        metrics.inc('db_write_errors_total', operation='progress')
+        logger.warning("⚠️ Progress update error: %s", error)
         # Don't fail the whole function for progress update errors
 
 def store_results(result_id: str, results: Dict[str, Any]) -> None:
-    """Store results for later retrieval (simple in-memory storage)"""
-    results_store[result_id] = results
-    # In production, use Redis or Firestore with TTL
+    """Store results for later retrieval (bounded in-memory storage with TTL)
+
+    Results too large for the store are replaced by a small stub that points
+    the caller to the 'results' stage, which reads them from query_history.
+    """
+    if not results_store.set(result_id, results):
+        logger.warning("⚠️ Results of %s too large for the results store - keeping a stub", result_id)
+        results_store.set(result_id, {'status': results.get('status'), 'resultsLocation': 'database'})
 
 def get_stored_results(result_id: str) -> Optional[Dict[str, Any]]:
-    """Get stored results by ID"""
-    return results_store.get(result_id)
+    """Get stored results by ID, from query_history when this instance has none"""
+    job = results_store.get(result_id)
+    if job is None:
+        job = load_query_status(result_id)
+    return job
+
+def load_query_status(query_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Status of a query as recorded in query_history
+
+    Polls can reach an instance that never ran the job (or restarted since);
+    the pipeline's progress updates in Supabase still tell its status.
+    Completed results are read through the 'results' stage.
+    """
+    supabase = get_supabase_client()
+    if not supabase:
+        return None
+    
+    try:
+        read_start = time.time()
+        result = supabase.table('query_history').select('status, metadata').eq('id', query_id).execute()
+        metrics.observe('db_read_seconds', time.time() - read_start, operation='status')
+    except Exception as error:
+        metrics.inc('db_read_errors_total', operation='status')
+        logger.warning("⚠️ Could not read status of query %s from database: %s", query_id, error)
+        return None
+    if not result.data:
+        return None
+    
+    row = result.data[0]
+    metadata = row.get('metadata') or {}
+    job = {'status': row.get('status'), 'source': 'database'}
+    for key in ('current_stage', 'stage_message', 'progress', 'last_update', 'error'):
+        if key in metadata:
+            job[key] = metadata[key]
+    if row.get('status') == 'completed':
+        job['resultsLocation'] = 'database'
+    return job
 
-def update_query_in_database(query_id: str, results: Dict[str, Any]) -> None:
+def update_query_in_database(query_id: str, results: Dict[str, Any], dataset_id: Optional[str] = None) -> None:
     """Update query status and results directly in Supabase database"""
     try:
         supabase = get_supabase_client()
         if not supabase:
-            print(f"🔍 Database update skipped - Supabase not configured")
+            logger.debug("🔍 Database update skipped - Supabase not configured")
             return
         
         # Prepare the update payload  
         if results.get('success'):
             # Map the cloud function response to the expected database format
             recommendations = results.get('recommendations', [])
+            metadata = results.get('metadata', {})
+            if COMPACT_RESULTS_ENABLED and dataset_id:
+                # Profiles are hydrated from the dataset on read (see load_query_results)
+                recommendations = compact_recommendations(recommendations)
+                metadata = compact_metadata(metadata, result_dataset_versions(metadata, dataset_id))
             
             update_data = {
                 'status': 'completed',
                 'results': recommendations,
-                'metadata': results.get('metadata', {}),
+                'metadata': metadata,
                 'updated_at': datetime.now().isoformat()
             }
-            print(f"🔄 Updating query {query_id} with {len(recommendations)} results")
+            logger.info("🔄 Updating query %s with %s results", query_id, len(recommendations))
         else:
             update_data = {
                 'status': 'error',
@@ -476,16 +1310,44 @@ def update_query_in_database(query_id: str, results: Dict[str, Any]) -> None:
                 },
                 'updated_at': datetime.now().isoformat()
             }
-            print(f"🔄 Updating query {query_id} with error status")
+            logger.info("🔄 Updating query %s with error status", query_id)
         
         # Update the database directly
+        write_start = time.time()
         result = supabase.table('query_history').update(update_data).eq('id', query_id).execute()
+        metrics.observe('db_write_seconds', time.time() - write_start, operation='results')
         
         if result.data:
-            print(f"✅ Successfully updated query {query_id} in database")
+            logger.info("✅ Successfully updated query %s in database", query_id)
         else:
-            print(f"⚠️ No rows updated - query {query_id} may not exist")
+            logger.warning("⚠️ No rows updated - query %s may not exist", query_id)
             
     except Exception as error:
-        print(f"❌ Database update error: {str(error)}")
+        metrics.inc('db_write_errors_total', operation='results')
+        logger.error("❌ Database update error: %s", error)
         # Don't re-raise - we don't want to fail the whole function for database issues
+
+def load_query_results(query_id: str) -> Optional[Dict[str, Any]]:
+    """Read a query's stored status and results, hydrating compact results with their profiles"""
+    from dataset_store import load_dataset
+    
+    supabase = get_supabase_client()
+    result = supabase.table('query_history').select('status, results, metadata').eq('id', query_id).execute()
+    if not result.data:
+        return None
+    
+    row = result.data[0]
+    recommendations = row.get('results') or []
+    metadata = row.get('metadata') or {}
+    hydration = None
+    if is_compact(metadata) and recommendations:
+        recommendations, hydration = hydrate_recommendations(
+            recommendations, metadata['result_datasets'], lambda dataset_id: load_dataset(dataset_id, get_storage_client())
+        )
+    
+    return {
+        'status': row.get('status'),
+        'recommendations': recommendations,
+        'metadata': metadata,
+        'hydration': hydration
+    }
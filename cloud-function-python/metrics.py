@@ -0,0 +1,190 @@
+"""
+In-process metrics registry
+
+This module handles:
+1. Counters and histograms with labels, updated where the work happens
+2. Collectors that modules owning state (caches, datasets, queues) register
+   to report current values when metrics are read
+3. Rendering everything as Prometheus text or JSON for the 'metrics' stage
+
+Metrics are per instance and reset when the instance is recycled. Reading
+them never touches GCS, the database or the OpenAI API.
+"""
+
+import time
+import threading
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Configuration
+METRIC_PREFIX = 'recommendations_'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# A collector returns (name, type, labels, value) samples; type is 'gauge' or 'counter'
+Sample = Tuple[str, str, Dict[str, Any], float]
+
+_counters: Dict[str, Dict[LabelKey, float]] = {}
+_histograms: Dict[str, Dict[LabelKey, 'Histogram']] = {}
+_collectors: List[Callable[[], List[Sample]]] = []
+_registry_lock = threading.Lock()
+_started_at = time.time()
+
+class Histogram:
+    """
+    Bucketed distribution of observed values
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def cumulative_counts(self) -> List[int]:
+        counts, running = [], 0
+        for count in self.counts:
+            running += count
+            counts.append(running)
+        return counts
+
+class StageTimer:
+    """
+    Records the time between consecutive laps as stage latencies
+    """
+
+    def __init__(self, start_time: Optional[float] = None):
+        self.start_time = start_time if start_time is not None else time.time()
+        self.last_lap = self.start_time
+
+    def lap(self, stage: str) -> float:
+        now = time.time()
+        elapsed = now - self.last_lap
+        self.last_lap = now
+        observe('search_stage_seconds', elapsed, stage=stage)
+        return elapsed
+
+    def total(self) -> float:
+        return time.time() - self.start_time
+
+def inc(name: str, amount: float = 1, **labels: Any) -> None:
+    """
+    Add to a counter
+    """
+    key = _label_key(labels)
+    with _registry_lock:
+        series = _counters.setdefault(name, {})
+        series[key] = series.get(key, 0) + amount
+
+def observe(name: str, value: float, buckets: Tuple[float, ...] = LATENCY_BUCKETS, **labels: Any) -> None:
+    """
+    Record a value in a histogram
+    """
+    key = _label_key(labels)
+    with _registry_lock:
+        series = _histograms.setdefault(name, {})
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram(buckets)
+        histogram.observe(value)
+
+def register_collector(collector: Callable[[], List[Sample]]) -> None:
+    """
+    Add a callback that reports current values whenever metrics are read
+    """
+    with _registry_lock:
+        _collectors.append(collector)
+
+def collect_samples() -> List[Sample]:
+    """
+    Samples of every registered collector; a failing collector is skipped
+    """
+    with _registry_lock:
+        collectors = list(_collectors)
+    samples = [('uptime_seconds', 'gauge', {}, round(time.time() - _started_at, 3))]
+    for collector in collectors:
+        try:
+            samples.extend(collector())
+        except Exception as error:
+            logger.warning("⚠️ Metrics collector %s failed: %s", getattr(collector, '__name__', collector), error)
+    return samples
+
+def get_metrics_snapshot() -> Dict[str, Any]:
+    """
+    All metrics as JSON-serializable data
+    """
+    with _registry_lock:
+        counters = {
+            name: [{'labels': dict(key), 'value': value} for key, value in series.items()]
+            for name, series in _counters.items()
+        }
+        histograms = {
+            name: [
+                {
+                    'labels': dict(key),
+                    'count': histogram.count,
+                    'sum': round(histogram.total, 6),
+                    'buckets': dict(zip([*map(str, histogram.buckets), '+Inf'], histogram.cumulative_counts()))
+                }
+                for key, histogram in series.items()
+            ]
+            for name, series in _histograms.items()
+        }
+
+    gauges: Dict[str, List[Dict[str, Any]]] = {}
+    for name, metric_type, labels, value in collect_samples():
+        target = counters if metric_type == 'counter' else gauges
+        target.setdefault(name, []).append({'labels': labels, 'value': value})
+
+    return {'counters': counters, 'gauges': gauges, 'histograms': histograms}
+
+def render_prometheus() -> str:
+    """
+    All metrics in the Prometheus text exposition format
+    """
+    lines = []
+    with _registry_lock:
+        for name, series in sorted(_counters.items()):
+            lines.append(f'# TYPE {METRIC_PREFIX}{name} counter')
+            lines.extend(_sample_line(name, dict(key), value) for key, value in series.items())
+        for name, series in sorted(_histograms.items()):
+            lines.append(f'# TYPE {METRIC_PREFIX}{name} histogram')
+            for key, histogram in series.items():
+                labels = dict(key)
+                bounds = [*(repr(float(bound)) for bound in histogram.buckets), '+Inf']
+                for bound, count in zip(bounds, histogram.cumulative_counts()):
+                    lines.append(_sample_line(f'{name}_bucket', {**labels, 'le': bound}, count))
+                lines.append(_sample_line(f'{name}_sum', labels, histogram.total))
+                lines.append(_sample_line(f'{name}_count', labels, histogram.count))
+
+    typed = set()
+    for name, metric_type, labels, value in sorted(collect_samples(), key=lambda sample: sample[0]):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f'# TYPE {METRIC_PREFIX}{name} {metric_type}')
+        lines.append(_sample_line(name, labels, value))
+    return '\n'.join(lines) + '\n'
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _sample_line(name: str, labels: Dict[str, Any], value: float) -> str:
+    if labels:
+        label_text = ','.join(
+            f'{label}="{_escape_label(str(label_value))}"' for label, label_value in sorted(labels.items())
+        )
+        return f'{METRIC_PREFIX}{name}{{{label_text}}} {float(value)!r}'
+    return f'{METRIC_PREFIX}{name} {float(value)!r}'
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
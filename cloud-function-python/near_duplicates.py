@@ -0,0 +1,272 @@
+"""
+Near-duplicate detection for datasets merged from several CRM exports
+
+This module handles:
+1. Exact matches on a normalized name + company key
+2. MinHash signatures of the profile text, bucketed with LSH so only likely
+   duplicates are compared
+3. Clustering matches and merging each cluster into one canonical record
+   that keeps track of which row every field came from
+
+Rows are not removed from the dataset or its index (row IDs, positions and
+appended-row updates stay intact). Instead every cluster is represented by
+its most complete row, and a mask keeps the other rows out of the search, so
+duplicates no longer take candidate and LLM slots. Representatives are
+filtered and scored on their canonical record, so fields merged in from other
+rows count for hard constraints and BM25 as well.
+"""
+
+import os
+import re
+import time
+import zlib
+import unicodedata
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from field_index import detect_constraint_columns
+from structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Configuration
+DEDUP_NUM_PERM = int(os.getenv('DEDUP_NUM_PERM', '64'))
+DEDUP_BANDS = int(os.getenv('DEDUP_BANDS', '16'))  # Rows per band = NUM_PERM / BANDS
+DEDUP_THRESHOLD = float(os.getenv('DEDUP_THRESHOLD', '0.8'))  # Estimated Jaccard of profile words
+DEDUP_TEXT_ONLY_THRESHOLD = float(os.getenv('DEDUP_TEXT_ONLY_THRESHOLD', '0.95'))  # When a row has no name
+DEDUP_MAX_BUCKET = int(os.getenv('DEDUP_MAX_BUCKET', '50'))  # Larger LSH buckets are templated rows, not duplicates
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+COMPANY_SUFFIXES = {'inc', 'incorporated', 'llc', 'ltd', 'limited', 'corp', 'corporation', 'co', 'company', 'gmbh', 'plc', 'ag', 'sa', 'bv', 'the'}
+
+# Universal hashing (a * x + b) mod p; the 64-bit product wraps around like in datasketch
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+_permutation_rng = np.random.default_rng(20240601)  # Fixed seed: signatures must be comparable across versions
+PERMUTATION_A = _permutation_rng.integers(1, (1 << 61) - 1, DEDUP_NUM_PERM, dtype=np.uint64)
+PERMUTATION_B = _permutation_rng.integers(0, (1 << 61) - 1, DEDUP_NUM_PERM, dtype=np.uint64)
+
+class DuplicateClusters:
+    """
+    Near-duplicate clusters of one dataset version
+    """
+
+    def __init__(self, row_count: int, signatures: np.ndarray):
+        self.row_count = row_count
+        self.signatures = signatures
+        self.canonical_mask = np.ones(row_count, dtype=bool)
+        self.clusters: Dict[int, List[int]] = {}  # Representative row -> member rows
+        self.canonical_records: Dict[int, Dict[str, Any]] = {}
+        self.merged_rows: List[int] = []  # Representatives whose canonical record has fields of other rows
+        self.canonical_tokens: Dict[int, List[str]] = {}  # BM25 tokens of those canonical records
+        self.provenance: Dict[int, Dict[str, Any]] = {}
+        self.stats: Dict[str, Any] = {}
+
+    def canonical_record(self, row: int, record: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Merged record for a cluster representative, else the row's own record
+        """
+        return self.canonical_records.get(row, record)
+
+def find_duplicate_clusters(
+    records: List[Dict[str, Any]],
+    row_ids: List[str],
+    previous_signatures: Optional[np.ndarray] = None
+) -> DuplicateClusters:
+    """
+    Cluster near-duplicate records and build their canonical records
+
+    ``previous_signatures`` are the MinHash signatures of a previous version
+    whose records are a prefix of ``records``; only appended rows are hashed.
+    """
+    start = time.time()
+    columns = detect_constraint_columns(records)
+    names = [name_tokens(record, columns['name']) for record in records]
+
+    reused = 0
+    if previous_signatures is not None and len(previous_signatures) <= len(records):
+        reused = len(previous_signatures)
+    signatures = np.empty((len(records), DEDUP_NUM_PERM), dtype=np.uint64)
+    signatures[:reused] = previous_signatures[:reused] if reused else 0
+    for row in range(reused, len(records)):
+        shingles = profile_shingles(records[row])
+        # Rows without text get values no hash can produce, unique per row
+        signatures[row] = minhash_signature(shingles) if shingles else MAX_HASH + np.uint64(row + 1)
+
+    parents = list(range(len(records)))
+    key_matches = union_by_key(records, names, columns['company'], parents)
+    lsh_matches = union_by_lsh(signatures, names, parents)
+
+    clusters = DuplicateClusters(len(records), signatures)
+    members_by_root: Dict[int, List[int]] = {}
+    for row in range(len(records)):
+        members_by_root.setdefault(find_root(parents, row), []).append(row)
+
+    for members in members_by_root.values():
+        if len(members) < 2:
+            continue
+        by_completeness = sorted(members, key=lambda row: (-len(records[row]), -record_length(records[row]), row))
+        representative = by_completeness[0]
+        merged, field_sources = merge_records([records[row] for row in by_completeness], [row_ids[row] for row in by_completeness])
+        clusters.clusters[representative] = members
+        clusters.canonical_records[representative] = merged
+        clusters.provenance[representative] = {
+            'canonical_id': row_ids[representative],
+            'row_ids': [row_ids[row] for row in members],
+            'merged_fields': field_sources
+        }
+        if field_sources:
+            clusters.merged_rows.append(representative)
+        clusters.canonical_mask[members] = False
+        clusters.canonical_mask[representative] = True
+
+    suppressed = len(records) - int(clusters.canonical_mask.sum())
+    clusters.stats = {
+        'clusters': len(clusters.clusters),
+        'rows_suppressed': suppressed,
+        'searchable_records': len(records) - suppressed,
+        'key_matches': key_matches,
+        'lsh_matches': lsh_matches,
+        'signatures_reused': reused,
+        'seconds': round(time.time() - start, 3)
+    }
+    logger.info(
+        "🧬 Found %s duplicate clusters: %s of %s rows collapsed (%.2fs)",
+        len(clusters.clusters), suppressed, len(records), clusters.stats['seconds']
+    )
+    return clusters
+
+def union_by_key(records: List[Dict[str, Any]], names: List[Tuple[str, ...]], company_columns: List[str], parents: List[int]) -> int:
+    """
+    Join rows with the same normalized name and company; returns matches made
+    """
+    first_by_key: Dict[Tuple[Tuple[str, ...], str], int] = {}
+    matches = 0
+    for row, record in enumerate(records):
+        company = normalize_company(' '.join(record[column] for column in company_columns if record.get(column)))
+        if not names[row] or not company:
+            continue
+        key = (tuple(sorted(set(names[row]))), company)
+        first = first_by_key.setdefault(key, row)
+        if first != row and union(parents, first, row):
+            matches += 1
+    return matches
+
+def union_by_lsh(signatures: np.ndarray, names: List[Tuple[str, ...]], parents: List[int]) -> int:
+    """
+    Join rows whose signatures collide in an LSH band and agree closely enough
+    """
+    rows_per_band = DEDUP_NUM_PERM // DEDUP_BANDS
+    matches = 0
+    for band in range(DEDUP_BANDS):
+        band_values = np.ascontiguousarray(signatures[:, band * rows_per_band:(band + 1) * rows_per_band])
+        keys = band_values.view(np.dtype((np.void, band_values.dtype.itemsize * rows_per_band))).ravel()
+        _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        order = np.argsort(inverse.ravel(), kind='stable')
+        starts = np.cumsum(counts) - counts
+        for bucket in np.nonzero((counts >= 2) & (counts <= DEDUP_MAX_BUCKET))[0].tolist():
+            rows = order[starts[bucket]:starts[bucket] + counts[bucket]]
+            bucket_signatures = signatures[rows]
+            similarity = (bucket_signatures[:, None, :] == bucket_signatures[None, :, :]).mean(axis=2)
+            for first, second in zip(*np.nonzero(np.triu(similarity >= DEDUP_THRESHOLD, k=1))):
+                first_row, second_row = int(rows[first]), int(rows[second])
+                if find_root(parents, first_row) == find_root(parents, second_row):
+                    continue
+                if is_near_duplicate(similarity[first, second], names[first_row], names[second_row]):
+                    matches += union(parents, first_row, second_row)
+    return matches
+
+def is_near_duplicate(similarity: float, first_name: Tuple[str, ...], second_name: Tuple[str, ...]) -> bool:
+    """
+    Similar enough profile text, and names that could belong to the same person
+    """
+    if not first_name or not second_name:
+        return similarity >= DEDUP_TEXT_ONLY_THRESHOLD
+    return similarity >= DEDUP_THRESHOLD and names_compatible(first_name, second_name)
+
+def names_compatible(first: Tuple[str, ...], second: Tuple[str, ...]) -> bool:
+    """
+    Every token of the shorter name matches the other name, allowing
+    abbreviated words (jon / jonathan) but not numbers
+    """
+    shorter, longer = sorted((set(first), set(second)), key=len)
+    if not any(token.isalpha() for token in shorter):
+        return False
+    return all(
+        any(
+            token == other or (token.isalpha() and other.isalpha() and (other.startswith(token) or token.startswith(other)))
+            for other in longer
+        )
+        for token in shorter
+    )
+
+def name_tokens(record: Dict[str, Any], name_columns: List[str]) -> Tuple[str, ...]:
+    """
+    Normalized name tokens without initials, in order of appearance
+    """
+    text = normalize_text(' '.join(record[column] for column in name_columns if record.get(column)))
+    return tuple(dict.fromkeys(token for token in TOKEN_PATTERN.findall(text) if len(token) > 1 or token.isdigit()))
+
+def normalize_company(company: str) -> str:
+    tokens = TOKEN_PATTERN.findall(normalize_text(company))
+    return ' '.join(token for token in tokens if token not in COMPANY_SUFFIXES)
+
+def normalize_text(text: str) -> str:
+    """
+    Lowercase ASCII text, with accents folded (José -> jose)
+    """
+    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii').lower()
+
+def profile_shingles(record: Dict[str, Any]) -> List[str]:
+    """
+    Words of a record's values
+
+    CRM rows are short, so single words rather than word n-grams: a missing
+    field or a reworded phrase would change most n-grams of a short row.
+    """
+    return TOKEN_PATTERN.findall(normalize_text(' '.join(str(value) for value in record.values())))
+
+def minhash_signature(shingles: List[str]) -> np.ndarray:
+    """
+    MinHash signature over DEDUP_NUM_PERM universal hash permutations
+    """
+    hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in set(shingles)), dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        permuted = (PERMUTATION_A[:, None] * hashes[None, :] + PERMUTATION_B[:, None]) % MERSENNE_PRIME
+    return (permuted & MAX_HASH).min(axis=1)
+
+def merge_records(records: List[Dict[str, Any]], row_ids: List[str]) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """
+    Fill the first record's missing fields from the others, in order
+
+    Returns the merged record and, for every field taken from another row,
+    that row's ID.
+    """
+    merged = dict(records[0])
+    field_sources = {}
+    for record, row_id in zip(records[1:], row_ids[1:]):
+        for field, value in record.items():
+            if field not in merged:
+                merged[field] = value
+                field_sources[field] = row_id
+    return merged, field_sources
+
+def record_length(record: Dict[str, Any]) -> int:
+    return sum(len(str(value)) for value in record.values())
+
+def find_root(parents: List[int], row: int) -> int:
+    while parents[row] != row:
+        parents[row] = parents[parents[row]]
+        row = parents[row]
+    return row
+
+def union(parents: List[int], first: int, second: int) -> bool:
+    """
+    Join two rows' clusters; False when they already were one
+    """
+    first_root, second_root = find_root(parents, first), find_root(parents, second)
+    if first_root == second_root:
+        return False
+    parents[max(first_root, second_root)] = min(first_root, second_root)
+    return True
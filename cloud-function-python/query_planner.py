@@ -0,0 +1,212 @@
+"""
+Deterministic query planner for simple searches
+
+This module decides whether a query needs the criteria LLM at all:
+1. Classifying queries as simple role/company/location/name lookups
+2. Building the full criteria structure locally for simple queries
+3. Escalating ambiguous or contextual queries to the LLM with a confidence score
+
+Only queries whose every content term is a role, company, location or name
+take the rules path; relative clauses, time and event words, "<role> of
+<Entity>" relations and leftover terms all go to the LLM.
+"""
+
+import os
+import re
+from typing import Dict, List, Any, Optional
+
+from ai_agent import extract_hard_constraints, create_fallback_criteria
+from structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Configuration
+QUERY_PLANNER_ENABLED = os.getenv('QUERY_PLANNER', 'false').lower() == 'true'  # Off until calibrated on real queries
+MIN_RULES_CONFIDENCE = float(os.getenv('QUERY_PLANNER_MIN_CONFIDENCE', '0.75'))
+MAX_SIMPLE_TERMS = 6
+
+# Patterns compiled once at import
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#&.'-]*")
+LOCATION_PHRASE_PATTERN = re.compile(r"\b(?:in|near|around|based in|located in)\s+([A-Z][\w.'-]*(?:\s+[A-Z][\w.'-]*)*)")
+COMPANY_PHRASE_PATTERN = re.compile(r"\b(?:at|works at|worked at|ex|formerly at)[\s-]+([A-Z][\w&.'-]*(?:\s+[A-Z][\w&.'-]*)*)")
+FROM_PHRASE_PATTERN = re.compile(r"\bfrom\s+([A-Z][\w&.'-]*(?:\s+[A-Z][\w&.'-]*)*)")
+OF_ENTITY_PATTERN = re.compile(r"\bof\s+([A-Z][\w&.'-]*(?:\s+[A-Z][\w&.'-]*)*)")
+
+STOPWORDS = {
+    'a', 'an', 'the', 'and', 'or', 'of', 'in', 'at', 'on', 'to', 'for', 'with', 'from', 'by',
+    'near', 'around', 'based', 'located', 'who', 'that', 'are', 'is', 'me', 'my', 'i', 'we',
+    'find', 'show', 'list', 'get', 'search', 'people', 'person', 'someone', 'anyone', 'all',
+    'any', 'some', 'works', 'worked', 'working', 'currently', 'ex', 'formerly', 'named', 'called'
+}
+
+# Words that carry intent or context the rules can't translate faithfully
+CONTEXTUAL_TERMS = {
+    'cool', 'interesting', 'good', 'great', 'best', 'top', 'strong', 'smart', 'like', 'similar',
+    'help', 'helpful', 'intro', 'introduce', 'introduction', 'advice', 'mentor', 'abroad',
+    'international', 'diverse', 'experienced', 'senior', 'junior', 'potential', 'might', 'could',
+    'would', 'should', 'fit', 'relevant', 'why', 'how', 'what', 'which', 'passionate', 'creative',
+    'impact', 'connect', 'warm', 'because', 'ideal', 'perfect'
+}
+
+NEGATION_TERMS = {'not', 'no', 'except', 'without', 'excluding', 'exclude', 'but'}
+
+# Relative pronouns start a clause about the person ("who raised", "that worked at")
+RELATIVE_TERMS = {'who', 'whom', 'whose', 'that', 'which', 'where', 'when'}
+
+# Time and event words turn a lookup into a history question ("ex-Google", "now runs")
+TEMPORAL_TERMS = {
+    'now', 'worked', 'ex', 'former', 'formerly', 'previously', 'previous', 'past', 'used', 'was', 'were',
+    'recently', 'before', 'after', 'since', 'until', 'ago', 'anymore', 'raised', 'founded', 'started',
+    'joined', 'left', 'sold', 'exited', 'acquired'
+}
+
+ROLE_TERMS = {
+    'founder', 'founders', 'cofounder', 'co-founder', 'ceo', 'cto', 'cfo', 'coo', 'cmo', 'vp',
+    'director', 'engineer', 'engineers', 'developer', 'developers', 'designer', 'designers',
+    'investor', 'investors', 'partner', 'partners', 'principal', 'associate', 'analyst',
+    'advisor', 'recruiter', 'manager', 'scientist', 'researcher', 'professor', 'student', 'angel', 'vc'
+}
+
+NEUTRAL_ANSWERS = {'', 'other', 'any', 'none', 'no preference', 'not sure', 'n/a'}
+
+def plan_query(query: str, follow_up_answers: Optional[Dict] = None) -> Dict[str, Any]:
+    """
+    Classify a query and build criteria locally when it is a simple lookup
+
+    Returns a plan with 'path' ('rules' or 'llm'), 'confidence', 'query_type',
+    'signals' and, for the rules path, the generated 'criteria'.
+    """
+    query_lower = query.lower()
+    hard_constraints = extract_hard_constraints(query)
+    tokens = TOKEN_PATTERN.findall(query_lower)
+    content_terms = list(dict.fromkeys(t for t in tokens if t not in STOPWORDS and len(t) > 1))
+
+    locations = [m.strip() for m in LOCATION_PHRASE_PATTERN.findall(query)]
+    companies = [m.strip() for m in COMPANY_PHRASE_PATTERN.findall(query)]
+    ambiguous_entities = [m.strip() for m in FROM_PHRASE_PATTERN.findall(query)]
+    related_entities = [m.strip() for m in OF_ENTITY_PATTERN.findall(query)]
+    roles = [t for t in content_terms if t in ROLE_TERMS]
+
+    # Every content term must be a role or part of a name, company or location
+    classified = set(roles)
+    for phrase in hard_constraints.get('nameMatches', []) + locations + companies + ambiguous_entities:
+        classified.update(TOKEN_PATTERN.findall(phrase.lower()))
+    unclassified = [t for t in content_terms if t not in classified]
+
+    confidence = 1.0
+    signals = []
+    blocking = []  # Signals that always need the LLM, whatever the threshold
+
+    if not content_terms:
+        confidence = 0.0
+        signals.append('no_content_terms')
+
+    contextual = [t for t in tokens if t in CONTEXTUAL_TERMS]
+    if contextual:
+        confidence -= 0.3 * len(contextual)
+        signals.append(f"contextual_terms:{','.join(contextual)}")
+
+    if any(t in NEGATION_TERMS for t in tokens):
+        confidence -= 0.3
+        signals.append('negation')
+
+    if '?' in query:
+        confidence -= 0.3
+        signals.append('question')
+
+    if any(t in RELATIVE_TERMS for t in tokens):
+        confidence -= 0.3
+        blocking.append('relative_clause')
+
+    temporal = [t for t in tokens if t.split('-', 1)[0] in TEMPORAL_TERMS]  # Also "ex-google"
+    if temporal:
+        confidence -= 0.3 * len(temporal)
+        blocking.append(f"temporal_terms:{','.join(temporal)}")
+
+    if related_entities:
+        confidence -= 0.3
+        blocking.append(f"entity_relation:{','.join(related_entities)}")
+
+    if unclassified:
+        confidence -= 0.3 * len(unclassified)
+        blocking.append(f"unclassified_terms:{','.join(unclassified)}")
+
+    if len(content_terms) > MAX_SIMPLE_TERMS:
+        confidence -= 0.1 * (len(content_terms) - MAX_SIMPLE_TERMS)
+        signals.append('long_query')
+
+    meaningful_answers = [
+        answer for answer in (follow_up_answers or {}).values()
+        if str(answer).strip().lower() not in NEUTRAL_ANSWERS
+    ]
+    if meaningful_answers:
+        confidence -= 0.4
+        signals.append('follow_up_answers')
+
+    confidence = round(max(0.0, min(1.0, confidence)), 2)
+    signals.extend(blocking)
+
+    if hard_constraints.get('nameMatches'):
+        query_type = 'name_lookup'
+    elif companies:
+        query_type = 'company_lookup'
+    elif locations:
+        query_type = 'location_lookup'
+    elif roles:
+        query_type = 'role_lookup'
+    else:
+        query_type = 'keyword_lookup'
+
+    plan = {
+        'path': 'rules' if confidence >= MIN_RULES_CONFIDENCE and not blocking else 'llm',
+        'confidence': confidence,
+        'query_type': query_type,
+        'signals': signals
+    }
+
+    if plan['path'] == 'rules':
+        plan['criteria'] = build_rule_criteria(query, hard_constraints, content_terms, roles, locations, companies, ambiguous_entities)
+
+    logger.info("🧭 Query plan: %s (%s, confidence %s)", plan['path'], query_type, confidence)
+    return plan
+
+def build_rule_criteria(
+    query: str,
+    hard_constraints: Dict[str, List[str]],
+    content_terms: List[str],
+    roles: List[str],
+    locations: List[str],
+    companies: List[str],
+    ambiguous_entities: List[str]
+) -> Dict[str, Any]:
+    """
+    Build the full criteria structure for a simple query without an LLM
+    """
+    criteria = create_fallback_criteria(query, hard_constraints)
+
+    keyword_search = criteria['textualCriteria']['keywordSearch']
+    keyword_search['preferred'] = list(dict.fromkeys(
+        [term for term in keyword_search['preferred'] if term not in STOPWORDS] + content_terms
+    ))
+
+    field_search = criteria['textualCriteria']['fieldSpecificSearch']
+    if roles:
+        field_search['roles'] = list(dict.fromkeys(field_search.get('roles', []) + roles))
+
+    # Explicit "in X" / "at X" entities are requirements, like the LLM's hard constraints
+    requirements = criteria['hardConstraints']
+    for key, entities in (('locationRequirements', locations), ('companyRequirements', companies)):
+        known = {value.lower() for value in requirements.get(key, [])}
+        added = [entity for entity in dict.fromkeys(entities) if entity.lower() not in known]
+        if added:
+            requirements[key] = requirements.get(key, []) + added
+
+    # "from X" can be either a place or an employer - search both fields softly
+    location_terms = [term.lower() for term in locations + ambiguous_entities]
+    company_terms = [term.lower() for term in companies + ambiguous_entities]
+    if location_terms:
+        field_search['locations'] = list(dict.fromkeys(location_terms))
+    if company_terms:
+        field_search['companies'] = list(dict.fromkeys(company_terms))
+
+    return criteria
@@ -0,0 +1,101 @@
+"""
+Cheap local reranking between BM25 search and LLM refinement
+
+This module decides how many BM25 candidates actually need LLM analysis:
+1. Combining normalized BM25 score, field-match coverage and keyword coverage
+2. Cutting the list at the first large score gap past the requested limit
+3. Never sending fewer candidates than needed to fill the limit confidently
+"""
+
+import os
+import json
+import math
+from typing import List, Dict, Any, Tuple
+
+from structured_logging import get_logger
+from term_matcher import get_criteria_matcher
+
+logger = get_logger(__name__)
+
+# Configuration
+RERANK_ENABLED = os.getenv('PRE_LLM_RERANK', 'false').lower() == 'true'
+RERANK_MIN_FACTOR = float(os.getenv('RERANK_MIN_FACTOR', '1.5'))  # Always keep limit * factor
+RERANK_MAX_FACTOR = float(os.getenv('RERANK_MAX_FACTOR', '3.0'))  # Never keep more than limit * factor
+RERANK_GAP_RATIO = float(os.getenv('RERANK_GAP_RATIO', '0.25'))   # Relative drop that counts as a cliff
+RERANK_FLOOR_RATIO = float(os.getenv('RERANK_FLOOR_RATIO', '0.3'))  # Drop anything below top * ratio
+
+# Weights of the local rerank score components
+BM25_WEIGHT = 0.6
+FIELD_COVERAGE_WEIGHT = 0.25
+KEYWORD_COVERAGE_WEIGHT = 0.15
+
+def rerank_candidates(
+    bm25_results: List[Dict[str, Any]],
+    criteria: Dict[str, Any],
+    limit: int
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Rerank BM25 candidates locally and keep only those worth LLM analysis
+    """
+    if not bm25_results:
+        return [], {'input_candidates': 0, 'selected_candidates': 0, 'cutoff_reason': 'empty'}
+
+    textual_criteria = criteria.get('textualCriteria', {})
+    keyword_search = textual_criteria.get('keywordSearch', {})
+    field_types = [
+        field_type for field_type, terms in textual_criteria.get('fieldSpecificSearch', {}).items()
+        if isinstance(terms, list) and terms
+    ]
+    keywords = [
+        term.lower() for term in
+        keyword_search.get('required', []) + keyword_search.get('preferred', []) + keyword_search.get('phrases', [])
+        if term
+    ]
+
+    max_bm25 = max(candidate['bm25_score'] for candidate in bm25_results) or 1.0
+    matcher = get_criteria_matcher(criteria)
+
+    for candidate in bm25_results:
+        bm25_component = candidate['bm25_score'] / max_bm25
+        field_coverage = (
+            len([f for f in field_types if f in candidate.get('field_matches', {})]) / len(field_types)
+            if field_types else 0.0
+        )
+        keyword_coverage = 0.0
+        if keywords:
+            hits = matcher.find_terms(json.dumps(candidate['data']).lower())
+            keyword_coverage = sum(1 for keyword in keywords if keyword in hits) / len(keywords)
+
+        candidate['rerank_score'] = round(
+            BM25_WEIGHT * bm25_component +
+            FIELD_COVERAGE_WEIGHT * field_coverage +
+            KEYWORD_COVERAGE_WEIGHT * keyword_coverage,
+            4
+        )
+
+    ranked = sorted(bm25_results, key=lambda c: c['rerank_score'], reverse=True)
+    scores = [candidate['rerank_score'] for candidate in ranked]
+
+    min_keep = min(len(ranked), max(limit, math.ceil(limit * RERANK_MIN_FACTOR)))
+    max_keep = min(len(ranked), max(min_keep, math.ceil(limit * RERANK_MAX_FACTOR)))
+    cutoff = max_keep
+    cutoff_reason = 'max_candidates' if max_keep < len(ranked) else 'all_candidates'
+
+    for i in range(min_keep, max_keep):
+        if scores[i] < scores[0] * RERANK_FLOOR_RATIO:
+            cutoff, cutoff_reason = i, 'score_floor'
+            break
+        if scores[i] < scores[i - 1] * (1 - RERANK_GAP_RATIO):
+            cutoff, cutoff_reason = i, 'score_gap'
+            break
+
+    selected = ranked[:cutoff]
+    stats = {
+        'input_candidates': len(bm25_results),
+        'selected_candidates': len(selected),
+        'cutoff_reason': cutoff_reason,
+        'cutoff_score': scores[cutoff - 1] if cutoff else None
+    }
+
+    logger.info("🎯 Reranker kept %s/%s candidates for LLM analysis (%s)", len(selected), len(bm25_results), cutoff_reason)
+    return selected, stats
@@ -0,0 +1,291 @@
+"""
+Bounded result cache for search responses
+
+This module handles:
+1. Canonical cache keys from dataset version, criteria, limit and topK, and
+   query keys that let a repeated search skip criteria generation
+2. An in-process LRU store with TTL, entry and byte limits
+3. An optional SQLite tier that survives process restarts
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+from structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Configuration
+RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE', 'true').lower() == 'true'
+RESULT_CACHE_BACKEND = os.getenv('RESULT_CACHE_BACKEND', 'memory')  # 'memory' or 'sqlite'
+RESULT_CACHE_PATH = os.getenv('RESULT_CACHE_PATH', '/tmp/snowball_result_cache.sqlite3')
+RESULT_CACHE_TTL_SECONDS = float(os.getenv('RESULT_CACHE_TTL_SECONDS', '3600'))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv('RESULT_CACHE_MAX_ENTRIES', '256'))
+RESULT_CACHE_MAX_BYTES = int(os.getenv('RESULT_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+
+class MemoryCache:
+    """
+    Thread-safe LRU cache with TTL and memory accounting
+
+    Entry size is measured as the length of the JSON encoding of the value.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: 'OrderedDict[str, Tuple[float, int, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, _, value = entry
+            if expires_at < time.time():
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, size: Optional[int] = None, ttl_seconds: Optional[float] = None) -> bool:
+        """
+        Store a value; returns False when it exceeds the byte limit
+
+        A value too large to store still drops the key's previous value,
+        which would otherwise be served in place of the newer one.
+        """
+        if size is None:
+            size = len(json.dumps(value, default=str))
+
+        expires_at = time.time() + (ttl_seconds if ttl_seconds is not None else self.ttl_seconds)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                return False
+
+            self._entries[key] = (expires_at, size, value)
+            self.total_bytes += size
+            self._evict()
+        return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'entries': len(self._entries),
+                'bytes': self.total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self.total_bytes -= size
+
+    def _evict(self) -> None:
+        now = time.time()
+        for key in [k for k, (expires_at, _, _) in self._entries.items() if expires_at < now]:
+            self._remove(key)
+            self.evictions += 1
+
+        while self._entries and (len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes):
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+
+class SQLiteCache:
+    """
+    Persistent cache tier in a local SQLite file with the same limits
+    """
+
+    def __init__(self, path: str, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, '
+            'expires_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, expires_at FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+                self._conn.commit()
+                return None
+
+            self._conn.execute('UPDATE cache SET accessed_at = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+            return json.loads(row[0])
+
+    def set(self, key: str, value: Any, size: Optional[int] = None, ttl_seconds: Optional[float] = None) -> bool:
+        payload = json.dumps(value, default=str)
+        if len(payload) > self.max_bytes:
+            self.delete(key)  # Never serve the previous value instead
+            return False
+
+        now = time.time()
+        expires_at = now + (ttl_seconds if ttl_seconds is not None else self.ttl_seconds)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO cache (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)',
+                (key, payload, len(payload), expires_at, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+        return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, total_bytes = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache').fetchone()
+        return {'backend': 'sqlite', 'path': self.path, 'entries': entries, 'bytes': total_bytes}
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute('DELETE FROM cache WHERE expires_at < ?', (now,))
+        entries, total_bytes = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache').fetchone()
+
+        # Drop least recently accessed entries until both limits hold
+        for key, size in self._conn.execute('SELECT key, size FROM cache ORDER BY accessed_at').fetchall():
+            if entries <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            self._conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+            entries -= 1
+            total_bytes -= size
+
+class TieredCache:
+    """
+    In-process cache backed by an optional persistent tier
+    """
+
+    def __init__(self, memory: MemoryCache, persistent: Optional[SQLiteCache] = None):
+        self.memory = memory
+        self.persistent = persistent
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is None and self.persistent is not None:
+            value = self.persistent.get(key)
+            if value is not None:
+                self.memory.set(key, value)  # Promote to the fast tier
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        size = len(json.dumps(value, default=str))
+        self.memory.set(key, value, size)
+        if self.persistent is not None:
+            self.persistent.set(key, value, size)
+
+    def delete(self, key: str) -> None:
+        self.memory.delete(key)
+        if self.persistent is not None:
+            self.persistent.delete(key)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {'memory': self.memory.stats()}
+        if self.persistent is not None:
+            stats['persistent'] = self.persistent.stats()
+        return stats
+
+def create_result_cache() -> TieredCache:
+    """
+    Build the result cache from environment configuration
+    """
+    memory = MemoryCache(RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL_SECONDS)
+    persistent = None
+    if RESULT_CACHE_BACKEND == 'sqlite':
+        try:
+            persistent = SQLiteCache(RESULT_CACHE_PATH, RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL_SECONDS)
+        except Exception as error:
+            logger.warning("⚠️ SQLite result cache unavailable, using memory only: %s", error)
+    return TieredCache(memory, persistent)
+
+def make_result_cache_key(
+    dataset_version: str,
+    criteria: Dict[str, Any],
+    limit: int,
+    top_k: int,
+    options: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    Build a cache key from the dataset version and canonicalized criteria
+
+    ``options`` holds pipeline switches that change the result set (e.g. rerank).
+    """
+    canonical = json.dumps(
+        {'criteria': criteria, 'options': options or {}},
+        sort_keys=True, separators=(',', ':'), default=str
+    )
+    criteria_hash = hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+    return f"{dataset_version}|{criteria_hash}|{limit}|{top_k}"
+
+def make_query_cache_key(
+    dataset_version: str,
+    query: str,
+    follow_up_answers: Optional[Dict[str, Any]],
+    dataset_schema: Optional[Dict[str, Any]],
+    limit: int,
+    top_k: int,
+    options: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    Build a cache key from everything criteria generation depends on
+
+    Known before any LLM call, so a repeated search is answered without one.
+    The entry stored under it points to the criteria key of the results,
+    which is also hit by differently worded queries with the same criteria.
+    """
+    canonical = json.dumps(
+        {
+            'query': normalize_query(query),
+            'follow_up_answers': follow_up_answers or {},
+            'schema': dataset_schema or {},
+            'options': options or {}
+        },
+        sort_keys=True, separators=(',', ':'), default=str
+    )
+    query_hash = hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+    return f"{dataset_version}|query:{query_hash}|{limit}|{top_k}"
+
+def normalize_query(query: str) -> str:
+    return re.sub(r'\s+', ' ', query).strip().lower()
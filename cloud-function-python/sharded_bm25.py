@@ -0,0 +1,339 @@
+"""
+Process-pool sharded BM25 scoring for large corpora
+
+This module handles:
+1. Flattening an index's postings into arrays in shared memory, once per
+   index snapshot
+2. Scoring document-range shards of a query in worker processes
+3. Merging each shard's partial top-k into the global candidate order
+
+Shards compute exactly the same floating point expression as
+BM25Index.get_scores, so scores and their order are identical to the
+single-threaded path. Small corpora and single-core instances keep using
+the in-thread path, where process overhead would dominate, and so do
+instances without the memory for a second copy of the postings.
+"""
+
+import os
+import threading
+import weakref
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+from typing import List, Dict, Any, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+from structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+if TYPE_CHECKING:
+    from bm25_search import BM25Index
+
+def available_cpus() -> int:
+    """
+    CPUs this process may run on (the instance's vCPUs, not the host's)
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+# Configuration
+SHARD_WORKERS = int(os.getenv('BM25_SHARD_WORKERS', '0')) or available_cpus()
+SHARD_MIN_DOCS = int(os.getenv('BM25_SHARD_MIN_DOCS', '200000'))  # Smaller corpora are scored in-thread
+SHARD_TOP_K = int(os.getenv('BM25_SHARD_TOP_K', '1000'))  # Candidates each shard returns
+SHARD_MEMORY_HEADROOM = float(os.getenv('BM25_SHARD_MEMORY_HEADROOM', '2.0'))  # Free memory needed per shared byte
+
+# Shared postings blocks a worker keeps mapped, least recently used first
+MAX_ATTACHED_LAYOUTS = 4
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_scorers: 'weakref.WeakKeyDictionary[BM25Index, ShardedScorer]' = weakref.WeakKeyDictionary()
+_scorers_lock = threading.Lock()
+_memory_rejections: 'weakref.WeakKeyDictionary[BM25Index, int]' = weakref.WeakKeyDictionary()  # Index -> doc count
+
+# Per worker process: shared memory blocks attached by name
+_attached: 'OrderedDict[str, Tuple[shared_memory.SharedMemory, np.ndarray]]' = OrderedDict()
+
+class ShardedScorer:
+    """
+    Shared-memory postings of one BM25 index snapshot
+
+    The blocks are unlinked once the scorer was replaced by a newer snapshot
+    (or garbage collected) and no score() is reading them anymore.
+    """
+
+    def __init__(self, index: 'BM25Index'):
+        with index._lock:
+            if index._idf is None:
+                index._idf = index._compute_idf()
+            self.doc_count = index.doc_count
+            self.k1, self.b, self.avgdl = index.k1, index.b, index.avgdl
+            self.idf = dict(index._idf)
+
+            # CSR layout: one contiguous slice of doc IDs and frequencies per term,
+            # in ascending doc ID order (documents are only ever appended)
+            posting_count = sum(len(docs) for docs in index.postings.values())
+            self.term_slices: Dict[str, Tuple[int, int]] = {}
+            doc_ids_block, doc_ids = _create_block(np.int32, posting_count)
+            frequencies_block, frequencies = _create_block(np.int32, posting_count)
+            doc_lengths_block, doc_lengths = _create_block(np.float64, self.doc_count)
+            offset = 0
+            for term, docs in index.postings.items():
+                end = offset + len(docs)
+                doc_ids[offset:end] = np.fromiter(docs.keys(), dtype=np.int32, count=len(docs))
+                frequencies[offset:end] = np.fromiter(docs.values(), dtype=np.int32, count=len(docs))
+                self.term_slices[term] = (offset, end)
+                offset = end
+            doc_lengths[:] = index.doc_lengths
+            del doc_ids, frequencies, doc_lengths  # Blocks can only be closed without live views
+
+        self.layout = {
+            'doc_ids': (doc_ids_block.name, posting_count),
+            'frequencies': (frequencies_block.name, posting_count),
+            'doc_lengths': (doc_lengths_block.name, self.doc_count)
+        }
+        self._in_flight = 0
+        self._retired = False
+        self._state_lock = threading.Lock()
+        self._release = weakref.finalize(self, _release_blocks, [doc_ids_block, frequencies_block, doc_lengths_block])
+        logger.info("🧩 Shared %s postings of %s documents for sharded scoring", f"{posting_count:,}", f"{self.doc_count:,}")
+
+    def score(
+        self,
+        query_tokens: List[str],
+        row_count: int,
+        candidate_mask: Optional[np.ndarray],
+        threshold: float,
+        top_k: int = SHARD_TOP_K
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        BM25 scores of the first row_count documents and the top eligible rows
+
+        Eligible rows pass the mask and score at least ``threshold``. They are
+        ordered like a stable descending sort of all eligible rows.
+        """
+        term_specs = [
+            (*self.term_slices[term], self.idf[term]) for term in query_tokens if term in self.term_slices
+        ]
+        with self._state_lock:
+            if self._retired:
+                raise RuntimeError('Sharded postings snapshot was replaced')
+            self._in_flight += 1
+        output, (scores, mask) = _create_output_block(row_count)
+        futures = []
+        try:
+            mask[:] = candidate_mask[:row_count] if candidate_mask is not None else True
+            bounds = np.linspace(0, row_count, min(SHARD_WORKERS, max(row_count, 1)) + 1).astype(np.int64)
+            pool = get_pool()
+            for start, end in zip(bounds[:-1], bounds[1:]):
+                if end > start:
+                    futures.append(pool.submit(
+                        score_shard, self.layout, output.name, row_count, int(start), int(end),
+                        term_specs, self.k1, self.b, self.avgdl, threshold, top_k
+                    ))
+            partials = [future.result() for future in futures]
+            result_scores = scores.copy()
+        finally:
+            wait(futures)  # Shards still running after a failure read the blocks too
+            del scores, mask
+            output.close()
+            output.unlink()
+            self._finish_score()
+
+        return result_scores, merge_top_k(partials, top_k)
+
+    def retire(self) -> None:
+        """
+        Unlink the shared blocks once the scores in flight are done
+        """
+        with self._state_lock:
+            self._retired = True
+            release = self._in_flight == 0
+        if release:
+            self._release()
+
+    def _finish_score(self) -> None:
+        with self._state_lock:
+            self._in_flight -= 1
+            release = self._retired and self._in_flight == 0
+        if release:
+            self._release()
+
+def merge_top_k(partials: List[Tuple[np.ndarray, np.ndarray]], top_k: int) -> np.ndarray:
+    """
+    Merge per-shard candidates into the global order, ties by row
+    """
+    if not partials:
+        return np.array([], dtype=np.int64)
+    rows = np.concatenate([rows for rows, _ in partials])
+    scores = np.concatenate([scores for _, scores in partials])
+    order = np.lexsort((rows, -scores))[:top_k]
+    return rows[order]
+
+def score_shard(
+    layout: Dict[str, Tuple[str, int]],
+    output_name: str,
+    row_count: int,
+    start: int,
+    end: int,
+    term_specs: List[Tuple[int, int, float]],
+    k1: float,
+    b: float,
+    avgdl: float,
+    threshold: float,
+    top_k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Score documents [start, end) in a worker and return its top eligible rows
+    """
+    doc_ids = _attach(*layout['doc_ids'], np.int32)
+    frequencies = _attach(*layout['frequencies'], np.int32)
+    doc_lengths = _attach(*layout['doc_lengths'], np.float64)
+
+    scores = np.zeros(end - start)
+    for offset, term_end, idf in term_specs:
+        term_doc_ids = doc_ids[offset:term_end]
+        first, last = np.searchsorted(term_doc_ids, [start, end])
+        if first == last:
+            continue
+        shard_doc_ids = term_doc_ids[first:last]
+        term_frequencies = frequencies[offset + first:offset + last].astype(np.float64)
+        shard_doc_lengths = doc_lengths[shard_doc_ids]
+        scores[shard_doc_ids - start] += idf * (
+            term_frequencies * (k1 + 1) /
+            (term_frequencies + k1 * (1 - b + b * shard_doc_lengths / avgdl))
+        )
+
+    output = shared_memory.SharedMemory(name=output_name)
+    try:
+        output_scores, output_mask = _output_views(output, row_count)
+        output_scores[start:end] = scores
+        eligible = np.nonzero((scores >= threshold) & output_mask[start:end])[0]
+        del output_scores, output_mask
+    finally:
+        output.close()
+
+    if len(eligible) > top_k:
+        # Keep every row tied with the k-th score so the merge can break ties by row
+        kth_score = np.partition(scores[eligible], len(eligible) - top_k)[len(eligible) - top_k]
+        eligible = eligible[scores[eligible] >= kth_score]
+    order = np.lexsort((eligible, -scores[eligible]))[:top_k]
+    return eligible[order] + start, scores[eligible[order]]
+
+def get_sharded_scorer(index: 'BM25Index') -> Optional[ShardedScorer]:
+    """
+    Sharded scorer for an index, or None when sharding would not pay off
+
+    The snapshot is rebuilt if documents were added to the index since.
+    Shared postings are a second copy of the index, so they are only built
+    when the instance has memory to spare for them.
+    """
+    if SHARD_WORKERS < 2 or index.doc_count < SHARD_MIN_DOCS:
+        return None
+    with _scorers_lock:
+        scorer = _scorers.get(index)
+        if scorer is not None and scorer.doc_count == index.doc_count:
+            return scorer
+        if _memory_rejections.get(index) == index.doc_count:
+            return None
+        needed = estimate_shared_bytes(index) * SHARD_MEMORY_HEADROOM
+        available = available_memory()
+        if available is not None and available < needed:
+            logger.warning(
+                "⚠️ Not sharding BM25 scoring: %s MB available, %s MB needed",
+                available // 2 ** 20, int(needed) // 2 ** 20
+            )
+            _memory_rejections[index] = index.doc_count
+            return None
+        previous, scorer = scorer, ShardedScorer(index)
+        _scorers[index] = scorer
+    if previous is not None:
+        previous.retire()
+    return scorer
+
+def estimate_shared_bytes(index: 'BM25Index') -> int:
+    """
+    Upper bound of the shared memory a snapshot of the index takes
+
+    Every token of a document is at most one posting (doc ID and frequency).
+    """
+    return index.total_length * 8 + index.doc_count * 8
+
+def available_memory() -> Optional[int]:
+    """
+    Bytes this process can still allocate, or None when unknown
+
+    The container's cgroup limit takes precedence over the host's free memory.
+    """
+    try:
+        with open('/sys/fs/cgroup/memory.max') as limit_file:
+            limit = limit_file.read().strip()
+        if limit != 'max':
+            with open('/sys/fs/cgroup/memory.current') as current_file:
+                return max(0, int(limit) - int(current_file.read()))
+    except (OSError, ValueError):
+        pass
+    try:
+        with open('/proc/meminfo') as meminfo:
+            for line in meminfo:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+def get_pool() -> ProcessPoolExecutor:
+    """
+    Worker processes, started on first use
+
+    Spawned rather than forked: the request process runs threads whose locks
+    a forked child would inherit.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=SHARD_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+            logger.info("⚙️ Started %s BM25 shard workers", SHARD_WORKERS)
+        return _pool
+
+def _create_block(dtype: Any, count: int) -> Tuple[shared_memory.SharedMemory, np.ndarray]:
+    block = shared_memory.SharedMemory(create=True, size=max(np.dtype(dtype).itemsize * count, 1))
+    return block, np.ndarray((count,), dtype=dtype, buffer=block.buf)
+
+def _create_output_block(row_count: int) -> Tuple[shared_memory.SharedMemory, Tuple[np.ndarray, np.ndarray]]:
+    block = shared_memory.SharedMemory(create=True, size=max(row_count * 9, 1))
+    return block, _output_views(block, row_count)
+
+def _output_views(block: shared_memory.SharedMemory, row_count: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Scores (float64) followed by the candidate mask (bool) in one block
+    """
+    scores = np.ndarray((row_count,), dtype=np.float64, buffer=block.buf)
+    mask = np.ndarray((row_count,), dtype=bool, buffer=block.buf, offset=row_count * 8)
+    return scores, mask
+
+def _attach(name: str, count: int, dtype: Any) -> np.ndarray:
+    """
+    Map a shared postings block in a worker, keeping recent blocks mapped
+    """
+    entry = _attached.get(name)
+    if entry is None:
+        block = shared_memory.SharedMemory(name=name)
+        entry = (block, np.ndarray((count,), dtype=dtype, buffer=block.buf))
+        _attached[name] = entry
+        while len(_attached) > MAX_ATTACHED_LAYOUTS * 3:
+            _, (old_block, old_array) = _attached.popitem(last=False)
+            del old_array
+            old_block.close()
+    else:
+        _attached.move_to_end(name)
+    return entry[1]
+
+def _release_blocks(blocks: List[shared_memory.SharedMemory]) -> None:
+    for block in blocks:
+        block.close()
+        block.unlink()
@@ -0,0 +1,61 @@
+"""
+Single-flight request coalescing
+
+Concurrent callers asking for the same key share one execution: the first
+caller does the work and everyone else waits on the same future. Used for
+dataset loading/indexing and, through llm_gateway, for identical in-flight
+LLM prompts.
+"""
+
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable
+
+from structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+class SingleFlight:
+    """
+    Deduplicate concurrent calls that share a key
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.executions = 0
+        self.shared = 0
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        """
+        Run func for key, or wait for the in-flight call with the same key
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.executions += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            logger.info("🔗 Joining in-flight %s call", self.name)
+            return future.result()
+
+        try:
+            result = func(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'executions': self.executions, 'shared': self.shared, 'in_flight': len(self._calls)}
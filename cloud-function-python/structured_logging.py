@@ -0,0 +1,117 @@
+"""
+Structured, leveled logging for the recommendation pipeline
+
+This module handles:
+1. One JSON line per record on stdout, so Cloud Logging picks up severity
+2. A per-request debug switch carried in a context variable
+3. Lazily formatted payloads, so skipped records never serialize anything
+
+Hot loops should check debug_enabled() before logging per-record details
+and otherwise log a single aggregated summary after the loop.
+"""
+
+import os
+import sys
+import json
+import logging
+import contextvars
+from typing import Any, Optional, Tuple
+
+# Configuration
+LOG_LEVEL = getattr(logging, os.getenv('LOG_LEVEL', 'INFO').upper(), logging.INFO)
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')  # 'json' for Cloud Logging, 'text' for local runs
+LOG_SAMPLE_SIZE = int(os.getenv('LOG_SAMPLE_SIZE', '5'))  # Per-record debug lines kept per loop
+
+ROOT_LOGGER_NAME = 'recommendations'
+
+_request_debug = contextvars.ContextVar('request_debug', default=False)
+_request_id = contextvars.ContextVar('request_id', default=None)
+
+class RequestLevelFilter(logging.Filter):
+    """
+    Drop records below LOG_LEVEL unless the current request enabled debug
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < LOG_LEVEL and not _request_debug.get():
+            return False
+        record.request_id = _request_id.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format records as single-line JSON with Cloud Logging field names
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'severity': record.levelname,
+            'message': record.getMessage(),
+            'logger': record.name
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        if getattr(record, 'fields', None):
+            entry['fields'] = record.fields
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class LazyJson:
+    """
+    Defer JSON encoding of a payload until a record is actually emitted
+    """
+
+    __slots__ = ('value', 'max_chars')
+
+    def __init__(self, value: Any, max_chars: Optional[int] = None):
+        self.value = value
+        self.max_chars = max_chars
+
+    def __str__(self) -> str:
+        text = self.value if isinstance(self.value, str) else json.dumps(self.value, default=str, ensure_ascii=False)
+        if self.max_chars and len(text) > self.max_chars:
+            return f"{text[:self.max_chars]}... ({len(text):,} chars)"
+        return text
+
+def configure_logging() -> logging.Logger:
+    """
+    Attach the stdout handler to the package logger once
+    """
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else logging.Formatter('%(message)s'))
+        handler.addFilter(RequestLevelFilter())
+        root.addHandler(handler)
+        root.setLevel(logging.DEBUG)  # Level is enforced per request by the handler filter
+        root.propagate = False
+    return root
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Get a module logger under the package logger
+    """
+    configure_logging()
+    return logging.getLogger(f'{ROOT_LOGGER_NAME}.{name}')
+
+def debug_enabled() -> bool:
+    """
+    Whether debug records are emitted for the current request
+    """
+    return LOG_LEVEL <= logging.DEBUG or _request_debug.get()
+
+def start_request_logging(debug: bool = False, request_id: Optional[str] = None) -> Tuple[contextvars.Token, contextvars.Token]:
+    """
+    Set the debug switch and request ID for the current request
+    """
+    return _request_debug.set(bool(debug)), _request_id.set(request_id)
+
+def end_request_logging(tokens: Tuple[contextvars.Token, contextvars.Token]) -> None:
+    """
+    Restore the log settings that were active before start_request_logging
+    """
+    debug_token, id_token = tokens
+    _request_debug.reset(debug_token)
+    _request_id.reset(id_token)
+
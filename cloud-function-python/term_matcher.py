@@ -0,0 +1,120 @@
+"""
+Multi-pattern term matching for search criteria
+
+This module handles:
+1. Collecting required, preferred, phrase, excluded and field-specific terms
+2. Compiling them into one Aho-Corasick automaton per query
+3. A single pass over each candidate's text returning every hit by category
+
+The automaton comes from pyahocorasick when installed. Without it, each
+distinct term is checked once against the shared text, which still replaces
+the repeated per-function JSON encoding and term loops.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Set
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Compiled matchers by canonical criteria terms, least recently used first
+MAX_CACHED_MATCHERS = 32
+
+_matchers: 'OrderedDict[str, TermMatcher]' = OrderedDict()
+_matchers_lock = threading.Lock()
+
+class TermMatcher:
+    """
+    Match many categorized terms against a text in one pass
+    """
+
+    def __init__(self, terms_by_category: Dict[str, List[str]]):
+        self.terms_by_category = terms_by_category
+        self.always_matched: Set[str] = set()  # '' is contained in every text
+        patterns = set()
+        for terms in terms_by_category.values():
+            for term in terms:
+                term_lower = term.lower()
+                if term_lower:
+                    patterns.add(term_lower)
+                else:
+                    self.always_matched.add(term_lower)
+        self.patterns = sorted(patterns)
+
+        self._automaton = None
+        if ahocorasick is not None and self.patterns:
+            self._automaton = ahocorasick.Automaton()
+            for pattern in self.patterns:
+                self._automaton.add_word(pattern, pattern)
+            self._automaton.make_automaton()
+
+    def find_terms(self, text: str) -> Set[str]:
+        """
+        Lowercased terms contained in an already lowercased text
+        """
+        hits = set(self.always_matched)
+        if self._automaton is not None:
+            for _, pattern in self._automaton.iter(text):
+                hits.add(pattern)
+        else:
+            hits.update(pattern for pattern in self.patterns if pattern in text)
+        return hits
+
+    def scan(self, text: str) -> Dict[str, List[str]]:
+        """
+        Matched terms by category, in criteria order
+        """
+        hits = self.find_terms(text)
+        matches = {}
+        for category, terms in self.terms_by_category.items():
+            matched = [term for term in terms if term.lower() in hits]
+            if matched:
+                matches[category] = matched
+        return matches
+
+    def scan_record(self, person: Dict[str, Any]) -> Dict[str, List[str]]:
+        """
+        Scan a person record the way the term checks always read it
+        """
+        return self.scan(json.dumps(person).lower())
+
+def collect_criteria_terms(criteria: Dict[str, Any]) -> Dict[str, List[str]]:
+    """
+    Terms of the textual criteria by category
+
+    Field-specific terms use 'field:<field type>' categories.
+    """
+    textual_criteria = criteria.get('textualCriteria', {})
+    keyword_search = textual_criteria.get('keywordSearch', {})
+    terms_by_category = {
+        category: [term for term in keyword_search.get(category, []) if isinstance(term, str)]
+        for category in ('required', 'preferred', 'phrases', 'excluded')
+    }
+    for field_type, terms in textual_criteria.get('fieldSpecificSearch', {}).items():
+        if isinstance(terms, list) and terms:
+            terms_by_category[f'field:{field_type}'] = [term for term in terms if isinstance(term, str)]
+    return terms_by_category
+
+def get_criteria_matcher(criteria: Dict[str, Any]) -> TermMatcher:
+    """
+    Get the compiled matcher for a query's criteria, building it once
+    """
+    terms_by_category = collect_criteria_terms(criteria)
+    key = json.dumps(terms_by_category, sort_keys=True)
+
+    with _matchers_lock:
+        matcher = _matchers.get(key)
+        if matcher is not None:
+            _matchers.move_to_end(key)
+            return matcher
+
+    matcher = TermMatcher(terms_by_category)
+    with _matchers_lock:
+        _matchers[key] = matcher
+        while len(_matchers) > MAX_CACHED_MATCHERS:
+            _matchers.popitem(last=False)
+    return matcher
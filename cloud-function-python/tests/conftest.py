@@ -0,0 +1,11 @@
+"""
+Shared test setup: the function's modules are imported from its directory
+"""
+
+import os
+import sys
+
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('LOG_FORMAT', 'text')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
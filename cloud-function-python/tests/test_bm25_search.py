@@ -0,0 +1,85 @@
+"""
+BM25 index equivalence, incremental updates and rank fusion
+"""
+
+import random
+
+import numpy as np
+import pytest
+
+from bm25_search import BM25Index, build_bm25_index, fuse_rankings, tokenize_document, tokenize_text
+
+WORDS = ['python', 'rust', 'founder', 'engineer', 'investor', 'boston', 'paris', 'fintech', 'health', 'ml', 'data', 'design']
+QUERIES = [['python', 'engineer'], ['founder', 'fintech', 'fintech'], ['unknown'], ['ml', 'data', 'boston', 'design'], []]
+
+def make_corpus(size: int, seed: int = 7):
+    rng = random.Random(seed)
+    return [[rng.choice(WORDS) for _ in range(rng.randint(1, 12))] for _ in range(size)]
+
+def test_scores_match_bm25okapi_across_appends():
+    rank_bm25 = pytest.importorskip('rank_bm25')
+    corpus = make_corpus(300)
+    index = BM25Index()
+    for start, end in ((0, 100), (100, 250), (250, 300)):
+        index.add_documents(corpus[start:end])
+        reference = rank_bm25.BM25Okapi(corpus[:end])
+        for query in QUERIES:
+            assert np.allclose(index.get_scores(query), reference.get_scores(query), rtol=1e-12, atol=1e-12)
+
+def test_incremental_index_matches_full_build():
+    corpus = make_corpus(200)
+    full = BM25Index()
+    full.add_documents(corpus)
+    incremental = BM25Index()
+    incremental.add_documents(corpus[:120])
+    incremental.get_scores(['python'])  # Cached statistics must be invalidated by the append
+    incremental.add_documents(corpus[120:])
+    for query in QUERIES:
+        assert np.array_equal(incremental.get_scores(query), full.get_scores(query))
+
+def test_extended_index_leaves_original_unchanged():
+    corpus = make_corpus(150)
+    original = BM25Index()
+    original.add_documents(corpus[:100])
+    before = original.get_scores(['python', 'founder'])
+
+    extended = original.extended(corpus[100:])
+    rebuilt = BM25Index()
+    rebuilt.add_documents(corpus)
+
+    assert original.doc_count == 100
+    assert np.array_equal(original.get_scores(['python', 'founder']), before)
+    assert np.array_equal(extended.get_scores(['python', 'founder']), rebuilt.get_scores(['python', 'founder']))
+
+def test_score_documents_uses_index_statistics():
+    corpus = make_corpus(80)
+    index = BM25Index()
+    index.add_documents(corpus)
+    query = ['python', 'engineer', 'engineer']
+    assert np.allclose(index.score_documents(corpus[:10], query), index.get_scores(query)[:10])
+
+def test_tokenize_text_matches_document_tokens():
+    person = {'title': 'Senior Engineer', 'company': 'ACME'}
+    assert set(tokenize_text('senior ENGINEER acme')) <= set(tokenize_document(person))
+
+def test_build_index_over_records():
+    people = [{'name': 'Ada', 'title': 'Founder'}, {'name': 'Alan', 'title': 'Engineer'}, {'name': 'Grace', 'title': 'Admiral'}]
+    scores = build_bm25_index(people).get_scores(tokenize_text('Founder'))
+    assert scores[0] > 0 and scores[1] == scores[2] == 0
+
+def test_fuse_rankings_interleaves_and_keeps_tail():
+    bm25_order = np.array([0, 1, 2, 3, 4])
+    dense_scores = np.array([0.0, 0.1, 0.0, 0.0, 0.0, 0.9])
+    order, fusion_scores = fuse_rankings(bm25_order, dense_scores, None, depth=2)
+
+    # Row 1 is in both top-2 lists, row 5 only in the dense one
+    assert order[0] == 1
+    assert set(order[:3].tolist()) == {0, 1, 5}
+    assert order[3:].tolist() == [2, 3, 4]
+    assert fusion_scores[1] > fusion_scores[0] == fusion_scores[5]
+
+def test_fuse_rankings_respects_candidate_mask():
+    dense_scores = np.array([0.5, 0.9, 0.2])
+    mask = np.array([True, False, True])
+    order, _ = fuse_rankings(np.array([0, 2]), dense_scores, mask, depth=5)
+    assert 1 not in order.tolist()
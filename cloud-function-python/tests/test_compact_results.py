@@ -0,0 +1,89 @@
+"""
+Compact stored results and hydrating them from the dataset store
+"""
+
+import dataset_store
+from compact_results import (
+    compact_metadata, compact_recommendations, hydrate_recommendations, is_compact,
+    result_dataset_versions, split_recommendation_id
+)
+
+BIO = b'analytical engine pioneer and translator of Menabrea and writer of the first published programs for calculating machines'
+HEADER = b'name,title,company,location,email,bio\n'
+ROWS = [
+    b'Ada Lovelace,Founder,,London,ada@example.com,' + BIO + b'\n',
+    b'Ada Lovelace,Founder,Babbage,London,,' + BIO + b'\n',
+    b'Alan Turing,Researcher,NPL,Manchester,,computing machinery and intelligence\n',
+    b'Grace Hopper,Admiral,US Navy,Arlington,,compilers and the first bug\n'
+]
+
+def build(dataset_id, rows, version='v1'):
+    return dataset_store.build_dataset_entry(dataset_id, version, 'people.csv', HEADER + b''.join(rows))
+
+def recommendation(entry, position, prefix=''):
+    return {
+        'id': prefix + entry.row_ids[position], 'data': entry.records[position],
+        'overall_score': 0.9, 'llm_analysis': 'fits', 'dense_score': None
+    }
+
+def test_round_trip_restores_profiles():
+    entry = build('d1', ROWS)
+    recommendations = [recommendation(entry, 3), recommendation(entry, 2)]
+    compact = compact_recommendations(recommendations)
+    assert all('data' not in item and 'dense_score' not in item for item in compact)
+
+    hydrated, stats = hydrate_recommendations(compact, {'d1': 'v1'}, lambda dataset_id: entry)
+    assert [item['data'] for item in hydrated] == [entry.records[3], entry.records[2]]
+    assert [item['overall_score'] for item in hydrated] == [0.9, 0.9]
+    assert stats['hydrated'] == 2 and stats['missing'] == 0 and stats['version_changed'] == []
+
+def test_rows_resolve_after_appends_and_removed_rows_are_missing():
+    stored = compact_recommendations([recommendation(build('d1', ROWS), position) for position in (2, 3)])
+    changed = build('d1', ROWS[2:3] + [b'Katherine Johnson,Mathematician,NASA,Hampton,,orbital mechanics\n'], 'v2')
+
+    hydrated, stats = hydrate_recommendations(stored, {'d1': 'v1'}, lambda dataset_id: changed)
+    assert hydrated[0]['data']['name'] == 'Alan Turing'
+    assert hydrated[1]['data'] is None
+    assert stats['missing'] == 1 and stats['version_changed'] == ['d1']
+
+def test_federated_ids_are_split_by_dataset():
+    first, second = build('team-a', ROWS[2:3]), build('team', ROWS[3:])
+    versions = {'team-a': 'v1', 'team': 'v1'}
+    assert split_recommendation_id('team-a:abc', versions, True) == ('team-a', 'abc')
+    assert split_recommendation_id('team:abc', versions, True) == ('team', 'abc')
+    assert split_recommendation_id('team-a:abc', {'team-a': 'v1'}, False) == ('team-a', 'team-a:abc')
+
+    entries = {'team-a': first, 'team': second}
+    compact = compact_recommendations([recommendation(first, 0, 'team-a:'), recommendation(second, 0, 'team:')])
+    hydrated, stats = hydrate_recommendations(compact, versions, entries.__getitem__)
+    assert [item['data']['name'] for item in hydrated] == ['Alan Turing', 'Grace Hopper']
+    assert stats['failed_datasets'] == {}
+
+def test_unloadable_datasets_are_reported():
+    entry = build('d1', ROWS)
+
+    def load_dataset_entry(dataset_id):
+        raise FileNotFoundError(dataset_id)
+
+    hydrated, stats = hydrate_recommendations(compact_recommendations([recommendation(entry, 2)]), {'d1': 'v1'}, load_dataset_entry)
+    assert hydrated[0]['data'] is None
+    assert stats['missing'] == 1 and 'd1' in stats['failed_datasets']
+
+def test_duplicates_hydrate_with_the_canonical_record():
+    entry = build('d1', ROWS)
+    duplicates = entry.get_duplicate_clusters()
+    representative = next(iter(duplicates.clusters))
+    stored = {**recommendation(entry, representative), 'duplicates': duplicates.provenance[representative]}
+
+    hydrated, _ = hydrate_recommendations(compact_recommendations([stored]), {'d1': 'v1'}, lambda dataset_id: entry)
+    # Each Ada row lacks a field the other one has
+    assert hydrated[0]['data']['company'] == 'Babbage'
+    assert hydrated[0]['data']['email'] == 'ada@example.com'
+
+def test_metadata_keeps_versions_and_drops_call_logs():
+    metadata = {'dataset_version': 'v1', 'llm_usage': {'calls': 2, 'call_log': [{}, {}]}}
+    versions = result_dataset_versions(metadata, 'd1')
+    compact = compact_metadata(metadata, versions)
+    assert versions == {'d1': 'v1'}
+    assert is_compact(compact) and compact['result_datasets'] == versions
+    assert compact['llm_usage'] == {'calls': 2}
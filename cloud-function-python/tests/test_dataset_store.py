@@ -0,0 +1,50 @@
+"""
+Appended-row detection and stable row IDs
+"""
+
+import numpy as np
+
+import dataset_store
+from bm25_search import build_bm25_index
+
+HEADER = b'name,title,company,location\n'
+ROWS = [
+    b'Ada Lovelace,Founder,Babbage,London\n',
+    b'Alan Turing,Researcher,NPL,Manchester\n',
+    b'Grace Hopper,Admiral,US Navy,Arlington\n'
+]
+
+def build(rows, version='v1'):
+    return dataset_store.build_dataset_entry('d1', version, 'people.csv', HEADER + b''.join(rows))
+
+def test_appended_rows_are_merged_incrementally():
+    cached = build(ROWS[:2])
+    entry = dataset_store.apply_appended_rows(cached, HEADER + b''.join(ROWS), 'v2')
+
+    assert entry.load_stats == {'mode': 'incremental', 'rows_added': 1}
+    assert entry.row_ids[:2] == cached.row_ids
+    assert entry.row_positions[entry.row_ids[2]] == 2
+    assert entry.get_record(entry.row_ids[2])['name'] == 'Grace Hopper'
+
+    # Same index as a full rebuild, and the previous version keeps its own
+    rebuilt = build_bm25_index(entry.records)
+    assert np.array_equal(entry.index.get_scores(['admiral', 'founder']), rebuilt.get_scores(['admiral', 'founder']))
+    assert cached.index.doc_count == 2 and len(cached.records) == 2
+
+def test_row_ids_do_not_depend_on_version_or_position():
+    first = build(ROWS, 'v1')
+    second = build(ROWS[1:], 'v2')
+    assert first.row_ids[1:] == second.row_ids
+
+def test_identical_rows_get_numbered_ids():
+    entry = build([ROWS[0], ROWS[0]])
+    assert entry.row_ids[1] == f'{entry.row_ids[0]}_2'
+
+def test_changed_rows_require_a_full_rebuild():
+    cached = build(ROWS[:2])
+    edited = HEADER + b'Ada Lovelace,Countess,Babbage,London\n' + ROWS[1] + ROWS[2]
+    assert dataset_store.apply_appended_rows(cached, edited, 'v2') is None
+
+def test_removed_rows_require_a_full_rebuild():
+    cached = build(ROWS)
+    assert dataset_store.apply_appended_rows(cached, HEADER + ROWS[0], 'v2') is None
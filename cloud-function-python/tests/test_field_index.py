@@ -0,0 +1,102 @@
+"""
+Per-field constraint bitmaps against the per-record constraint check
+"""
+
+import random
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from bm25_search import apply_hard_constraints, passes_hard_constraints, prepare_bm25_search
+from field_index import FieldIndex, detect_constraint_columns
+
+CITIES = ['New York', 'Boston', 'San Francisco', 'Paris', 'NewYork City']
+COMPANIES = ['Google', 'Stripe', 'Acme Labs', 'Babbage & Co']
+TITLES = ['Software Engineer', 'Founder', 'VP Engineering', 'Investor', 'Co-Founder']
+
+CONSTRAINTS = [
+    {'locationRequirements': ['new york']},
+    {'locationRequirements': ['york', 'paris'], 'titleRequirements': ['founder']},
+    {'companyRequirements': ['acme'], 'exclusions': ['investor']},
+    {'titleRequirements': ['vp', 'engineer'], 'companyRequirements': ['google', 'stripe']},
+    {'nameMatches': ['person 1']},
+    {'exclusions': ['boston', 'google']},
+    {'locationRequirements': ['nowhere']}
+]
+
+@pytest.fixture(scope='module')
+def records():
+    rng = random.Random(11)
+    return [
+        {'name': f'Person {i}', 'location': rng.choice(CITIES), 'company': rng.choice(COMPANIES), 'title': rng.choice(TITLES)}
+        for i in range(500)
+    ]
+
+@pytest.mark.parametrize('hard_constraints', CONSTRAINTS)
+def test_bitmaps_match_per_record_check(records, hard_constraints):
+    field_index = FieldIndex(records, 'parity')
+    columns = detect_constraint_columns(records)
+    rejections, expected_rejections = Counter(), Counter()
+    mask = field_index.constraint_mask(hard_constraints, rejections)
+    expected = np.array([passes_hard_constraints(record, hard_constraints, expected_rejections, columns) for record in records])
+
+    assert np.array_equal(mask, expected)
+    assert rejections == expected_rejections
+    assert np.array_equal(mask, [field_index.record_passes(record, hard_constraints) for record in records])
+
+def test_terms_only_match_their_own_columns():
+    records = [
+        {'name': 'Ada', 'location': 'London', 'company': 'Boston Dynamics'},
+        {'name': 'Alan', 'location': 'Boston', 'company': 'NPL'},
+        {'name': 'Grace', 'company': 'Boston Scientific'}  # No location of its own
+    ]
+    hard_constraints = {'locationRequirements': ['boston']}
+    mask = FieldIndex(records, 'columns').constraint_mask(hard_constraints)
+    assert mask.tolist() == [False, True, False]
+    assert apply_hard_constraints(records, hard_constraints) == [records[1]]
+
+def test_search_filters_the_same_with_and_without_a_field_index():
+    records = [
+        {'name': 'Ada', 'location': 'London', 'company': 'Boston Dynamics', 'title': 'Founder'},
+        {'name': 'Alan', 'location': 'Boston', 'company': 'NPL', 'title': 'Founder'},
+        {'name': 'Grace', 'company': 'Paris Labs', 'title': 'Founder of Boston Labs'},
+        {'name': 'Katherine', 'location': 'Boston', 'company': 'NASA', 'title': 'Engineer'}
+    ]
+    criteria = {
+        'hardConstraints': {'locationRequirements': ['boston'], 'titleRequirements': ['founder'], 'exclusions': ['']},
+        'textualCriteria': {'keywordSearch': {'preferred': ['founder']}}
+    }
+    with_index = prepare_bm25_search(records, criteria, field_index=FieldIndex(records, 'paths'))
+    without_index = prepare_bm25_search(records, criteria)
+    assert with_index['candidate_mask'].tolist() == without_index['candidate_mask'].tolist() == [False, True, False, False]
+
+def test_substring_inside_longer_tokens_still_matches(records):
+    field_index = FieldIndex(records, 'substrings')
+    mask = field_index.term_mask('location', 'york')
+    expected = [('york' in record['location'].lower()) for record in records]
+    assert mask.tolist() == expected
+    assert any('NewYork' in record['location'] for record in np.array(records)[mask])
+
+@pytest.mark.parametrize('query_token', ['e', 'ny', 'ork', 'found', 'engineering', 'zzz'])
+def test_vocabulary_lookup_matches_a_scan(records, query_token):
+    field_index = FieldIndex(records, 'vocabulary')
+    for category in ('location', 'company', 'title'):
+        field_index._get_field(category)
+        vocabulary = field_index._vocabularies[category]
+        expected = sorted(token for token in vocabulary if query_token in token)
+        assert sorted(field_index._matching_tokens(category, query_token)) == expected
+
+def test_column_patterns_are_anchored_on_word_boundaries():
+    keys = ['confirmed', 'subtitle', 'job_title', 'jobtitle', 'roles_count', 'role', 'firm_name', 'email_address',
+            'home_address', 'statement', 'state', 'company_name', 'organization']
+    columns = detect_constraint_columns([{key: 'x' for key in keys}])
+    assert columns['title'] == ['job_title', 'jobtitle', 'role']
+    assert columns['company'] == ['firm_name', 'company_name', 'organization']
+    assert columns['location'] == ['home_address', 'state']
+
+def test_missing_columns_fall_back_to_the_whole_record():
+    records = [{'name': 'Ada', 'bio': 'Lives in Boston'}, {'name': 'Alan', 'bio': 'Lives in Paris'}]
+    field_index = FieldIndex(records, 'fallback')
+    assert field_index.resolve_category('location') == 'any'
+    assert field_index.constraint_mask({'locationRequirements': ['boston']}).tolist() == [True, False]
@@ -0,0 +1,85 @@
+"""
+Token buckets, backoff and retries of the LLM gateway
+"""
+
+import time
+
+import pytest
+
+import llm_gateway
+from llm_gateway import TokenBucket, backoff_delay, call_with_retries, classify_error, get_retry_after
+
+class ApiError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f'status {status_code}')
+        self.status_code = status_code
+        self.response = type('Response', (), {'headers': headers or {}})()
+
+class Response:
+    usage_metadata = {'input_tokens': 10, 'output_tokens': 5, 'total_tokens': 15}
+
+class Message:
+    content = 'Find engineers in Boston'
+
+class FakeModel:
+    """
+    Chat model that raises or returns the given outcomes in order
+    """
+    model_name = 'test-retry-model'
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(600)  # 10 units per second
+    assert bucket.acquire(600) == 0.0
+    started = time.monotonic()
+    waited = bucket.acquire(2)
+    assert waited > 0.1 and time.monotonic() - started >= 0.15
+
+def test_token_bucket_refund_and_oversized_requests():
+    bucket = TokenBucket(60)
+    bucket.acquire(50)
+    bucket.refund(50)
+    assert bucket.acquire(60) == 0.0  # Refunded units are available again
+    bucket.refund(60)
+    assert bucket.acquire(1000) == 0.0  # Capped at a full bucket instead of waiting forever
+
+def test_backoff_is_bounded_and_honors_retry_after(monkeypatch):
+    monkeypatch.setattr(llm_gateway, 'LLM_BACKOFF_BASE_SECONDS', 1.0)
+    monkeypatch.setattr(llm_gateway, 'LLM_BACKOFF_MAX_SECONDS', 8.0)
+    for attempt in range(6):
+        assert 0 <= backoff_delay(attempt) <= min(8.0, 2 ** attempt)
+    assert 5.0 <= backoff_delay(0, retry_after=5.0) <= 6.0
+    assert backoff_delay(0, retry_after=60.0) <= 9.0
+
+def test_retry_after_headers_and_error_classes():
+    assert get_retry_after(ApiError(429, {'retry-after-ms': '1500'})) == 1.5
+    assert get_retry_after(ApiError(429, {'retry-after': '3'})) == 3.0
+    assert get_retry_after(ApiError(429)) is None
+    assert classify_error(ApiError(429)) == (True, 429)
+    assert classify_error(ApiError(400)) == (False, 400)
+
+def test_transient_errors_are_retried(monkeypatch):
+    monkeypatch.setattr(llm_gateway.time, 'sleep', lambda seconds: None)
+    monkeypatch.setattr(llm_gateway, 'LLM_MAX_RETRIES', 3)
+    model = FakeModel([ApiError(503), ApiError(429, {'retry-after': '0'}), Response()])
+
+    assert isinstance(call_with_retries(model, [Message()]), Response)
+    assert model.calls == 3 and model.outcomes == []
+
+def test_permanent_errors_are_not_retried(monkeypatch):
+    monkeypatch.setattr(llm_gateway.time, 'sleep', lambda seconds: None)
+    model = FakeModel([ApiError(400), Response()])
+
+    with pytest.raises(ApiError):
+        call_with_retries(model, [Message()])
+    assert model.calls == 1
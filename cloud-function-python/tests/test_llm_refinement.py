@@ -0,0 +1,136 @@
+"""
+Early stopping, lenient response parsing and recovery of missing analyses
+"""
+
+import json
+import random
+import zlib
+
+import pytest
+
+import llm_refinement
+from llm_refinement import (
+    parse_candidate_analyses, recover_missing_analyses, refine_candidates_with_llm,
+    score_upper_bound, create_fallback_candidate, create_analyzed_candidate, fallback_refinement
+)
+
+CRITERIA = {'weights': {'bm25Score': 0.05, 'llmRelevance': 0.9, 'fieldMatches': 0.05}}
+
+def analysis(candidate_id: str, score: float = 0.8):
+    return {'candidate_id': candidate_id, 'llm_relevance_score': score, 'detailed_analysis': 'fits // well'}
+
+def make_candidates(count: int, seed: int = 3):
+    rng = random.Random(seed)
+    return [
+        {'id': f'c{i}', 'data': {'name': f'Person {i}', 'bio': 'x' * 2500}, 'bm25_score': round(rng.uniform(0, 20), 3),
+         'field_matches': {'title': ['x']} if i % 3 == 0 else {}, 'preliminary_reasons': []}
+        for i in range(count)
+    ]
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """
+    Deterministic analyses per candidate ID; returns the requested batches
+    """
+    requests = []
+
+    def request_batch_analyses(batch, criteria, system_prompt, purpose='candidate_analysis'):
+        requests.append([candidate['id'] for candidate in batch])
+        return {c['id']: analysis(c['id'], (zlib.crc32(c['id'].encode()) % 100) / 100) for c in batch}
+
+    monkeypatch.setattr(llm_refinement, 'get_llm', lambda: object())
+    monkeypatch.setattr(llm_refinement, 'request_batch_analyses', request_batch_analyses)
+    return requests
+
+def test_upper_bound_covers_analyzed_and_fallback_scores():
+    for candidate in make_candidates(20):
+        bound = score_upper_bound(candidate, CRITERIA)
+        assert create_fallback_candidate(candidate, CRITERIA)['overall_score'] <= bound
+        assert create_analyzed_candidate(candidate, analysis(candidate['id'], 1.0), CRITERIA)['overall_score'] <= bound
+
+def test_early_stop_keeps_order_and_top_results(fake_llm):
+    candidates = make_candidates(60)
+    random.Random(1).shuffle(candidates)  # e.g. a fused order, not BM25 order
+    stats = {}
+    early = refine_candidates_with_llm(candidates, CRITERIA, 5, early_stop=True, stats=stats)
+    sent_first = fake_llm[0]
+    fake_llm.clear()
+    full = refine_candidates_with_llm(candidates, CRITERIA, 5, early_stop=False)
+
+    assert sent_first == [c['id'] for c in candidates[:len(sent_first)]]
+    assert [c['id'] for c in early] == [c['id'] for c in full]
+    assert stats['llm_batches_processed'] <= stats['llm_batches_total']
+
+def test_early_stop_skips_batches_that_cannot_win(monkeypatch):
+    candidates = make_candidates(40)
+    for candidate in candidates[10:]:
+        candidate['bm25_score'] = 0.0
+    relevance = {c['id']: 1.0 for c in candidates[:10]}
+    monkeypatch.setattr(llm_refinement, 'get_llm', lambda: object())
+    monkeypatch.setattr(llm_refinement, 'request_batch_analyses', lambda batch, *args: {
+        c['id']: analysis(c['id'], relevance.get(c['id'], 0.0)) for c in batch
+    })
+    stats = {}
+    refine_candidates_with_llm(candidates, CRITERIA, 5, early_stop=True, stats=stats)
+    assert stats['early_stopped'] and stats['llm_batches_processed'] < stats['llm_batches_total']
+
+def test_only_cluster_representatives_carry_duplicates():
+    plain, representative = make_candidates(2)
+    representative['duplicates'] = {'canonical_id': 'c1', 'row_ids': ['c1', 'r9'], 'merged_fields': {}}
+    for build in (
+        lambda candidate: create_analyzed_candidate(candidate, analysis(candidate['id']), CRITERIA),
+        lambda candidate: create_fallback_candidate(candidate, CRITERIA),
+        lambda candidate: fallback_refinement([candidate], CRITERIA, 1)[0]
+    ):
+        assert 'duplicates' not in build(plain)
+        assert build(representative)['duplicates'] == representative['duplicates']
+
+def test_parse_whole_response_with_prose_around():
+    content = 'Here you go:\n' + json.dumps({'candidates': [analysis('c1'), analysis('c2')]}) + '\nDone.'
+    assert [a['candidate_id'] for a in parse_candidate_analyses(content)] == ['c1', 'c2']
+
+def test_parse_truncated_response_keeps_complete_objects():
+    content = json.dumps({'candidates': [analysis('c1'), analysis('c2'), analysis('c3')]})
+    truncated = content[:content.index('"c3"') + 10]
+    assert [a['candidate_id'] for a in parse_candidate_analyses(truncated)] == ['c1', 'c2']
+
+def test_parse_comments_trailing_commas_and_one_broken_object():
+    content = (
+        '{"candidates": [\n'
+        '{"candidate_id": "c1", "llm_relevance_score": 0.7, "detailed_analysis": "a // b", }, // first\n'
+        '{"candidate_id": "c2", "llm_relevance_score": 0.6, detailed_analysis: "unquoted key"},\n'
+        '{"candidate_id": "c3", "llm_relevance_score": 0.5}\n'
+        ']}'
+    )
+    analyses = parse_candidate_analyses(content)
+    assert [a['candidate_id'] for a in analyses] == ['c1', 'c3']
+    assert analyses[0]['detailed_analysis'] == 'a // b'
+
+def test_parse_garbage_returns_nothing():
+    assert parse_candidate_analyses('I cannot help with that.') == []
+
+def test_recovery_bisects_within_the_call_budget(monkeypatch):
+    calls = []
+
+    def request_batch_analyses(group, criteria, system_prompt, purpose='candidate_analysis'):
+        ids = [candidate['id'] for candidate in group]
+        calls.append(ids)
+        # Groups containing c3 come back broken until c3 is asked for alone
+        if 'c3' in ids and len(ids) > 1:
+            return {}
+        return {candidate_id: analysis(candidate_id) for candidate_id in ids}
+
+    monkeypatch.setattr(llm_refinement, 'request_batch_analyses', request_batch_analyses)
+    missing = [{'id': f'c{i}'} for i in range(5)]
+    recovery = {'calls_left': 4, 'calls': 0, 'recovered': 0, 'fallbacks': 0}
+    recovered = recover_missing_analyses(missing, {}, 'system', recovery)
+
+    assert calls[0] == ['c0', 'c1', 'c2']
+    assert set(recovered) == {'c0', 'c1', 'c2', 'c3', 'c4'}
+    assert recovery['calls'] == 4 and recovery['calls_left'] == 0
+
+def test_recovery_stops_when_the_budget_is_spent(monkeypatch):
+    monkeypatch.setattr(llm_refinement, 'request_batch_analyses', lambda group, *args: {})
+    recovery = {'calls_left': 2, 'calls': 0, 'recovered': 0, 'fallbacks': 0}
+    assert recover_missing_analyses([{'id': f'c{i}'} for i in range(8)], {}, 'system', recovery) == {}
+    assert recovery['calls'] == 2
@@ -0,0 +1,76 @@
+"""
+Near-duplicate clusters and searching on their canonical records
+"""
+
+import numpy as np
+import pytest
+
+from bm25_search import build_bm25_index, prepare_bm25_search, search_with_bm25
+from field_index import FieldIndex
+from near_duplicates import find_duplicate_clusters
+
+BIO = 'analytical engine pioneer and writer of the first programs for calculating machines'
+
+@pytest.fixture(scope='module')
+def people():
+    people = [
+        {'name': f'Person {i}', 'title': 'Engineer', 'location': 'Boston', 'company': 'Acme', 'bio': f'builds widgets number {i}'}
+        for i in range(60)
+    ]
+    people += [
+        {'name': 'Ada Lovelace', 'title': 'Founder', 'location': 'London', 'bio': BIO, 'email': 'ada@example.com'},
+        {'name': 'Ada Lovelace', 'title': 'Founder', 'location': 'London', 'company': 'Babbage', 'bio': BIO},
+        {'name': 'Grace Hopper', 'title': 'Admiral', 'company': 'US Navy Inc', 'location': 'Arlington'},
+        {'name': 'grace hopper', 'title': 'Rear Admiral', 'company': 'US Navy', 'location': 'Arlington, VA'},
+        {'name': 'Alan Turing', 'title': 'Founder', 'location': 'London', 'bio': BIO}
+    ]
+    return people
+
+@pytest.fixture(scope='module')
+def row_ids(people):
+    return [f'r{i}' for i in range(len(people))]
+
+def test_clusters_merge_duplicates_and_keep_distinct_people(people, row_ids):
+    duplicates = find_duplicate_clusters(people, row_ids)
+
+    assert sorted(sorted(members) for members in duplicates.clusters.values()) == [[60, 61], [62, 63]]
+    assert duplicates.stats['key_matches'] >= 1 and duplicates.stats['lsh_matches'] >= 1
+    assert duplicates.canonical_mask.sum() == len(people) - 2
+    assert duplicates.canonical_mask[64]  # Same profile text, different name
+
+    ada = next(row for row, members in duplicates.clusters.items() if 60 in members)
+    canonical = duplicates.canonical_record(ada, people[ada])
+    assert canonical['company'] == 'Babbage' and canonical['email'] == 'ada@example.com'
+    provenance = duplicates.provenance[ada]
+    assert provenance['canonical_id'] == row_ids[ada]
+    assert sorted(provenance['row_ids']) == ['r60', 'r61']
+    assert set(provenance['merged_fields'].values()) == {'r60', 'r61'} - {row_ids[ada]}
+    assert ada in duplicates.merged_rows
+
+def test_reused_signatures_give_the_same_clusters(people, row_ids):
+    previous = find_duplicate_clusters(people[:62], row_ids[:62])
+    duplicates = find_duplicate_clusters(people, row_ids, previous.signatures)
+
+    assert duplicates.stats['signatures_reused'] == 62
+    assert duplicates.clusters == find_duplicate_clusters(people, row_ids).clusters
+
+@pytest.mark.parametrize('use_field_index', [False, True])
+def test_constraints_and_scores_use_the_canonical_record(people, row_ids, use_field_index):
+    duplicates = find_duplicate_clusters(people, row_ids)
+    ada = next(row for row, members in duplicates.clusters.items() if 60 in members)
+    index = build_bm25_index(people)
+    field_index = FieldIndex(people, 'v1') if use_field_index else None
+    # Only one of the Ada rows has the company, but the cluster still qualifies through it
+    criteria = {
+        'hardConstraints': {'companyRequirements': ['Babbage']},
+        'textualCriteria': {'keywordSearch': {'required': ['babbage']}}
+    }
+
+    state = prepare_bm25_search(people, criteria, index, field_index=field_index, duplicates=duplicates)
+    assert np.nonzero(state['candidate_mask'])[0].tolist() == [ada]
+    assert state['scores'][ada] > 0
+
+    results = search_with_bm25(people, criteria, 5, index, row_ids, state, duplicates=duplicates)
+    assert [result['id'] for result in results] == [row_ids[ada]]
+    assert results[0]['data']['company'] == 'Babbage'
+    assert results[0]['duplicates'] == duplicates.provenance[ada]
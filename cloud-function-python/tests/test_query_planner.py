@@ -0,0 +1,49 @@
+"""
+Routing queries between rule-based criteria and the criteria LLM
+"""
+
+import pytest
+
+from query_planner import plan_query
+
+def test_simple_role_and_location_lookup_uses_rules():
+    plan = plan_query('engineers in Boston')
+    assert plan['path'] == 'rules'
+    assert plan['query_type'] == 'location_lookup'
+    assert plan['criteria']['hardConstraints']['locationRequirements'] == ['Boston']
+
+def test_company_lookup_is_classified():
+    plan = plan_query('founders at Stripe')
+    assert plan['path'] == 'rules' and plan['query_type'] == 'company_lookup'
+    assert plan['criteria']['hardConstraints']['companyRequirements'] == ['Stripe']
+    assert 'founders' in plan['criteria']['textualCriteria']['fieldSpecificSearch']['roles']
+
+@pytest.mark.parametrize('query, signal', [
+    ('people who worked at Stripe and now run a startup', 'relative_clause'),
+    ('fintech founder who raised a Series A', 'temporal_terms:raised'),
+    ('Find me the CTO of Acme', 'entity_relation:Acme'),
+    ('ex-Google engineers', 'temporal_terms:ex-google'),
+    ('software engineers in Boston', 'unclassified_terms:software')
+])
+def test_contextual_and_relational_queries_go_to_the_llm(query, signal):
+    plan = plan_query(query)
+    assert plan['path'] == 'llm'
+    assert plan['confidence'] < 1.0
+    assert signal in plan['signals']
+
+def test_negation_and_questions_go_to_the_llm():
+    for query in ('engineers not at Google in Boston except managers', 'who would be a good advisor for my startup?'):
+        plan = plan_query(query)
+        assert plan['path'] == 'llm'
+        assert 'criteria' not in plan
+
+def test_meaningful_follow_up_answers_lower_confidence():
+    base = plan_query('engineers in Boston')
+    answered = plan_query('engineers in Boston', {'seniority': 'Senior staff level'})
+    neutral = plan_query('engineers in Boston', {'seniority': 'No preference'})
+    assert answered['confidence'] < base['confidence'] == neutral['confidence']
+    assert 'follow_up_answers' in answered['signals']
+
+def test_empty_query_goes_to_the_llm():
+    plan = plan_query('   ')
+    assert plan['path'] == 'llm' and plan['confidence'] == 0.0
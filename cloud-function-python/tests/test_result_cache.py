@@ -0,0 +1,97 @@
+"""
+Result cache tiers: TTL, LRU and byte limits, and cache keys
+"""
+
+import pytest
+
+import result_cache
+from result_cache import MemoryCache, SQLiteCache, make_query_cache_key, make_result_cache_key
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache.time, 'time', clock)
+    return clock
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_cache(request, tmp_path):
+    def make(max_entries=10, max_bytes=10_000, ttl_seconds=60):
+        if request.param == 'memory':
+            return MemoryCache(max_entries, max_bytes, ttl_seconds)
+        return SQLiteCache(str(tmp_path / 'cache.sqlite3'), max_entries, max_bytes, ttl_seconds)
+    return make
+
+def test_entries_expire_after_ttl(make_cache, clock):
+    cache = make_cache(ttl_seconds=60)
+    cache.set('a', {'results': [1]})
+    cache.set('b', 'short', ttl_seconds=5)
+    clock.now += 30
+    assert cache.get('a') == {'results': [1]}
+    assert cache.get('b') is None
+    clock.now += 31
+    assert cache.get('a') is None
+
+def test_least_recently_used_entry_is_evicted(make_cache, clock):
+    cache = make_cache(max_entries=2)
+    cache.set('a', 1)
+    clock.now += 1
+    cache.set('b', 2)
+    clock.now += 1
+    assert cache.get('a') == 1  # 'b' is now the least recently used
+    clock.now += 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+
+def test_byte_limit_evicts_and_skips_oversized_values(make_cache, clock):
+    cache = make_cache(max_bytes=100)
+    cache.set('a', 'x' * 40)
+    clock.now += 1
+    cache.set('b', 'y' * 40)
+    clock.now += 1
+    cache.set('c', 'z' * 40)  # 3 x 42 bytes of JSON exceed the limit
+    assert cache.get('a') is None
+    assert cache.get('b') and cache.get('c')
+    assert cache.stats()['bytes'] <= 100
+
+    cache.set('huge', 'w' * 500)
+    assert cache.get('huge') is None
+    assert cache.get('c')
+
+def test_oversized_value_replaces_the_previous_one(make_cache, clock):
+    cache = make_cache(max_bytes=100)
+    assert cache.set('job', {'status': 'processing'})
+    assert not cache.set('job', {'status': 'completed', 'results': 'r' * 500})
+    assert cache.get('job') is None
+
+def test_memory_cache_counts_hits_and_misses():
+    cache = MemoryCache(10, 10_000, 60)
+    cache.set('a', 1)
+    cache.get('a')
+    cache.get('missing')
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+
+def test_result_key_ignores_criteria_order_but_not_inputs():
+    criteria = {'hardConstraints': {'locationRequirements': ['boston']}, 'textualCriteria': {'keywords': ['python']}}
+    reordered = {'textualCriteria': {'keywords': ['python']}, 'hardConstraints': {'locationRequirements': ['boston']}}
+    key = make_result_cache_key('v1', criteria, 10, 50, {'rerank': True})
+    assert key == make_result_cache_key('v1', reordered, 10, 50, {'rerank': True})
+    assert key != make_result_cache_key('v2', criteria, 10, 50, {'rerank': True})
+    assert key != make_result_cache_key('v1', criteria, 20, 50, {'rerank': True})
+    assert key != make_result_cache_key('v1', criteria, 10, 50, {'rerank': False})
+
+def test_query_key_normalizes_wording_but_not_inputs():
+    key = make_query_cache_key('v1', '  Engineers   in BOSTON ', {}, None, 10, 50, {'rerank': True})
+    assert key == make_query_cache_key('v1', 'engineers in boston', {}, None, 10, 50, {'rerank': True})
+    assert key != make_query_cache_key('v2', 'engineers in boston', {}, None, 10, 50, {'rerank': True})
+    assert key != make_query_cache_key('v1', 'engineers in boston', {'seniority': 'senior'}, None, 10, 50, {'rerank': True})
+    assert key != make_query_cache_key('v1', 'engineers in boston', {}, None, 20, 50, {'rerank': True})
+    assert key != make_query_cache_key('v1', 'engineers in boston', {}, None, 10, 50, {'rerank': False})
@@ -0,0 +1,86 @@
+"""
+Sharded scoring in worker processes against the in-thread index
+"""
+
+import random
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+import sharded_bm25
+from bm25_search import BM25Index
+
+WORDS = [f'term{i}' for i in range(60)]
+
+@pytest.fixture(scope='module')
+def index():
+    rng = random.Random(5)
+    index = BM25Index()
+    index.add_documents([[rng.choice(WORDS) for _ in range(rng.randint(1, 15))] for _ in range(4000)])
+    return index
+
+@pytest.fixture(scope='module', autouse=True)
+def shard_workers():
+    workers = sharded_bm25.SHARD_WORKERS
+    sharded_bm25.SHARD_WORKERS = 3
+    yield
+    if sharded_bm25._pool is not None:
+        sharded_bm25._pool.shutdown()
+        sharded_bm25._pool = None
+    sharded_bm25.SHARD_WORKERS = workers
+
+def block_exists(name: str) -> bool:
+    try:
+        shared_memory.SharedMemory(name=name).close()
+        return True
+    except FileNotFoundError:
+        return False
+
+@pytest.mark.parametrize('query', [['term1', 'term2'], ['term3', 'term3', 'missing'], ['missing']])
+def test_sharded_scores_equal_in_thread_scores(index, query):
+    scorer = sharded_bm25.ShardedScorer(index)
+    rng = np.random.default_rng(0)
+    mask = rng.random(index.doc_count) < 0.7
+    scores, ranked_rows = scorer.score(query, index.doc_count, mask, 0.1, top_k=50)
+
+    expected = index.get_scores(query)
+    assert np.array_equal(scores, expected)
+
+    eligible = np.nonzero((expected >= 0.1) & mask)[0]
+    expected_order = eligible[np.argsort(-expected[eligible], kind='stable')][:50]
+    assert ranked_rows.tolist() == expected_order.tolist()
+
+def test_scores_of_a_row_prefix(index):
+    scorer = sharded_bm25.ShardedScorer(index)
+    scores, _ = scorer.score(['term7'], 1000, None, 0.0)
+    assert np.array_equal(scores, index.get_scores(['term7'])[:1000])
+
+def test_replaced_blocks_outlive_scores_in_flight(monkeypatch):
+    monkeypatch.setattr(sharded_bm25, 'SHARD_MIN_DOCS', 10)
+    index = BM25Index()
+    index.add_documents([['term1', 'term2']] * 50)
+    first = sharded_bm25.get_sharded_scorer(index)
+    block_name = first.layout['doc_ids'][0]
+
+    first._in_flight += 1  # A score() reading the blocks
+    index.add_documents([['term3']])
+    second = sharded_bm25.get_sharded_scorer(index)
+    assert second is not first
+    assert block_exists(block_name)
+
+    first._finish_score()
+    assert not block_exists(block_name)
+    with pytest.raises(RuntimeError):
+        first.score(['term1'], 10, None, 0.0)
+
+def test_sharding_needs_memory_for_the_snapshot(monkeypatch):
+    monkeypatch.setattr(sharded_bm25, 'SHARD_MIN_DOCS', 10)
+    monkeypatch.setattr(sharded_bm25, 'available_memory', lambda: 1024)
+    index = BM25Index()
+    index.add_documents([['term1', 'term2']] * 500)
+    assert sharded_bm25.get_sharded_scorer(index) is None
+
+def test_small_corpora_are_scored_in_thread(index, monkeypatch):
+    monkeypatch.setattr(sharded_bm25, 'SHARD_MIN_DOCS', index.doc_count + 1)
+    assert sharded_bm25.get_sharded_scorer(index) is None
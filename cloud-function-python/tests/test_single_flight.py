@@ -0,0 +1,50 @@
+"""
+Sharing one execution between concurrent calls with the same key
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from single_flight import SingleFlight
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight('test')
+    started, release = threading.Event(), threading.Event()
+    executions = []
+
+    def load(value):
+        executions.append(value)
+        started.set()
+        release.wait(5)
+        return value * 2
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        leader = pool.submit(flight.do, 'key', load, 21)
+        started.wait(5)
+        followers = [pool.submit(flight.do, 'key', load, 21) for _ in range(3)]
+        while flight.stats()['shared'] < 3:
+            threading.Event().wait(0.01)
+        release.set()
+        results = [leader.result()] + [follower.result() for follower in followers]
+
+    assert results == [42] * 4
+    assert executions == [21]
+    assert flight.stats() == {'executions': 1, 'shared': 3, 'in_flight': 0}
+
+def test_errors_propagate_and_free_the_key():
+    flight = SingleFlight('test')
+
+    def fail():
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError):
+        flight.do('key', fail)
+    assert flight.do('key', lambda: 'retried') == 'retried'
+    assert flight.stats()['in_flight'] == 0
+
+def test_different_keys_run_separately():
+    flight = SingleFlight('test')
+    assert [flight.do(key, lambda k=key: k.upper()) for key in ('a', 'b')] == ['A', 'B']
+    assert flight.stats()['executions'] == 2
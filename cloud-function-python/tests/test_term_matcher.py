@@ -0,0 +1,60 @@
+"""
+Term matching with the Aho-Corasick automaton and with the plain fallback
+"""
+
+import json
+
+import pytest
+
+import term_matcher
+from term_matcher import TermMatcher, collect_criteria_terms, get_criteria_matcher
+
+CRITERIA = {
+    'textualCriteria': {
+        'keywordSearch': {
+            'required': ['Python', 'machine learning'],
+            'preferred': ['Rust', 'ml'],
+            'phrases': ['series a'],
+            'excluded': ['recruiter']
+        },
+        'fieldSpecificSearch': {'title': ['Engineer'], 'location': []}
+    }
+}
+
+PERSON = {'title': 'Senior ML Engineer', 'bio': 'Python and machine learning at a Series A startup (HTML too)'}
+
+@pytest.fixture(params=['automaton', 'fallback'])
+def backend(request, monkeypatch):
+    if request.param == 'automaton':
+        pytest.importorskip('ahocorasick')
+    else:
+        monkeypatch.setattr(term_matcher, 'ahocorasick', None)
+    return request.param
+
+def expected_scan(terms_by_category, text):
+    return {
+        category: [term for term in terms if term.lower() in text]
+        for category, terms in terms_by_category.items()
+        if any(term.lower() in text for term in terms)
+    }
+
+def test_scan_matches_substring_checks(backend):
+    terms = collect_criteria_terms(CRITERIA)
+    matcher = TermMatcher(terms)
+    assert (matcher._automaton is not None) == (backend == 'automaton')
+
+    text = json.dumps(PERSON).lower()
+    assert matcher.scan(text) == expected_scan(terms, text)
+    assert matcher.scan_record(PERSON) == {
+        'required': ['Python', 'machine learning'],
+        'preferred': ['ml'],
+        'phrases': ['series a'],
+        'field:title': ['Engineer']
+    }
+
+def test_overlapping_and_empty_terms(backend):
+    matcher = TermMatcher({'a': ['new york', 'york', 'new'], 'b': ['', 'boston']})
+    assert matcher.scan('based in new york') == {'a': ['new york', 'york', 'new'], 'b': ['']}
+
+def test_matchers_are_cached_per_criteria():
+    assert get_criteria_matcher(CRITERIA) is get_criteria_matcher(json.loads(json.dumps(CRITERIA)))
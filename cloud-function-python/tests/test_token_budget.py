@@ -0,0 +1,32 @@
+"""
+Packing candidates into token-budgeted LLM batches
+"""
+
+from token_budget import build_candidate_payload, compact_json, estimate_tokens, pack_batches
+
+def make_candidate(i: int, bio_words: int = 20):
+    return {'id': f'c{i}', 'data': {'name': f'Person {i}', 'bio': ' '.join(['word'] * bio_words)}, 'bm25_score': 1.0}
+
+def candidate_tokens(candidate):
+    return estimate_tokens(compact_json(build_candidate_payload(candidate)))
+
+def test_batches_keep_order_and_respect_limits():
+    candidates = [make_candidate(i, 10 + 7 * (i % 5)) for i in range(40)]
+    budget, fixed = 400, 50
+    batches = pack_batches(candidates, token_budget=budget, max_batch_size=6, fixed_tokens=fixed)
+
+    assert [c['id'] for batch in batches for c in batch] == [c['id'] for c in candidates]
+    for batch in batches:
+        assert 1 <= len(batch) <= 6
+        assert fixed + sum(candidate_tokens(c) for c in batch) <= budget
+
+def test_oversized_candidate_gets_its_own_batch():
+    oversized = make_candidate(1)
+    oversized['data'].update({f'note_{i}': f'detail {i} ' * 30 for i in range(20)})  # Fields are capped, not records
+    candidates = [make_candidate(0), oversized, make_candidate(2)]
+    assert candidate_tokens(oversized) > 300
+    batches = pack_batches(candidates, token_budget=300, max_batch_size=10)
+    assert [[c['id'] for c in batch] for batch in batches] == [['c0'], ['c1'], ['c2']]
+
+def test_no_candidates_no_batches():
+    assert pack_batches([]) == []
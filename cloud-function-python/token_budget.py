@@ -0,0 +1,125 @@
+"""
+Prompt token budgeting for LLM candidate analysis
+
+This module handles:
+1. Estimating prompt tokens (tiktoken when installed, heuristic otherwise)
+2. Compacting candidate profiles (null/irrelevant fields, long values)
+3. Packing candidates into batches up to a target prompt size
+"""
+
+import os
+import re
+import json
+import math
+from typing import List, Dict, Any
+
+# tiktoken encoding is loaded on first use (False = not loaded yet)
+_encoding = False
+
+# Configuration
+BATCH_TOKEN_BUDGET = int(os.getenv('LLM_BATCH_TOKEN_BUDGET', '6000'))
+MAX_BATCH_SIZE = int(os.getenv('LLM_MAX_BATCH_SIZE', '10'))
+MAX_FIELD_CHARS = int(os.getenv('LLM_MAX_FIELD_CHARS', '300'))
+
+# Average characters per token for English/JSON text when tiktoken is unavailable
+CHARS_PER_TOKEN = 4
+
+NULL_VALUES = {'', 'null', 'none', 'n/a', 'na', 'nan', 'undefined', '-'}
+
+# Fields that carry no signal for candidate assessment
+IRRELEVANT_FIELD_PATTERN = re.compile(
+    r'(^id$|_id$|^uuid$|_uuid$|created_at|updated_at|timestamp|'
+    r'photo|avatar|image|picture|profile_pic|thumbnail)'
+)
+
+def get_encoding():
+    """
+    Get the tiktoken encoding, or None when tiktoken is unavailable
+    """
+    global _encoding
+    if _encoding is False:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding('o200k_base')
+        except Exception:
+            _encoding = None
+    return _encoding
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of prompt tokens for a piece of text
+    """
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def compact_json(data: Any) -> str:
+    """
+    Serialize to JSON without indentation or padding
+    """
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+
+def compact_profile(profile: Dict[str, Any], max_field_chars: int = MAX_FIELD_CHARS) -> Dict[str, Any]:
+    """
+    Strip null and irrelevant fields and cap the length of long values
+    """
+    compacted = {}
+    for key, value in profile.items():
+        if value is None or IRRELEVANT_FIELD_PATTERN.search(str(key).lower()):
+            continue
+
+        text = str(value).strip()
+        if text.lower() in NULL_VALUES:
+            continue
+
+        if len(text) > max_field_chars:
+            text = text[:max_field_chars].rstrip() + '…'
+        compacted[key] = text
+
+    return compacted
+
+def build_candidate_payload(candidate: Dict[str, Any], max_field_chars: int = MAX_FIELD_CHARS) -> Dict[str, Any]:
+    """
+    Build the compact per-candidate payload sent to the LLM
+    """
+    return {
+        'id': candidate['id'],
+        'bm25_score': candidate['bm25_score'],
+        'profile': compact_profile(candidate['data'], max_field_chars),
+        'preliminary_reasons': candidate.get('preliminary_reasons', [])
+    }
+
+def pack_batches(
+    candidates: List[Dict[str, Any]],
+    token_budget: int = BATCH_TOKEN_BUDGET,
+    max_batch_size: int = MAX_BATCH_SIZE,
+    fixed_tokens: int = 0
+) -> List[List[Dict[str, Any]]]:
+    """
+    Greedily pack candidates (in order) into batches that fit the token budget
+
+    ``fixed_tokens`` is the per-call overhead (system prompt and instructions).
+    A candidate that is too large on its own still gets a batch of its own.
+    """
+    batches = []
+    current: List[Dict[str, Any]] = []
+    current_tokens = fixed_tokens
+
+    for candidate in candidates:
+        candidate_tokens = estimate_tokens(compact_json(build_candidate_payload(candidate)))
+
+        if current and (len(current) >= max_batch_size or current_tokens + candidate_tokens > token_budget):
+            batches.append(current)
+            current = []
+            current_tokens = fixed_tokens
+
+        current.append(candidate)
+        current_tokens += candidate_tokens
+
+    if current:
+        batches.append(current)
+
+    return batches